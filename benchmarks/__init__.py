@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the benchmarks import the application modules the same way the app and the tests do
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "src"))
@@ -0,0 +1,57 @@
+"""Compares the memory per tag of a tags ListField holding one object graph per tag with a
+ColumnarListField holding one list per column.
+
+Run from the repository root with `python -m benchmarks.bench_columnar`.
+"""
+import time
+import tracemalloc
+
+from model.columnar import make_columnar
+from model.iem_model import DocumentationUAConnectorConfig
+from model.tag_import import import_tags
+
+
+def tag_records(n_tags: int):
+    for i in range(n_tags):
+        yield {
+            "name": f"tag-{i}",
+            "address": f'ns=3;s="DB1"."tag{i}"',
+            "dataType": "Real",
+            "acquisitionCycle": 1000,
+            "accessMode": "r",
+        }
+
+
+def measure(n_tags: int, columnar: bool):
+    connector = DocumentationUAConnectorConfig()
+    tags = connector.datapoints.items[0].tags
+    if columnar:
+        tags = make_columnar(tags)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    report = import_tags(tags, tag_records(n_tags))
+    duration = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mode = "columnar" if columnar else "objects"
+    print(
+        f"{mode}: {n_tags} tags, {size / 1e6:.1f} MB, {size / n_tags:.0f} bytes per tag, "
+        f"import {duration:.1f}s"
+    )
+    print(f"  {report}")
+    return connector
+
+
+def main():
+    measure(10000, columnar=False)
+    connector = measure(100000, columnar=True)
+
+    start = time.perf_counter()
+    connector.to_json()
+    print(f"columnar to_json: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
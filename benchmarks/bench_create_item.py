@@ -0,0 +1,43 @@
+"""Compares instantiating ListField items by deep copying the blueprint with cloning it
+as a prototype, in time and in memory per tag.
+
+Run from the repository root with `python -m benchmarks.bench_create_item`.
+"""
+import time
+import tracemalloc
+
+from model.iem_model import OPCUADatapointConfig, OPCUATagConfig
+
+
+def measure(create, n_items: int):
+    tracemalloc.start()
+    start = time.perf_counter()
+    items = [create() for _ in range(n_items)]
+    duration = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return items, duration, size
+
+
+def main(n_items: int = 5000):
+    for blueprint in [
+        OPCUATagConfig(variable_name="tag", description="tag"),
+        OPCUADatapointConfig(variable_name="datapoint", description="datapoint"),
+    ]:
+        name = type(blueprint).__name__
+        _, deep_time, deep_size = measure(
+            lambda: blueprint.model_copy(deep=True), n_items
+        )
+        _, clone_time, clone_size = measure(blueprint.clone, n_items)
+        print(
+            f"{name} deep copy: {deep_time / n_items * 1e6:.1f} us, "
+            f"{deep_size / n_items:.0f} bytes per item"
+        )
+        print(
+            f"{name} clone: {clone_time / n_items * 1e6:.1f} us, "
+            f"{clone_size / n_items:.0f} bytes per item"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Compares assembling the LLM promt from long histories with the turn index against the
+previous implementation inserting every message at the front of the promt.
+
+Run from the repository root with `python -m benchmarks.bench_history`.
+"""
+import time
+from typing import Dict, List
+
+from benchmarks.synthetic import build_ua_connector_config
+from history import History
+from model.app_model import App, AppModel
+
+
+def build_session(n_turns: int) -> History:
+    """History of a commissioning session, a tag is configured in every turn."""
+    model = AppModel()
+    model.apps.append(
+        App(
+            name="OPC_UA_CONNECTOR",
+            id="456e041339e744caa9514a1c86536067",
+            description="UA Connector",
+            config=build_ua_connector_config(10),
+        )
+    )
+    history = History()
+    history.addSystemPromt("You are an expert for configuring Siemens IEM.")
+    history.addConfig(model)
+    for turn in range(n_turns):
+        history.addPromt_withStrs("user", f"Set the address of tag {turn} to ns=3;i={turn}")
+        history.addPromt_withStrs("system", [])
+        history.addConfig(model)
+        history.addPromt_withStrs("assistant", f"The address of tag {turn} was set.")
+    history.addPromt_withStrs("user", "Which tags are configured?")
+    history.addConfig(model)
+    return history
+
+
+# genPromtForLLM before the turn index, kept for comparison
+def legacy_gen_promt(history: History, n_oldAnswerResponsePairs=1) -> List[Dict]:
+    llmPromt: List[Dict] = []
+    if history.systemPromt:
+        llmPromt.append({"role": "system", "content": history.systemPromt})
+    index_promtHistory = -1
+    index_configHistory = -1
+    n_addedUserPromts = 0
+    llmPromt.insert(1, history.genConfigPromt(index_configHistory))
+    try:
+        while n_addedUserPromts < n_oldAnswerResponsePairs + 1:
+            llmPromt.insert(1, history.promtHistory[index_promtHistory])
+            if history.promtHistory[index_promtHistory]["role"] == "user":
+                n_addedUserPromts += 1
+            if history.promtHistory[index_promtHistory]["role"] == "assistant":
+                llmPromt.insert(1, history.genConfigPromt(index_configHistory))
+            index_promtHistory -= 1
+    except IndexError:
+        pass
+    llmPromt.insert(1, history.genConfigPromt(index_configHistory))
+    return llmPromt
+
+
+def measure(fct, repetitions: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        fct()
+    return (time.perf_counter() - start) / repetitions
+
+
+def main(repetitions: int = 5):
+    for n_turns in [1000, 5000, 20000]:
+        history = build_session(n_turns)
+        for n_pairs in [1, 50, n_turns]:
+            legacy = measure(lambda: legacy_gen_promt(history, n_pairs), repetitions)
+            indexed = measure(lambda: history.genPromtForLLM(n_pairs), repetitions)
+            print(
+                f"{n_turns} turns, {n_pairs} pairs: legacy {legacy * 1000:.2f} ms, "
+                f"turn index {indexed * 1000:.2f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""Compares recording a config per turn as a structurally shared snapshot against a deep copy,
+in time and retained memory, while every turn changes one tag. Undo and diffs of the
+snapshots only visit the changed path. History.addConfig records the whole AppModel per turn,
+the config promt is only rendered once it is sent.
+
+Run from the repository root with `python -m benchmarks.bench_snapshot`.
+"""
+import time
+import tracemalloc
+
+from benchmarks.synthetic import build_ua_connector_config
+from history import History
+from model.app_model import App, AppModel
+from model.snapshot import diff_snapshots
+
+
+def record_turns(config, n_turns: int, take):
+    records = []
+    tracemalloc.start()
+    start = time.perf_counter()
+    for turn in range(n_turns):
+        tag = config.datapoints.items[turn % len(config.datapoints.items)].tags.items[0]
+        tag.name.set_value(f"renamed-{turn}")
+        records.append(take())
+    duration = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return records, duration, size
+
+
+def best_of(fct, repetitions: int = 3) -> float:
+    timings = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        fct()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main(n_tags: int = 10000, n_turns: int = 20, n_copied_turns: int = 3):
+    config = build_ua_connector_config(n_tags)
+    config.snapshot()
+    snapshots, snapshot_time, snapshot_size = record_turns(config, n_turns, config.snapshot)
+    copies, copy_time, copy_size = record_turns(
+        config, n_copied_turns, lambda: config.model_copy(deep=True)
+    )
+    del copies
+
+    model = AppModel()
+    model.apps.append(
+        App(
+            name="OPC_UA_CONNECTOR",
+            id="456e041339e744caa9514a1c86536067",
+            description="UA Connector",
+            config=config,
+        )
+    )
+    history = History()
+    history.addConfig(model)
+    _, history_time, history_size = record_turns(
+        config, n_turns, lambda: history.addConfig(model)
+    )
+    start = time.perf_counter()
+    history.genConfigPromt(-1)
+    render_time = time.perf_counter() - start
+
+    print(f"{n_tags} tags")
+    print(
+        f"snapshot: {snapshot_time / n_turns * 1000:.2f} ms, "
+        f"{snapshot_size / n_turns / 1024:.1f} KiB per turn"
+    )
+    print(
+        f"History.addConfig: {history_time / n_turns * 1000:.2f} ms, "
+        f"{history_size / n_turns / 1024:.1f} KiB per turn"
+    )
+    print(f"rendering the config promt once sent: {render_time * 1000:.2f} ms")
+    print(
+        f"deep copy: {copy_time / n_copied_turns * 1000:.2f} ms, "
+        f"{copy_size / n_copied_turns / 1024:.1f} KiB per turn"
+    )
+
+    changes = diff_snapshots(snapshots[0], snapshots[-1])
+    duration = best_of(lambda: diff_snapshots(snapshots[0], snapshots[-1]))
+    print(f"diff of {n_turns} turns: {duration * 1000:.3f} ms, {len(changes)} changes")
+
+    start = time.perf_counter()
+    config.restore_snapshot(snapshots[0])
+    print(f"restore first turn: {(time.perf_counter() - start) * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Streams a synthetic JSON Lines tag export into a datapoint and reports the throughput
+and the peak memory of the import.
+
+Run from the repository root with `python -m benchmarks.bench_tag_import`.
+"""
+import json
+import os
+import tempfile
+import tracemalloc
+
+from model.iem_model import DocumentationUAConnectorConfig
+from model.tag_import import import_tag_file
+
+
+def write_export(path: str, n_tags: int):
+    with open(path, "w") as f:
+        for i in range(n_tags):
+            tag = {
+                "name": f"tag-{i}",
+                "address": f'ns=3;s="DB1"."tag{i}"',
+                "dataType": "Real",
+                "acquisitionCycle": 1000,
+                "acquisitionMode": "CyclicOnChange",
+                "isArrayTypeTag": False,
+                "accessMode": "r",
+                "comments": None,
+            }
+            f.write(json.dumps(tag) + "\n")
+
+
+def main(n_tags: int = 20000):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "tags.jsonl")
+        write_export(path, n_tags)
+        print(f"export size: {os.path.getsize(path) / 1e6:.1f} MB")
+
+        connector = DocumentationUAConnectorConfig()
+        tracemalloc.start()
+        report = import_tag_file(connector.datapoints.items[0], path)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(report)
+        print(f"peak memory: {peak / 1e6:.1f} MB ({peak / n_tags:.0f} bytes per tag)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""Compares rebuilding the tool list of the DataExtractor against the cached path.
+
+Run from the repository root with `python -m benchmarks.bench_tool_cache`.
+"""
+import os
+import time
+
+# no request is sent, but the default LLM of the DataExtractor needs a key to be constructed
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from benchmarks.synthetic import build_ua_connector_config
+from llm_integration.data_extraction import DataExtractor
+
+
+def main(n_tags: int = 5000, repetitions: int = 5):
+    config = build_ua_connector_config(n_tags)
+    extractor = DataExtractor(config)
+    print(f"{len(extractor.tool_descriptions)} tool functions for {n_tags} tags")
+
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        extractor._tools_version = None
+        extractor._refresh_tools()
+    rebuild = (time.perf_counter() - start) / repetitions
+
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        extractor._refresh_tools()
+    cached = (time.perf_counter() - start) / repetitions
+
+    print(f"rebuild: {rebuild * 1000:.2f} ms per turn")
+    print(f"cache hit: {cached * 1000:.4f} ms per turn")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Compares walking a config tree via reflection over __dict__, as the model did before,
+with walking it via the child field layout precomputed per class.
+
+Run from the repository root with `python -m benchmarks.bench_traversal`.
+"""
+import time
+
+from benchmarks.synthetic import build_ua_connector_config
+from model.iem_base_model import Field, ListField
+
+
+def count_leaves_reflection(node) -> int:
+    if isinstance(node, ListField):
+        return sum(count_leaves_reflection(item) for item in node.items)
+    count = 0
+    found_subfield = False
+    for _, field_value in node.__dict__.items():
+        if isinstance(field_value, Field):
+            if hasattr(field_value, "generate_tool_functions") and callable(
+                getattr(field_value, "generate_tool_functions")
+            ):
+                found_subfield = True
+                count += count_leaves_reflection(field_value)
+    return count if found_subfield else 1
+
+
+def count_leaves_layout(node) -> int:
+    children = node.child_fields()
+    if not children:
+        return 0 if isinstance(node, ListField) else 1
+    return sum(count_leaves_layout(child) for _, child in children)
+
+
+def measure(fct, config, repetitions: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        fct(config)
+    return (time.perf_counter() - start) / repetitions
+
+
+def main(n_tags: int = 5000, repetitions: int = 10):
+    config = build_ua_connector_config(n_tags)
+    assert count_leaves_reflection(config) == count_leaves_layout(config)
+
+    reflection = measure(count_leaves_reflection, config, repetitions)
+    layout = measure(count_leaves_layout, config, repetitions)
+    print(f"reflection: {reflection * 1000:.2f} ms per traversal")
+    print(f"layout: {layout * 1000:.2f} ms per traversal ({reflection / layout:.1f}x)")
+
+    tools = measure(lambda c: c.generate_tool_functions(), config, 1)
+    print(f"generate_tool_functions: {tools * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""Measures how the operations of the configuration model scale with the number of tags.
+
+Synthetic UA Connector and Databus configs are built for every size, then the tool generation,
+describe, to_json, fill_from_json and ListField.create_item are timed (best of the repetitions)
+and their peak memory is traced in a separate run. Nothing is sent over the network.
+
+Run from the repository root with
+
+    python -m benchmarks.suite --sizes 1 10 100 1000 10000 --output benchmark_report.json
+
+and compare with the report of an earlier version with `--baseline old_report.json`.
+"""
+import argparse
+import datetime
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.synthetic import build_databus_config, build_ua_connector_config
+from model.iem_base_model import AbstractAppConfig, ConfigNode, ListField
+from model.iem_model import DocumentationDatabusConfig, DocumentationUAConnectorConfig
+
+CONFIGS = {
+    "ua_connector": (build_ua_connector_config, DocumentationUAConnectorConfig),
+    "databus": (build_databus_config, DocumentationDatabusConfig),
+}
+DEFAULT_SIZES = [1, 10, 100, 1000, 10000]
+# number of items created by the create_item operation
+N_CREATED = 100
+# timings below this are dominated by noise and never reported as regression
+MIN_COMPARED_SECONDS = 1e-4
+
+
+def clear_serialization_caches(node: ConfigNode):
+    node.__pydantic_private__["_serialization_cache"] = None
+    for _, child in node.child_fields():
+        clear_serialization_caches(child)
+
+
+def largest_list(node: ConfigNode) -> Optional[ListField]:
+    largest = node if isinstance(node, ListField) else None
+    for _, child in node.child_fields():
+        candidate = largest_list(child)
+        if candidate is not None and (
+            largest is None or len(candidate.items) > len(largest.items)
+        ):
+            largest = candidate
+    return largest
+
+
+def operations(
+    config: AbstractAppConfig, config_class: type
+) -> Dict[str, Callable[[], Callable[[], None]]]:
+    """Every operation is a setup function returning the function to be measured, so that
+    the state the operation starts from is rebuilt before every repetition.
+    """
+    json_config = config.to_json()
+
+    def generate_tool_functions():
+        return config.generate_tool_functions
+
+    def describe_cold():
+        clear_serialization_caches(config)
+        return config.describe
+
+    def describe_cached():
+        config.describe()
+        return config.describe
+
+    def to_json_cold():
+        clear_serialization_caches(config)
+        return config.to_json
+
+    def to_json_cached():
+        config.to_json()
+        return config.to_json
+
+    def fill_from_json():
+        target = config_class()
+        return lambda: target.fill_from_json(json_config)
+
+    def create_item():
+        target = largest_list(config.clone())
+
+        def run():
+            for _ in range(N_CREATED):
+                target.create_item()
+
+        return run
+
+    return {
+        "generate_tool_functions": generate_tool_functions,
+        "describe_cold": describe_cold,
+        "describe_cached": describe_cached,
+        "to_json_cold": to_json_cold,
+        "to_json_cached": to_json_cached,
+        "fill_from_json": fill_from_json,
+        f"create_item_x{N_CREATED}": create_item,
+    }
+
+
+def measure(setup: Callable[[], Callable[[], None]], repetitions: int) -> Dict:
+    timings = []
+    for _ in range(repetitions):
+        run = setup()
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+
+    # tracing slows down the operation, so the peak memory is taken from a separate run
+    run = setup()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"seconds": min(timings), "peak_bytes": peak}
+
+
+def measure_build(build: Callable[[int], AbstractAppConfig], n_tags: int):
+    start = time.perf_counter()
+    build(n_tags)
+    duration = time.perf_counter() - start
+    tracemalloc.start()
+    config = build(n_tags)
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return config, {"seconds": duration, "peak_bytes": peak, "retained_bytes": size}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(sizes: List[int], repetitions: int, configs: List[str]) -> Dict:
+    results = []
+    for config_name in configs:
+        build, config_class = CONFIGS[config_name]
+        for n_tags in sizes:
+            config, build_result = measure_build(build, n_tags)
+            rows = [("build", build_result)]
+            for operation, setup in operations(config, config_class).items():
+                rows.append((operation, measure(setup, repetitions)))
+            for operation, result in rows:
+                results.append(
+                    {
+                        "config": config_name,
+                        "n_tags": n_tags,
+                        "operation": operation,
+                        **result,
+                    }
+                )
+                print(
+                    f"{config_name:>12} {n_tags:>6} tags {operation:>24}: "
+                    f"{result['seconds'] * 1000:10.3f} ms "
+                    f"{result['peak_bytes'] / 1024:10.1f} KiB peak"
+                )
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "created": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repetitions": repetitions,
+        },
+        "results": results,
+    }
+
+
+def compare(report: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Returns a line for every measurement which is slower or uses more memory than in the
+    baseline by more than the threshold factor.
+    """
+    previous = {
+        (r["config"], r["n_tags"], r["operation"]): r for r in baseline["results"]
+    }
+    regressions = []
+    for result in report["results"]:
+        old = previous.get((result["config"], result["n_tags"], result["operation"]))
+        if old is None:
+            continue
+        for metric in ("seconds", "peak_bytes"):
+            if metric == "seconds" and old[metric] < MIN_COMPARED_SECONDS:
+                continue
+            if old[metric] and result[metric] / old[metric] > threshold:
+                regressions.append(
+                    f"{result['config']} {result['n_tags']} tags {result['operation']} "
+                    f"{metric}: {old[metric]:.6g} -> {result[metric]:.6g} "
+                    f"({result[metric] / old[metric]:.2f}x)"
+                )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repetitions", type=int, default=3)
+    parser.add_argument(
+        "--configs", nargs="+", choices=list(CONFIGS), default=list(CONFIGS)
+    )
+    parser.add_argument("--output", default="benchmark_report.json")
+    parser.add_argument("--baseline", help="report of an earlier run to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="factor above the baseline which is reported as regression",
+    )
+    args = parser.parse_args()
+
+    report = run_suite(args.sizes, args.repetitions, args.configs)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+from model.iem_model import DocumentationDatabusConfig, DocumentationUAConnectorConfig
+
+
+def build_ua_connector_config(
+    n_tags: int, tags_per_datapoint: int = 100
+) -> DocumentationUAConnectorConfig:
+    """Build a UA Connector config holding n_tags filled tags, spread over as many
+    datapoints as needed to hold at most tags_per_datapoint tags each.
+    """
+    config = DocumentationUAConnectorConfig()
+    datapoints = config.datapoints
+    n_datapoints = max(1, -(-n_tags // tags_per_datapoint))
+
+    remaining = n_tags
+    for dp_idx in range(n_datapoints):
+        if dp_idx >= len(datapoints.items):
+            datapoints.create_item()
+        datapoint = datapoints.items[dp_idx]
+        datapoint.name.set_value(f"plc-{dp_idx}")
+        datapoint.OPCUAUrl.set_value(f"opc.tcp://10.0.{dp_idx // 256}.{dp_idx % 256}")
+        datapoint.portNumber.set_value(48010)
+        datapoint.authenticationMode.set_value("Anonymous")
+
+        n = min(tags_per_datapoint, remaining)
+        remaining -= n
+        for tag_idx in range(n):
+            if tag_idx >= len(datapoint.tags.items):
+                datapoint.tags.create_item()
+            tag = datapoint.tags.items[tag_idx]
+            tag.name.set_value(f"tag-{dp_idx}-{tag_idx}")
+            tag.address.set_value(f"ns=3;s=\"DB{dp_idx}\".\"tag{tag_idx}\"")
+            tag.dataType.set_value("Real")
+            tag.acquisitionCycle.set_value("1 second")
+            tag.accessMode.set_value("Read")
+
+    return config
+
+
+def build_databus_config(
+    n_topics: int, topics_per_user: int = 100
+) -> DocumentationDatabusConfig:
+    """Build a Databus config holding n_topics filled topics, spread over as many users
+    as needed to hold at most topics_per_user topics each. Every topic is monitored in the
+    live view as well.
+    """
+    config = DocumentationDatabusConfig()
+    users = config.userConfig
+    n_users = max(1, -(-n_topics // topics_per_user))
+    config.persistence.set_value(True)
+    config.autosave_interval.set_value("1 hour")
+
+    remaining = n_topics
+    for user_idx in range(n_users):
+        if user_idx >= len(users.items):
+            users.create_item()
+        user = users.items[user_idx]
+        user.username.set_value(f"user-{user_idx}")
+        user.password.set_value(f"secret-{user_idx}")
+
+        n = min(topics_per_user, remaining)
+        remaining -= n
+        for topic_idx in range(n):
+            if topic_idx >= len(user.topics.items):
+                user.topics.create_item()
+            topic = user.topics.items[topic_idx]
+            topic.topic_name.set_value(f"ie/d/j/simatic/v1/plc-{user_idx}/tag-{topic_idx}")
+            topic.access_rights.set_value("Publish and Subscribe")
+
+    live_topics = config.live_view_config.topics
+    for idx in range(n_topics):
+        if idx >= len(live_topics.items):
+            live_topics.create_item()
+        live_topics.items[idx].set_value(f"ie/d/j/simatic/v1/plc-{idx // topics_per_user}")
+
+    return config
@@ -23,3 +23,7 @@ class ValidationException(Exception):
 
     def __str__(self):
         return self.message
+
+
+class LLMDeadlineException(LLMInteractionException):
+    pass
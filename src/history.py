@@ -1,21 +1,176 @@
-from typing import List, Dict
-from model.app_model import AppModel
+from collections import deque
+from typing import Callable, Deque, List, Dict, Optional, Union
+from pydantic.dataclasses import dataclass
+from model.app_model import AppModel, AppModelSnapshot
+from model.snapshot import ConfigChange
+from caching import LRUCache
+
+
+@dataclass
+class Turn:
+    """Messages from one user promt up to the next one. The messages added before the first
+    user promt form a turn without user promt.
+    """
+
+    index: int
+    messages: List[Dict]
+    # index in configHistory of the latest config added up to the end of the turn, -1 if none
+    config_index: int
+    has_user_promt: bool
+
+
+# kinds of PromtEntry, in the order they appear in an LLM request
+SYSTEM_ENTRY = "system"
+BASE_CONFIG_ENTRY = "base"
+CONFIG_BEFORE_ENTRY = "before"
+ANSWER_CONFIG_ENTRY = "answer_config"
+MESSAGE_ENTRY = "message"
+CURRENT_CONFIG_ENTRY = "current"
+CONFIG_ENTRIES = (
+    BASE_CONFIG_ENTRY,
+    CONFIG_BEFORE_ENTRY,
+    ANSWER_CONFIG_ENTRY,
+    CURRENT_CONFIG_ENTRY,
+)
+
+
+# entry of History.configDeltaCache for a delta which is longer than the whole config
+FULL_CONFIG = "full"
+
+
+@dataclass
+class PromtEntry:
+    """One message of an LLM request as laid out by History.genPromtLayout, config promts
+    are kept as their index in configHistory until the layout is rendered.
+    """
+
+    kind: str
+    # the message, for config entries a replacement of the rendered config promt (e.g. a
+    # truncated one), which still counts as the config promt the next changes refer to
+    message: Optional[Dict] = None
+    config_index: int = -1
+    # Turn.index of the turn the entry belongs to, None for the entries around the turns
+    turn_index: Optional[int] = None
 
 
 class History:
 
     def __init__(self):
         self.promtHistory: List[Dict] = []
-        self.configHistory: List[AppModel] = []
+        # snapshots of the model, consecutive snapshots share all unchanged subtrees
+        self.configHistory: List[AppModelSnapshot] = []
+        # index of the snapshot the model is in, moved by undo and redo
+        self.configCursor = -1
+        # index of the snapshot each snapshot was derived from, -1 for the first one
+        self.configParents: List[int] = []
+        self.redoStack: List[int] = []
+        self.systemPromt = ""
+        # rendered config promts by AppModel.version() of the snapshot, the only place they
+        # are kept. A config is rendered once it is sent, not when its snapshot is taken
+        self.configPromtCache = LRUCache(maxsize=16)
+        # promtHistory grouped by turns, indexed by Turn.index
+        self.turns: Deque[Turn] = deque()
+        # with deltaConfigs only the first config promt of an LLM request contains the whole
+        # config (the base), the following ones list the changes to the config promt before.
+        # The base is kept for fullConfigInterval turns so that the start of the requests stays
+        # the same, then it (or after requestFullConfig) moves to the config of the oldest turn sent
+        self.deltaConfigs = True
+        self.fullConfigInterval = 5
+        self.baseConfig = -1
+        self.baseConfigTurn = -1
+        self.configDeltaCache = LRUCache(maxsize=64)
+        # SessionStore the history is logged to, see SessionStore.attach
+        self.store = None
+        # loads the entries of configHistory which are None, set when a session is resumed
+        self.configLoader: Optional[Callable[[int], AppModelSnapshot]] = None
 
     def addSystemPromt(self, systemPromt):
+        if self.store is not None and systemPromt != self.systemPromt:
+            self.store.log_system_promt(systemPromt)
         self.systemPromt = systemPromt
 
     def addPromt_withStrs(self, role: str, message: str):
-        self.promtHistory.append({"role": role, "content": message})
+        promt = {"role": role, "content": message}
+        if self.store is not None:
+            self.store.log_promt(promt)
+        self.promtHistory.append(promt)
+        if role == "user" or not self.turns:
+            self.turns.append(
+                Turn(
+                    index=len(self.turns),
+                    messages=[],
+                    config_index=self.configCursor,
+                    has_user_promt=role == "user",
+                )
+            )
+        self.turns[-1].messages.append(promt)
 
     def addConfig(self, config: AppModel):
-        self.configHistory.append(config)
+        self.addSnapshot(config.snapshot())
+
+    def addSnapshot(self, snapshot: Optional[AppModelSnapshot]):
+        if self.store is not None:
+            self.store.log_config(snapshot, self.configCursor)  # type: ignore[arg-type]
+        self.configHistory.append(snapshot)  # type: ignore[arg-type]
+        self.configParents.append(self.configCursor)
+        self.configCursor = len(self.configHistory) - 1
+        self.redoStack.clear()
+        if self.turns:
+            self.turns[-1].config_index = self.configCursor
+
+    # entry of configHistory, loaded by configLoader if it was not needed since the session
+    # was resumed
+    def getConfig(self, index: int) -> AppModelSnapshot:
+        if index < 0:
+            index += len(self.configHistory)
+        snapshot = self.configHistory[index]
+        if snapshot is None and self.configLoader is not None:
+            snapshot = self.configHistory[index] = self.configLoader(index)
+        return snapshot
+
+    # restores the snapshot the current one was derived from, returns False if there is none
+    def undo(self, config: AppModel) -> bool:
+        if self.configCursor < 0 or self.configParents[self.configCursor] < 0:
+            return False
+        self.redoStack.append(self.configCursor)
+        self.configCursor = self.configParents[self.configCursor]
+        config.restore_snapshot(self.getConfig(self.configCursor))
+        self.logCursor()
+        return True
+
+    def redo(self, config: AppModel) -> bool:
+        if not self.redoStack:
+            return False
+        self.configCursor = self.redoStack.pop()
+        config.restore_snapshot(self.getConfig(self.configCursor))
+        self.logCursor()
+        return True
+
+    def logCursor(self):
+        if self.store is not None:
+            self.store.log_cursor(self.configCursor, self.redoStack)
+
+    # changed values between two entries of configHistory, only subtrees which are not shared
+    # between the snapshots are compared
+    def diffConfigs(self, old_index: int, new_index: int) -> List[ConfigChange]:
+        return self.getConfig(old_index).diff(self.getConfig(new_index))
+
+    def getTurn(self, index: int) -> Turn:
+        return self.turns[index]
+
+    # returns the latest turns containing n user promts in chronological order, walking back only
+    # over the selected turns
+    def getLatestTurns(self, n_userPromts: int) -> List[Turn]:
+        selected: List[Turn] = []
+        n_added = 0
+        for turn in reversed(self.turns):
+            if n_added >= n_userPromts:
+                break
+            selected.append(turn)
+            if turn.has_user_promt:
+                n_added += 1
+        selected.reverse()
+        return selected
 
     def getPromtHistory(self) -> List[Dict]:
         return self.promtHistory
@@ -45,11 +200,81 @@ class History:
 
     # TODO: improve and maybe put somewhere else
     def genConfigPromt(self, index):
-        return {
-            "role": "system",
-            "content": "The current configuration is: "
-            + self.configHistory[index].generate_prompt_string(),
-        }
+        snapshot = self.getConfig(index)
+        return self.configPromtCache.get_or_create(
+            snapshot.version,
+            lambda: {
+                "role": "system",
+                "content": "The current configuration is: "
+                + snapshot.generate_prompt_string(),
+            },
+        )
+
+    # changes between two entries of configHistory as shown by the config promts, None if
+    # nothing visible changed. Falls back to the whole config if that is shorter
+    def genConfigDeltaPromt(self, old_index: int, new_index: int) -> Optional[Dict]:
+        old, new = self.getConfig(old_index), self.getConfig(new_index)
+
+        def render() -> Union[None, Dict, str]:
+            changes = old.diff_described(new)
+            # the description of the fields is only known from the full promt of an app, so
+            # added apps are rendered in full instead of as a list of added values
+            added = old.added_apps(new)
+            if not changes and not added:
+                return None
+            content = "Changes to the configuration since the last configuration message:"
+            content += "".join("\n" + str(change) for change in changes)
+            if added:
+                content += "\nAdded apps: " + "".join(
+                    app.generate_prompt_string() for app in added
+                )
+            promt = {"role": "system", "content": content}
+            full = self.genConfigPromt(new_index)
+            return FULL_CONFIG if len(full["content"]) <= len(promt["content"]) else promt
+
+        delta = self.configDeltaCache.get_or_create((old.version, new.version), render)
+        # the whole config is kept by configPromtCache only
+        if delta == FULL_CONFIG:
+            return self.genConfigPromt(new_index)
+        return delta
+
+    # the whole config is sent again as base of the next LLM request
+    def requestFullConfig(self):
+        self.baseConfig = -1
+
+    # index of the config sent in full when deltaConfigs is set, moved to candidate if the
+    # base is older than fullConfigInterval turns
+    def getBaseConfig(self, candidate: int) -> int:
+        if (
+            self.baseConfig < 0
+            or len(self.turns) - self.baseConfigTurn >= self.fullConfigInterval
+        ):
+            self.baseConfig = candidate
+            self.baseConfigTurn = len(self.turns)
+        return self.baseConfig
+
+    # config promts for the given indices of configHistory in the order they are sent, None for
+    # the ones which are skipped. With deltaConfigs the first config is rendered in full and
+    # the others as changes to the config before, so the promts have to be sent together
+    def genConfigPromts(self, indices: List[int]) -> List[Optional[Dict]]:
+        promts: List[Optional[Dict]] = []
+        previous = -1
+        for index in indices:
+            if index < 0:
+                promts.append(None)
+                continue
+            if not self.deltaConfigs or previous < 0:
+                promts.append(self.genConfigPromt(index))
+            else:
+                promts.append(self.genConfigDeltaPromt(previous, index))
+            previous = index
+        return promts
+
+    # index of the config which was current when the turn started
+    def getConfigBefore(self, turn: Turn) -> int:
+        if turn.index > 0:
+            return self.turns[turn.index - 1].config_index
+        return 0 if self.configHistory else -1
 
     def genPromtForLLM(self, n_oldAnswerResponsePairs=1) -> List[Dict]:
         """Structure of promtHistory:
@@ -70,36 +295,72 @@ class History:
             user: new promt
             Optional[system: new validationPromt]
             system: new config promt
+
+        Only the selected turns are visited, the config promts are rendered from the configs
+        which were current at the end of the corresponding turns. With deltaConfigs the base
+        config follows the system promt and the config promts are the changes to the config
+        promt before, unchanged configs are left out.
         """
 
-        llmPromt: List[Dict] = []
+        # + 1 because new user promt should not be counted
+        turns = self.getLatestTurns(n_oldAnswerResponsePairs + 1)
+        return self.renderPromtLayout(self.genPromtLayout(turns))
 
+    # the entries of an LLM request with the given turns, see genPromtForLLM. The
+    # ContextBuilder drops entries of this layout to fit its budget
+    def genPromtLayout(self, turns: List[Turn]) -> List[PromtEntry]:
+        entries: List[PromtEntry] = []
         if self.systemPromt:
-            llmPromt.append({"role": "system", "content": self.systemPromt})
-
-        index_promtHistory = -1
-        index_configHistory = -1
-        n_addedUserPromts = 0
-
-        llmPromt.insert(1, self.genConfigPromt(index_configHistory))
-
-        # adds as many promts from promtHistory to llmPromt as wanted through iterating backwards over promtHistory
-        try:
-            while (
-                n_addedUserPromts < n_oldAnswerResponsePairs + 1
-            ):  # + 1 because new user promt should not be counted
-
-                llmPromt.insert(1, self.promtHistory[index_promtHistory])
-                if self.promtHistory[index_promtHistory]["role"] == "user":
-                    n_addedUserPromts += 1
-                if self.promtHistory[index_promtHistory]["role"] == "assistent":
-                    llmPromt.insert(1, self.genConfigPromt(index_configHistory))
-                index_promtHistory -= 1
-        except IndexError:
-            pass  # stop adding to llmPromt at latest when end of promtHistory is reached
-        llmPromt.insert(1, self.genConfigPromt(index_configHistory))
-
-        return llmPromt
+            entries.append(
+                PromtEntry(
+                    kind=SYSTEM_ENTRY,
+                    message={"role": "system", "content": self.systemPromt},
+                )
+            )
+
+        # config before the oldest selected turn
+        if turns:
+            before = self.getConfigBefore(turns[0])
+            if self.deltaConfigs:
+                entries.append(
+                    PromtEntry(kind=BASE_CONFIG_ENTRY, config_index=self.getBaseConfig(before))
+                )
+            entries.append(PromtEntry(kind=CONFIG_BEFORE_ENTRY, config_index=before))
+
+        for turn in turns:
+            for promt in turn.messages:
+                if promt["role"] in ("assistant", "assistent"):
+                    entries.append(
+                        PromtEntry(
+                            kind=ANSWER_CONFIG_ENTRY,
+                            config_index=turn.config_index,
+                            turn_index=turn.index,
+                        )
+                    )
+                entries.append(
+                    PromtEntry(kind=MESSAGE_ENTRY, message=promt, turn_index=turn.index)
+                )
+
+        entries.append(PromtEntry(kind=CURRENT_CONFIG_ENTRY, config_index=self.configCursor))
+        return entries
+
+    # the messages of the layout, the config promts are rendered together as with
+    # deltaConfigs each of them refers to the one before. Skipped configs are left out
+    def renderPromtLayout(self, entries: List[PromtEntry]) -> List[Dict]:
+        configPromts = self.genConfigPromts(
+            [entry.config_index for entry in entries if entry.kind in CONFIG_ENTRIES]
+        )
+        result = []
+        position = 0
+        for entry in entries:
+            promt = entry.message
+            if entry.kind in CONFIG_ENTRIES:
+                if promt is None:
+                    promt = configPromts[position]
+                position += 1
+            if promt is not None:
+                result.append(promt)
+        return result
 
     def printPromtHistory(self):
         print("Promt History:")
@@ -0,0 +1,80 @@
+import asyncio
+import os
+import threading
+import weakref
+from typing import Dict, Optional, Tuple
+
+import httpx
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient, DefaultHttpxClient, OpenAI
+
+DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+# the httpx default drops idle connections after 5 s, less than the time between two turns of
+# a user, so every turn would open a new TLS connection
+CONNECTION_LIMITS = httpx.Limits(
+    max_connections=100, max_keepalive_connections=20, keepalive_expiry=120.0
+)
+TIMEOUT = httpx.Timeout(120.0, connect=5.0)
+
+ClientKey = Tuple[str, Optional[str]]
+
+_lock = threading.Lock()
+_clients: Dict[ClientKey, OpenAI] = {}
+# async clients are bound to the event loop their connections were opened in
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[ClientKey, AsyncOpenAI]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+# base url and api key as the OpenAI client resolves them
+def client_key(base_url: Optional[str], api_key: Optional[str]) -> ClientKey:
+    base_url = str(base_url or os.environ.get("OPENAI_BASE_URL") or DEFAULT_BASE_URL)
+    return base_url.rstrip("/"), api_key or os.environ.get("OPENAI_API_KEY")
+
+
+def get_client(base_url: Optional[str] = None, api_key: Optional[str] = None) -> OpenAI:
+    """OpenAI client shared by all LLMs of the process with the same base url and api key, so
+    that their connections are reused across sessions and services.
+    """
+    key = client_key(base_url, api_key)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = OpenAI(
+                base_url=key[0],
+                api_key=key[1],
+                timeout=TIMEOUT,
+                http_client=DefaultHttpxClient(limits=CONNECTION_LIMITS, timeout=TIMEOUT),
+            )
+            _clients[key] = client
+        return client
+
+
+def get_async_client(
+    base_url: Optional[str] = None, api_key: Optional[str] = None
+) -> AsyncOpenAI:
+    """Like get_client, shared within the running event loop."""
+    key = client_key(base_url, api_key)
+    loop = asyncio.get_running_loop()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client = AsyncOpenAI(
+                base_url=key[0],
+                api_key=key[1],
+                timeout=TIMEOUT,
+                http_client=DefaultAsyncHttpxClient(
+                    limits=CONNECTION_LIMITS, timeout=TIMEOUT
+                ),
+            )
+            clients[key] = client
+        return client
+
+
+def clear_clients():
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+        _async_clients.clear()
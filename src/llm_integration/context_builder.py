@@ -0,0 +1,309 @@
+from __future__ import annotations
+
+import math
+import re
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple
+
+from pydantic.dataclasses import dataclass
+
+from caching import LRUCache
+from history import (
+    ANSWER_CONFIG_ENTRY,
+    BASE_CONFIG_ENTRY,
+    CONFIG_BEFORE_ENTRY,
+    CONFIG_ENTRIES,
+    CURRENT_CONFIG_ENTRY,
+    MESSAGE_ENTRY,
+    SYSTEM_ENTRY,
+    History,
+    PromtEntry,
+    Turn,
+)
+
+# tokens the chat format adds to every message besides its content
+MESSAGE_OVERHEAD = 4
+OMITTED_CONFIG = "The configuration at this point is omitted."
+TRUNCATION_MARKER = " ... (truncated)"
+
+
+class Tokenizer(ABC):
+    """Estimates the number of tokens of a text locally, without calling a model."""
+
+    @abstractmethod
+    def count(self, text: str) -> int:
+        pass
+
+
+class CharTokenizer(Tokenizer):
+    """Approximates tokens by characters, about four characters per token for english
+    text with the tokenizers of the GPT models.
+    """
+
+    def __init__(self, chars_per_token: float = 4.0):
+        self.chars_per_token = chars_per_token
+
+    def count(self, text: str) -> int:
+        return math.ceil(len(text) / self.chars_per_token)
+
+
+class WordTokenizer(Tokenizer):
+    """Counts words and punctuation marks, long words count as several tokens. Closer to
+    the real count than CharTokenizer for the JSON-like config dumps.
+    """
+
+    pattern = re.compile(r"\w+|[^\w\s]")
+
+    def __init__(self, chars_per_word_token: int = 6):
+        self.chars_per_word_token = chars_per_word_token
+
+    def count(self, text: str) -> int:
+        return sum(
+            math.ceil(len(word) / self.chars_per_word_token)
+            for word in self.pattern.findall(text)
+        )
+
+
+@dataclass
+class ContextReport:
+    budget: int
+    tokens: int
+    system_tokens: int
+    config_tokens: int
+    turn_tokens: int
+    included_turns: int
+    omitted_turns: int
+    omitted_config_promts: int
+    config_truncated: bool
+
+    @property
+    def within_budget(self) -> bool:
+        return self.tokens <= self.budget
+
+
+class ContextBuilder:
+    """Builds the messages of an LLM request from the History within a token budget.
+
+    The system promt, the latest turn and the current config are always sent, the current
+    config is truncated if they do not fit otherwise. Older turns are added newest first
+    as long as they fit, the config dumps of older turns only if there is budget left.
+    Older turns which do not fit are replaced by a short summary of the user promts.
+    The messages are the ones of History.genPromtForLLM (History.genPromtLayout), entries
+    which do not fit are dropped or replaced.
+
+    With History.deltaConfigs the base config (truncated if needed) and the changes up to the
+    current config are required instead, the changes before the answers of older turns are
+    sent if all of them fit.
+    """
+
+    def __init__(
+        self,
+        budget: int,
+        tokenizer: Optional[Tokenizer] = None,
+        n_oldAnswerResponsePairs: int = 1,
+        summary_chars_per_promt: int = 100,
+    ):
+        self.budget = budget
+        self.tokenizer = tokenizer or CharTokenizer()
+        self.n_oldAnswerResponsePairs = n_oldAnswerResponsePairs
+        self.summary_chars_per_promt = summary_chars_per_promt
+        self.last_report: Optional[ContextReport] = None
+        # the same config dumps are counted in every turn, the hash of a str is computed once
+        self.token_counts = LRUCache(maxsize=256)
+
+    def message_tokens(self, message: Dict) -> int:
+        content = str(message["content"])
+        return (
+            self.token_counts.get_or_create(content, lambda: self.tokenizer.count(content))
+            + MESSAGE_OVERHEAD
+        )
+
+    def total_tokens(self, messages: List[Dict]) -> int:
+        return sum(self.message_tokens(message) for message in messages)
+
+    # cuts the content of the message so that the message takes at most max_tokens, None if
+    # not even the message without content fits
+    def truncate(self, message: Dict, max_tokens: int) -> Optional[Dict]:
+        max_tokens = max(max_tokens, 0)
+        content = str(message["content"])
+        low, high = 0, len(content)
+        while low < high:
+            middle = (low + high + 1) // 2
+            candidate = {**message, "content": content[:middle] + TRUNCATION_MARKER}
+            if self.message_tokens(candidate) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        truncated = {**message, "content": content[:low] + TRUNCATION_MARKER}
+        if self.message_tokens(truncated) > max_tokens:
+            return None
+        return truncated
+
+    def summarize(self, turns: List[Turn], max_tokens: int) -> Optional[Dict]:
+        promts = [
+            str(message["content"])[: self.summary_chars_per_promt]
+            for turn in turns
+            for message in turn.messages
+            if message["role"] == "user"
+        ]
+        if not promts or max_tokens <= MESSAGE_OVERHEAD + 8:
+            return None
+        summary: Dict = {
+            "role": "system",
+            "content": f"{len(turns)} earlier turns are omitted, the user wrote: "
+            + "; ".join(f'"{promt}"' for promt in promts),
+        }
+        if self.message_tokens(summary) > max_tokens:
+            return self.truncate(summary, max_tokens)
+        return summary
+
+    def build(self, history: History) -> List[Dict]:
+        turns = history.getLatestTurns(self.n_oldAnswerResponsePairs + 1)
+        layout = history.genPromtLayout(turns)
+        latest, older = turns[-1:], turns[:-1]
+        system = [entry for entry in layout if entry.kind == SYSTEM_ENTRY]
+        used = self.total_tokens(history.renderPromtLayout(system))
+        used += self.total_tokens([m for turn in latest for m in turn.messages])
+
+        # required: system promt, latest turn and current config, with deltaConfigs the base
+        # and the changes from it to the current config. The base or else the current config
+        # is truncated if they do not fit otherwise
+        required = [
+            entry
+            for entry in layout
+            if entry.kind in (BASE_CONFIG_ENTRY, CURRENT_CONFIG_ENTRY)
+        ]
+        config_truncated = False
+        for entry in list(required):
+            required_tokens = self.total_tokens(history.renderPromtLayout(required))
+            if used + required_tokens <= self.budget:
+                break
+            prefix = required[: required.index(entry) + 1]
+            rendered = history.renderPromtLayout(prefix)
+            if len(rendered) == len(history.renderPromtLayout(prefix[:-1])):
+                # nothing to truncate, e.g. the current config is unchanged since the base
+                continue
+            entry_tokens = self.message_tokens(rendered[-1])
+            entry.message = self.truncate(
+                rendered[-1], self.budget - used - (required_tokens - entry_tokens)
+            )
+            config_truncated = True
+            if entry.message is None:
+                # not even the truncation marker fits
+                required = _without(required, entry)
+                layout = _without(layout, entry)
+        used += self.total_tokens(history.renderPromtLayout(required))
+
+        included, omitted = self.select_turns(older, used)
+        used += sum(self.total_tokens(turn.messages) for turn in included)
+        shown = included + latest
+        shown_indices = {turn.index for turn in shown}
+        layout = [
+            entry
+            for entry in layout
+            if entry.turn_index is None or entry.turn_index in shown_indices
+        ]
+
+        # config promts before the first shown turn and before every answer
+        optional = []
+        for entry in layout:
+            if entry.kind == CONFIG_BEFORE_ENTRY:
+                entry.config_index = history.getConfigBefore(shown[0])
+                optional.append(entry)
+            elif entry.kind == ANSWER_CONFIG_ENTRY:
+                optional.append(entry)
+        if history.deltaConfigs:
+            layout, used, n_omitted_configs = self.fit_delta_configs(
+                history, layout, optional, used
+            )
+        else:
+            layout, used, n_omitted_configs = self.fit_configs(history, layout, optional, used)
+
+        # the summary of older turns follows the system promt and the base config
+        summary = self.summarize(omitted, self.budget - used) if omitted else None
+        if summary is not None:
+            position = 0
+            while position < len(layout) and layout[position].kind in (
+                SYSTEM_ENTRY,
+                BASE_CONFIG_ENTRY,
+            ):
+                position += 1
+            layout.insert(position, PromtEntry(kind=MESSAGE_ENTRY, message=summary))
+
+        messages = history.renderPromtLayout(layout)
+        self.last_report = ContextReport(
+            budget=self.budget,
+            tokens=self.total_tokens(messages),
+            system_tokens=self.total_tokens(history.renderPromtLayout(system)),
+            config_tokens=self.total_tokens(
+                history.renderPromtLayout(
+                    [entry for entry in layout if entry.kind in CONFIG_ENTRIES]
+                )
+            ),
+            turn_tokens=self.total_tokens([m for turn in shown for m in turn.messages]),
+            included_turns=len(shown),
+            omitted_turns=len(omitted),
+            omitted_config_promts=n_omitted_configs,
+            config_truncated=config_truncated,
+        )
+        return messages
+
+    # older turns which fit into the budget besides the used tokens, newest first, and the
+    # turns before them which are omitted
+    def select_turns(self, older: List[Turn], used: int) -> Tuple[List[Turn], List[Turn]]:
+        included: List[Turn] = []
+        for turn in reversed(older):
+            tokens = self.total_tokens(turn.messages)
+            if used + tokens > self.budget:
+                break
+            included.append(turn)
+            used += tokens
+        included.reverse()
+        return included, older[: len(older) - len(included)]
+
+    # every config promt is complete, they are added newest first as long as they fit and
+    # replaced by a short note otherwise
+    def fit_configs(
+        self, history: History, layout: List[PromtEntry], optional: List[PromtEntry], used: int
+    ) -> Tuple[List[PromtEntry], int, int]:
+        note = {"role": "system", "content": OMITTED_CONFIG}
+        n_omitted = 0
+        for entry in reversed(optional):
+            rendered = history.renderPromtLayout([entry])
+            if not rendered:
+                continue
+            tokens = self.message_tokens(rendered[0])
+            if used + tokens > self.budget:
+                n_omitted += 1
+                tokens = self.message_tokens(note)
+                if used + tokens > self.budget:
+                    layout = _without(layout, entry)
+                    continue
+                entry.message = note
+            used += tokens
+        return layout, used, n_omitted
+
+    # every config promt refers to the one before, so they are sent all or none of them, the
+    # current config then refers to the base
+    def fit_delta_configs(
+        self, history: History, layout: List[PromtEntry], optional: List[PromtEntry], used: int
+    ) -> Tuple[List[PromtEntry], int, int]:
+        configs = [entry for entry in layout if entry.kind in CONFIG_ENTRIES]
+        required = [entry for entry in configs if not any(entry is o for o in optional)]
+        extra_tokens = self.total_tokens(history.renderPromtLayout(configs))
+        extra_tokens -= self.total_tokens(history.renderPromtLayout(required))
+        if used + extra_tokens <= self.budget:
+            return layout, used + extra_tokens, 0
+        promts = history.genConfigPromts([entry.config_index for entry in configs])
+        n_omitted = sum(
+            1
+            for entry, promt in zip(configs, promts)
+            if promt is not None and any(entry is o for o in optional)
+        )
+        for entry in optional:
+            layout = _without(layout, entry)
+        return layout, used, n_omitted
+
+
+def _without(entries: List[PromtEntry], entry: PromtEntry) -> List[PromtEntry]:
+    return [other for other in entries if other is not entry]
@@ -1,7 +1,9 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+from openai.types.chat import ChatCompletionMessageToolCall
 from model.app_model import AppModel
+from model.iem_base_model import batched_mark_dirty
 import json
-from llm_integration.llm_service import LLM, GPT4o
+from llm_integration.llm_service import LLM, GPT4o, ResponseToolCallPair
 from error_handling import ValidationException
 from history import History
 
@@ -11,12 +13,23 @@ class DataExtractor:
     model: AppModel
     client: LLM
 
-    def __init__(self, data_obj: AppModel, llm=GPT4o()):
+    def __init__(
+        self, data_obj: AppModel, llm: Optional[LLM] = None, collapse_list_tools=False
+    ):
         self.model = data_obj
-        self.client = llm
+        # created here and not as default argument, which would connect at import time
+        self.client = llm if llm is not None else GPT4o()
+        if collapse_list_tools:
+            # one tool per field of a list entry with the index as parameter, instead of one per entry
+            self.model.set_collapsed_tools(True)
+        self._tools_version = None
         self._refresh_tools()
 
+    # rebuilds the tool descriptions and function_lib, but only if the structure of the model changed
     def _refresh_tools(self):
+        version = self.model.structure_version()
+        if version == self._tools_version:
+            return
 
         tools = self.model.generate_tool_functions()
         self.function_lib = {}
@@ -26,8 +39,14 @@ class DataExtractor:
             self.function_lib[item.name] = item.fct
 
         self.tool_descriptions = [i.llm_description for i in tools]
+        self._tools_version = version
         print("tool fcts: " + str(self.tool_descriptions))
 
+    # tool descriptions of the current structure of the model
+    def get_tools(self) -> List[Dict]:
+        self._refresh_tools()
+        return self.tool_descriptions
+
     def update_data(self, history: History):
         self._refresh_tools()
         # if self.client.system_prompt:
@@ -37,40 +56,126 @@ class DataExtractor:
         #    })
         userPromt = history.getLatestPromtAsDict("user")
         response_pair = self.client.prompt_tool([userPromt], self.tool_descriptions)
+        self.apply_response(history, response_pair)
+
+    async def update_data_async(self, history: History):
+        self._refresh_tools()
+        userPromt = history.getLatestPromtAsDict("user")
+        response_pair = await self.client.prompt_tool_async(
+            [userPromt], self.tool_descriptions
+        )
+        self.apply_response(history, response_pair)
+
+    # calls the tool functions of the response, adds the validation promts and the new config,
+    # returns the validation promts
+    def apply_response(
+        self, history: History, response_pair: ResponseToolCallPair
+    ) -> List[str]:
         # response_message = response_pair.response
         tool_calls = response_pair.tool_calls
         extractor_message = response_pair.response
-        validationPromts: List[str] = []
         print(f"The extractor message is:\n{extractor_message}\n\n")
         print(f"tool_calls:\n {tool_calls}\n\n")
 
+        validationPromts: List[str] = []
         if tool_calls is not None:
-            # Execute all function calls given by
-            for tool_call in tool_calls:
-                function_name = tool_call.function.name
-                function_to_call = self.function_lib[function_name]
-                function_args = json.loads(tool_call.function.arguments)
-                try:
-                    print(
-                        f"Trying to call function {function_name} with {function_args}\n\n"
-                    )
-                    function_to_call(
-                        **function_args,
-                    )
-                    print(f"Executing {function_name} was succesful!\n\n")
-                    # No adding to validationPromts
-                except ValidationException:
-                    print(f"Validation Error concerning {function_name}!\n\n")
+            validationPromts = self.apply_tool_calls(tool_calls)
+            print(f"Validation Message:\n{validationPromts}")
+            if validationPromts:
+                history.addPromt_withStrs("system", "\n".join(validationPromts))
 
-                    # TODO: Improve validationMessage (Promt from role system to LLM)
+        history.addConfig(self.model)
+        return validationPromts
+
+    # parses the arguments of all calls before anything is changed, calls whose arguments
+    # are no JSON object, have unknown parameters or miss required ones are left out
+    def parse_tool_calls(
+        self, tool_calls: List[ChatCompletionMessageToolCall]
+    ) -> Tuple[List[Tuple[str, Dict]], List[str]]:
+        parameters = {
+            tool["function"]["name"]: tool["function"]["parameters"]
+            for tool in self.tool_descriptions
+            if "parameters" in tool["function"]
+        }
+        calls = []
+        validationPromts = []
+        for tool_call in tool_calls:
+            function_name = tool_call.function.name
+            try:
+                function_args = json.loads(tool_call.function.arguments or "{}")
+            except ValueError:
+                function_args = None
+            if not isinstance(function_args, dict):
+                validationPromts.append(
+                    f"""The arguments of the {function_name} function are no valid JSON object.\n"""
+                )
+                continue
+            # tools of items created by an earlier call of the batch are not known yet
+            schema = parameters.get(function_name)
+            if schema is not None:
+                unknown = set(function_args) - set(schema.get("properties", {}))
+                if unknown:
                     validationPromts.append(
-                        f"""The execution of the {function_name} function failed due a Validation Error 
-                    i.e. the given value did not meet the requirements for the field. 
-                    Please regard this and ask the user for a new value.\n"""
+                        f"""The {function_name} function has no parameters {", ".join(sorted(unknown))}.\n"""
+                    )
+                    continue
+                missing = [name for name in schema.get("required", []) if name not in function_args]
+                if missing:
+                    validationPromts.append(
+                        f"""The {function_name} function is missing the parameters {", ".join(missing)}.\n"""
                     )
+                    continue
+            calls.append((function_name, function_args))
+        return calls, validationPromts
 
-            print(f"Validation Message:\n{validationPromts}")
-            if validationPromts != "":
-                history.addPromt_withStrs("system", validationPromts)
+    def apply_tool_calls(self, tool_calls: List[ChatCompletionMessageToolCall]) -> List[str]:
+        """Applies the tool calls of one response as a batch and returns the validation promts.
 
-        history.addConfig(self.model)
+        The arguments of all calls are parsed and checked first. The calls are applied in
+        order, as later calls may refer to items created by earlier ones, and a call with an
+        invalid value is skipped like before. The parents of the changed fields are marked
+        dirty once for the whole batch. If a call fails unexpectedly, the model is rolled
+        back to its state before the batch and none of the changes are kept.
+        """
+        calls, validationPromts = self.parse_tool_calls(tool_calls)
+        before = self.model.snapshot()
+        n_applied = 0
+        try:
+            with batched_mark_dirty():
+                for function_name, function_args in calls:
+                    # fields created by an earlier call of the same response are only found in the index of the model
+                    function_to_call = self.function_lib.get(
+                        function_name
+                    ) or self.model.resolve_tool(function_name)
+                    if function_to_call is None:
+                        # collapsed tools of an app added by an earlier call of the same response
+                        self._refresh_tools()
+                        function_to_call = self.function_lib.get(function_name)
+                    if function_to_call is None:
+                        print(f"Function {function_name} does not exist!\n\n")
+                        validationPromts.append(
+                            f"""The function {function_name} does not exist. Please only use the given functions.\n"""
+                        )
+                        continue
+                    try:
+                        function_to_call(**function_args)
+                        n_applied += 1
+                    except ValidationException:
+                        print(f"Validation Error concerning {function_name}!\n\n")
+
+                        # TODO: Improve validationMessage (Promt from role system to LLM)
+                        validationPromts.append(
+                            f"""The execution of the {function_name} function failed due a Validation Error 
+                    i.e. the given value did not meet the requirements for the field. 
+                    Please regard this and ask the user for a new value.\n"""
+                        )
+        except Exception as e:
+            print(f"Rolling back {len(calls)} tool calls after: {e!r}\n\n")
+            self.model.restore_snapshot(before)
+            self._refresh_tools()
+            return [
+                f"Applying the function calls failed with {type(e).__name__}: {e}. "
+                "None of the changes were saved, the configuration is unchanged.\n"
+            ]
+        print(f"Applied {n_applied} of {len(tool_calls)} tool calls\n\n")
+        return validationPromts
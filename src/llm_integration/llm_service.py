@@ -1,14 +1,22 @@
 from dotenv import load_dotenv
 from pydantic.dataclasses import dataclass
-from openai import OpenAI
-from openai.types.chat import ChatCompletion, ChatCompletionMessageToolCall
+from openai import AsyncOpenAI, OpenAI
+from openai.types.chat import (
+    ChatCompletion,
+    ChatCompletionMessageParam,
+    ChatCompletionMessageToolCall,
+)
 import os
+import time
 from error_handling import LLMInteractionException
 from history import History
+from llm_integration.client_registry import get_async_client, get_client
+from llm_integration.context_builder import ContextBuilder
+from llm_integration.response_cache import ResponseCache
 
 from model.app_model import AppModel
 from abc import ABC
-from typing import List, Dict, Optional
+from typing import Any, Iterator, List, Dict, Optional, cast
 
 load_dotenv()
 
@@ -18,11 +26,60 @@ class ResponseToolCallPair:
     response: Optional[str]
     tool_calls: Optional[List[ChatCompletionMessageToolCall]]
 
+    def to_json(self) -> Dict:
+        return {
+            "response": self.response,
+            "tool_calls": (
+                [tool_call.model_dump() for tool_call in self.tool_calls]
+                if self.tool_calls is not None
+                else None
+            ),
+        }
+
+    @staticmethod
+    def from_json(data: Dict) -> "ResponseToolCallPair":
+        return ResponseToolCallPair(
+            response=data["response"],
+            tool_calls=(
+                [ChatCompletionMessageToolCall.model_validate(t) for t in data["tool_calls"]]
+                if data["tool_calls"] is not None
+                else None
+            ),
+        )
+
+
+# timings of a streamed response in seconds from sending the request
+@dataclass
+class StreamTimings:
+    time_to_first_token: Optional[float]
+    total_time: float
+    n_chunks: int
+
+    def __str__(self):
+        first = (
+            f"{self.time_to_first_token:.2f} s"
+            if self.time_to_first_token is not None
+            else "-"
+        )
+        return f"first token after {first}, complete after {self.total_time:.2f} s"
+
 
 class LLM(ABC):
     client: OpenAI
+    # timings of the latest response of prompt_stream / prompt_conversation_stream
+    last_stream_timings: Optional[StreamTimings] = None
+    # identical requests are answered from it if set, see ResponseCache
+    response_cache: Optional[ResponseCache] = None
     system_prompt: str
     model_name: str
+    # maximum number of estimated tokens sent per request by prompt()
+    context_budget: int = 8000
+    # builds the messages of prompt(), created with context_budget on first use if not set
+    context_builder: Optional[ContextBuilder] = None
+
+    # the backends are created by their system promt, see ResilientLLM.from_names
+    def __init__(self, system_prompt: str = ""):
+        self.system_prompt = system_prompt
 
     def send_request(self, messages: List[Dict]) -> ChatCompletion:
         return self.client.chat.completions.create(
@@ -36,23 +93,105 @@ class LLM(ABC):
             raise LLMInteractionException(f"{self.model_name} returned empty response")
         return ret
 
+    def get_context_builder(self) -> ContextBuilder:
+        if self.context_builder is None:
+            self.context_builder = ContextBuilder(
+                self.context_budget, n_oldAnswerResponsePairs=1
+            )
+        return self.context_builder
+
     def prompt(self, history: History) -> str:
-        llmPromt = history.genPromtForLLM(n_oldAnswerResponsePairs=1)
+        llmPromt = self.get_context_builder().build(history)
         # print(f"llmPromt is: \n{llmPromt}\n\n")
         response: str = self.prompt_conversation(llmPromt)
         history.addPromt_withStrs("assistant", response)
         return response
 
+    # key of the request in response_cache, None if no cache is set
+    def cache_key(self, input: List[Dict], tools: Optional[List[Dict]] = None) -> Optional[str]:
+        if self.response_cache is None:
+            return None
+        return self.response_cache.key(self.model_name, input, tools)
+
+    def get_cached(self, key: Optional[str]) -> Optional[Any]:
+        if key is None or self.response_cache is None:
+            return None
+        return self.response_cache.get(key)
+
+    def put_cached(self, key: Optional[str], value: Any):
+        if key is not None and self.response_cache is not None:
+            self.response_cache.put(key, value)
+
     def prompt_conversation(self, input: List[Dict]) -> str:
+        key = self.cache_key(input)
+        cached = self.get_cached(key)
+        if cached is not None:
+            return cached
         try:
             response = self.send_request(input)
-            return self.handle_response(response)
+            ret = self.handle_response(response)
         except Exception as e:
             raise LLMInteractionException(
                 f"Error prompting {self.model_name}: {str(e)}"
             )
+        self.put_cached(key, ret)
+        return ret
+
+    def send_request_stream(self, messages: List[Dict]) -> Iterator[str]:
+        stream = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=cast(List[ChatCompletionMessageParam], messages),
+            stream=True,
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    # yields the response in chunks as they arrive, the history gets the whole response
+    # once it is complete
+    def prompt_stream(self, history: History) -> Iterator[str]:
+        llmPromt = self.get_context_builder().build(history)
+        chunks = []
+        for chunk in self.prompt_conversation_stream(llmPromt):
+            chunks.append(chunk)
+            yield chunk
+        history.addPromt_withStrs("assistant", "".join(chunks))
+
+    def prompt_conversation_stream(self, input: List[Dict]) -> Iterator[str]:
+        start = time.perf_counter()
+        first_token = None
+        chunks = []
+        key = self.cache_key(input)
+        cached = self.get_cached(key)
+        try:
+            for chunk in [cached] if cached is not None else self.send_request_stream(input):
+                if first_token is None:
+                    first_token = time.perf_counter() - start
+                chunks.append(chunk)
+                yield chunk
+        except LLMInteractionException:
+            raise
+        except Exception as e:
+            raise LLMInteractionException(
+                f"Error prompting {self.model_name}: {str(e)}"
+            )
+        self.last_stream_timings = StreamTimings(
+            time_to_first_token=first_token,
+            total_time=time.perf_counter() - start,
+            n_chunks=len(chunks),
+        )
+        print(f"{self.model_name}: {self.last_stream_timings}")
+        if not chunks:
+            raise LLMInteractionException(f"{self.model_name} returned empty response")
+        if cached is None:
+            self.put_cached(key, "".join(chunks))
 
     def prompt_tool(self, input: List[Dict], tools: List[Dict]) -> ResponseToolCallPair:
+        key = self.cache_key(input, tools)
+        cached = self.get_cached(key)
+        if cached is not None:
+            return ResponseToolCallPair.from_json(cached)
+
         # calling GPT with the messanges and tool_descriptions / llm_descriptions of all functions
         response = self.client.chat.completions.create(
             model=self.model_name,
@@ -65,36 +204,112 @@ class LLM(ABC):
         response_message = response.choices[0].message
         tool_calls = response_message.tool_calls
 
-        return ResponseToolCallPair(
-            response=response_message.content, tool_calls=tool_calls
+        pair = ResponseToolCallPair(response=response_message.content, tool_calls=tool_calls)
+        self.put_cached(key, pair.to_json())
+        return pair
+
+    # tool calls and answer of a turn from one completion (single call turns of the Strategy),
+    # the answer is the text content next to the tool calls
+    def prompt_turn(self, input: List[Dict], tools: List[Dict]) -> ResponseToolCallPair:
+        return self.prompt_tool(input, tools)
+
+    # the async client of the registry with the settings of client, for the running event loop.
+    # A client with another timeout or retries (e.g. of an attempt of ResilientLLM) gets a copy
+    # with them, which shares the connections
+    def get_async_client(self) -> AsyncOpenAI:
+        client = get_async_client(str(self.client.base_url), self.client.api_key)
+        if (
+            client.timeout != self.client.timeout
+            or client.max_retries != self.client.max_retries
+        ):
+            client = client.with_options(
+                timeout=self.client.timeout, max_retries=self.client.max_retries
+            )
+        return client
+
+    # the *_async methods do the same as the blocking ones without blocking the event loop
+    # while waiting for the response, so that requests can run concurrently
+    async def send_request_async(self, messages: List[Dict]) -> ChatCompletion:
+        return await self.get_async_client().chat.completions.create(
+            model=self.model_name,
+            messages=messages,  # type: ignore
+        )
+
+    async def prompt_async(self, history: History) -> str:
+        llmPromt = self.get_context_builder().build(history)
+        response: str = await self.prompt_conversation_async(llmPromt)
+        history.addPromt_withStrs("assistant", response)
+        return response
+
+    async def prompt_conversation_async(self, input: List[Dict]) -> str:
+        key = self.cache_key(input)
+        cached = self.get_cached(key)
+        if cached is not None:
+            return cached
+        try:
+            response = await self.send_request_async(input)
+            ret = self.handle_response(response)
+        except Exception as e:
+            raise LLMInteractionException(
+                f"Error prompting {self.model_name}: {str(e)}"
+            )
+        self.put_cached(key, ret)
+        return ret
+
+    async def prompt_tool_async(
+        self, input: List[Dict], tools: List[Dict]
+    ) -> ResponseToolCallPair:
+        key = self.cache_key(input, tools)
+        cached = self.get_cached(key)
+        if cached is not None:
+            return ResponseToolCallPair.from_json(cached)
+        response = await self.get_async_client().chat.completions.create(
+            model=self.model_name,
+            messages=input,  # type: ignore
+            tools=tools,  # type: ignore
+            tool_choice="auto",
         )
+        response_message = response.choices[0].message
+        pair = ResponseToolCallPair(
+            response=response_message.content, tool_calls=response_message.tool_calls
+        )
+        self.put_cached(key, pair.to_json())
+        return pair
+
+    async def prompt_turn_async(
+        self, input: List[Dict], tools: List[Dict]
+    ) -> ResponseToolCallPair:
+        return await self.prompt_tool_async(input, tools)
 
 
 class GPT4o(LLM):
+    context_budget = 16000
 
     def __init__(self, system_prompt: str = ""):
 
         if os.environ.get("OPENAI_API_KEY") is None:
             raise LLMInteractionException("OPENAI_API_KEY environment variable not set")
 
-        self.client = OpenAI()
+        self.client = get_client()
         self.system_prompt = system_prompt
         self.model_name = "gpt-4o-2024-08-06"
 
 
 class GPTo1Mini(LLM):
+    context_budget = 16000
 
     def __init__(self, system_prompt: str = ""):
 
         if os.environ.get("OPENAI_API_KEY") is None:
             raise LLMInteractionException("OPENAI_API_KEY environment variable not set")
 
-        self.client = OpenAI()
+        self.client = get_client()
         self.system_prompt = system_prompt
         self.model_name = "gpt-4-turbo"
 
 
 class Mistral7b(LLM):
+    context_budget = 6000
 
     def __init__(self, system_prompt: str = ""):
 
@@ -103,7 +318,7 @@ class Mistral7b(LLM):
                 "SIEMENS_LLM_KEY environment variable not set"
             )
 
-        self.client = OpenAI(
+        self.client = get_client(
             base_url="https://api.siemens.com/llm/",
             api_key=os.environ["SIEMENS_LLM_KEY"],
         )
@@ -113,9 +328,10 @@ class Mistral7b(LLM):
 
 
 class Qwen25(LLM):
+    context_budget = 24000
 
     def __init__(self, system_prompt: str = ""):
-        self.client = OpenAI(
+        self.client = get_client(
             base_url="http://workstation.ferienakademie.de:11434/v1",
             api_key="ollama",
         )
@@ -125,9 +341,10 @@ class Qwen25(LLM):
 
 
 class Groq(LLM):
+    context_budget = 6000
 
     def __init__(self, system_prompt: str = ""):
-        self.client = OpenAI(
+        self.client = get_client(
             base_url="http://workstation.ferienakademie.de:11434/v1",
             api_key="ollama",
         )
@@ -137,9 +354,10 @@ class Groq(LLM):
 
 
 class Llama3(LLM):
+    context_budget = 6000
 
     def __init__(self, system_prompt: str = ""):
-        self.client = OpenAI(
+        self.client = get_client(
             base_url="http://workstation.ferienakademie.de:11434/v1",
             api_key="ollama",
         )
@@ -149,9 +367,10 @@ class Llama3(LLM):
 
 
 class Gemma2(LLM):
+    context_budget = 6000
 
     def __init__(self, system_prompt: str = ""):
-        self.client = OpenAI(
+        self.client = get_client(
             base_url="http://workstation.ferienakademie.de:11434/v1",
             api_key="ollama",
         )
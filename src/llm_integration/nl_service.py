@@ -1,14 +1,44 @@
 from model.app_model import AppModel
-from llm_integration.llm_service import GPT4o
+from typing import Dict, Iterator, List, Optional
+
+from llm_integration.llm_service import LLM, GPT4o, ResponseToolCallPair
 
 from history import History
 
+# appended to the promt of a single call turn, so that the completion has an answer next to
+# the tool calls
+SINGLE_CALL_INSTRUCTION = """Call the setter functions for all values given in the latest user message.
+In the same message, answer the user as you would without the functions, assuming that the calls succeed.
+Do not mention the function calls themselves."""
+
 
 class NLService:
 
-    def __init__(self, data_obj: AppModel, llm=GPT4o()):
+    def __init__(self, data_obj: AppModel, llm: Optional[LLM] = None):
         self.model = data_obj
-        self.client = llm
+        # created here and not as default argument, which would connect at import time
+        self.client = llm if llm is not None else GPT4o()
 
     def retrieve_model(self, history: History) -> str:
         return self.client.prompt(history)
+
+    async def retrieve_model_async(self, history: History) -> str:
+        return await self.client.prompt_async(history)
+
+    def retrieve_model_stream(self, history: History) -> Iterator[str]:
+        return self.client.prompt_stream(history)
+
+    # tool calls and answer of the turn from one completion, nothing is added to the history
+    def retrieve_model_with_tools(
+        self, history: History, tools: List[Dict]
+    ) -> ResponseToolCallPair:
+        llmPromt = self.client.get_context_builder().build(history)
+        llmPromt.append({"role": "system", "content": SINGLE_CALL_INSTRUCTION})
+        return self.client.prompt_turn(llmPromt, tools)
+
+    async def retrieve_model_with_tools_async(
+        self, history: History, tools: List[Dict]
+    ) -> ResponseToolCallPair:
+        llmPromt = self.client.get_context_builder().build(history)
+        llmPromt.append({"role": "system", "content": SINGLE_CALL_INSTRUCTION})
+        return await self.client.prompt_turn_async(llmPromt, tools)
@@ -0,0 +1,288 @@
+import asyncio
+import copy
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Dict, Iterator, List, Optional
+
+from pydantic.dataclasses import dataclass
+
+from error_handling import LLMDeadlineException, LLMInteractionException
+from llm_integration import llm_service
+from llm_integration.llm_service import LLM, ResponseToolCallPair
+
+# the requests run in these threads, so that waiting for them can be bounded by the deadline
+_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-request")
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 3
+    base_delay: float = 0.5
+    max_delay: float = 8.0
+
+    # exponential backoff with full jitter, so that sessions failing at the same time do not
+    # retry at the same time
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+class ResilientLLM(LLM):
+    """Sends the requests to a chain of backends within a deadline per call.
+
+    A request goes to the first backend. If it fails, the next backend of the chain is
+    tried. If hedge_after is set and the request is still open after that many seconds, the
+    same request is also sent to the next backend and the first reply is kept. Once every
+    backend of the chain failed, the chain is retried after a jittered backoff as long as
+    the deadline allows. A call which exceeds the deadline raises LLMDeadlineException.
+
+    Every attempt sends its request with the time left until the deadline as timeout and
+    without the retries of the OpenAI client, so an abandoned request does not outlive the
+    call. A stream falls back to the next backend if its first chunk does not arrive within
+    first_chunk_after seconds, the first chunk of the chain has to arrive within the
+    deadline.
+    """
+
+    def __init__(
+        self,
+        backends: List[LLM],
+        deadline: float = 60.0,
+        retry: Optional[RetryPolicy] = None,
+        hedge_after: Optional[float] = None,
+        first_chunk_after: Optional[float] = None,
+    ):
+        if not backends:
+            raise ValueError("ResilientLLM needs at least one backend")
+        self.backends = backends
+        self.deadline = deadline
+        self.retry = retry or RetryPolicy()
+        self.hedge_after = hedge_after
+        self.first_chunk_after = first_chunk_after
+        self.client = backends[0].client
+        self.system_prompt = backends[0].system_prompt
+        self.model_name = " -> ".join(backend.model_name for backend in backends)
+        # the promt has to fit every backend it may be sent to
+        self.context_budget = min(backend.context_budget for backend in backends)
+        # backend which answered the latest call and the number of errors by backend
+        self.last_backend: Optional[LLM] = None
+        self.errors: Dict[str, int] = {}
+
+    @staticmethod
+    def from_names(names: List[str], system_prompt: str = "", **kwargs) -> "ResilientLLM":
+        """Chain of the LLM classes of llm_service by their names, e.g. ["Qwen25", "GPT4o"]."""
+        backends = []
+        for name in names:
+            backend_class = getattr(llm_service, name.strip(), None)
+            if not (isinstance(backend_class, type) and issubclass(backend_class, LLM)):
+                raise ValueError(f"Unknown LLM backend {name}")
+            backends.append(backend_class(system_prompt))
+        return ResilientLLM(backends, **kwargs)
+
+    # copy of the backend whose requests time out at the deadline and are not retried by the
+    # client, the copy shares the connections of the backend
+    @staticmethod
+    def attempt(backend: LLM, deadline: float) -> LLM:
+        bounded = copy.copy(backend)
+        bounded.client = backend.client.with_options(
+            timeout=max(deadline - time.monotonic(), 0.0), max_retries=0
+        )
+        return bounded
+
+    def call(self, method: str, *args: Any) -> Any:
+        deadline = time.monotonic() + self.deadline
+        last_error: Optional[Exception] = None
+        for attempt in range(self.retry.max_attempts):
+            try:
+                return self.call_chain(method, args, deadline)
+            except LLMDeadlineException:
+                raise
+            except Exception as e:
+                last_error = e
+            delay = self.retry.delay(attempt)
+            if attempt + 1 == self.retry.max_attempts or time.monotonic() + delay >= deadline:
+                break
+            print(f"Retrying {method} in {delay:.2f} s after: {last_error}")
+            time.sleep(delay)
+        raise LLMInteractionException(
+            f"Error prompting {self.model_name}: {str(last_error)}"
+        )
+
+    def call_chain(self, method: str, args: tuple, deadline: float) -> Any:
+        pending: Dict[Future, LLM] = {}
+        backends = iter(self.backends)
+        hedged = False
+
+        def launch() -> bool:
+            backend = next(backends, None)
+            if backend is None:
+                return False
+            attempt = self.attempt(backend, deadline)
+            pending[_executor.submit(getattr(attempt, method), *args)] = backend
+            return True
+
+        launch()
+        last_error: Optional[Exception] = None
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                for future in pending:
+                    future.cancel()
+                raise LLMDeadlineException(
+                    f"{self.model_name} did not answer within {self.deadline} s"
+                )
+            timeout = remaining
+            if self.hedge_after is not None and not hedged:
+                timeout = min(remaining, self.hedge_after)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                if self.hedge_after is not None and not hedged:
+                    hedged = True
+                    launch()
+                continue
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    last_error = e
+                    self.errors[backend.model_name] = self.errors.get(backend.model_name, 0) + 1
+                    continue
+                for other in pending:
+                    other.cancel()
+                self.last_backend = backend
+                return result
+            if not pending:
+                # fall back to the next backend
+                launch()
+        raise last_error or LLMInteractionException(f"{self.model_name} failed")
+
+    def prompt_conversation(self, input: List[Dict]) -> str:
+        return self.call("prompt_conversation", input)
+
+    def prompt_tool(self, input: List[Dict], tools: List[Dict]) -> ResponseToolCallPair:
+        return self.call("prompt_tool", input, tools)
+
+    # call without a thread per request, the attempts are tasks of the running event loop
+    async def call_async(self, method: str, *args: Any) -> Any:
+        deadline = time.monotonic() + self.deadline
+        last_error: Optional[Exception] = None
+        for attempt in range(self.retry.max_attempts):
+            try:
+                return await asyncio.wait_for(
+                    self.call_chain_async(method, args, deadline),
+                    timeout=max(deadline - time.monotonic(), 0.0),
+                )
+            except asyncio.TimeoutError:
+                raise LLMDeadlineException(
+                    f"{self.model_name} did not answer within {self.deadline} s"
+                )
+            except Exception as e:
+                last_error = e
+            delay = self.retry.delay(attempt)
+            if attempt + 1 == self.retry.max_attempts or time.monotonic() + delay >= deadline:
+                break
+            print(f"Retrying {method} in {delay:.2f} s after: {last_error}")
+            await asyncio.sleep(delay)
+        raise LLMInteractionException(
+            f"Error prompting {self.model_name}: {str(last_error)}"
+        )
+
+    # call_chain with tasks, the deadline is enforced by call_async
+    async def call_chain_async(self, method: str, args: tuple, deadline: float) -> Any:
+        pending: Dict[asyncio.Task, LLM] = {}
+        backends = iter(self.backends)
+        hedged = False
+
+        def launch() -> bool:
+            backend = next(backends, None)
+            if backend is None:
+                return False
+            attempt = self.attempt(backend, deadline)
+            pending[asyncio.ensure_future(getattr(attempt, method)(*args))] = backend
+            return True
+
+        launch()
+        last_error: Optional[Exception] = None
+        try:
+            while pending:
+                timeout = None
+                if self.hedge_after is not None and not hedged:
+                    timeout = self.hedge_after
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = True
+                    launch()
+                    continue
+                for task in done:
+                    backend = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        last_error = e
+                        self.errors[backend.model_name] = (
+                            self.errors.get(backend.model_name, 0) + 1
+                        )
+                        continue
+                    self.last_backend = backend
+                    return result
+                if not pending:
+                    # fall back to the next backend
+                    launch()
+        finally:
+            # the slower requests of a hedge and the ones cut off by the deadline
+            for task in pending:
+                task.cancel()
+        raise last_error or LLMInteractionException(f"{self.model_name} failed")
+
+    async def prompt_conversation_async(self, input: List[Dict]) -> str:
+        return await self.call_async("prompt_conversation_async", input)
+
+    async def prompt_tool_async(
+        self, input: List[Dict], tools: List[Dict]
+    ) -> ResponseToolCallPair:
+        return await self.call_async("prompt_tool_async", input, tools)
+
+    # a stream can only fall back before its first chunk, so only the first chunk is bounded
+    def send_request_stream(self, messages: List[Dict]) -> Iterator[str]:
+        deadline = time.monotonic() + self.deadline
+        last_error: Optional[Exception] = None
+        for backend in self.backends:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            stream = self.attempt(backend, deadline).send_request_stream(messages)
+            first = _executor.submit(next, stream, None)
+            timeout = remaining
+            if self.first_chunk_after is not None:
+                timeout = min(remaining, self.first_chunk_after)
+            try:
+                chunk = first.result(timeout=timeout)
+            except FutureTimeoutError:
+                # the request ends at the latest at the deadline by the timeout of its client
+                last_error = LLMDeadlineException(
+                    f"{backend.model_name} sent no chunk within {timeout:.2f} s"
+                )
+                self.errors[backend.model_name] = self.errors.get(backend.model_name, 0) + 1
+                continue
+            except Exception as e:
+                last_error = e
+                self.errors[backend.model_name] = self.errors.get(backend.model_name, 0) + 1
+                continue
+            self.last_backend = backend
+            if chunk is None:
+                return
+            yield chunk
+            yield from stream
+            return
+        if last_error is None:
+            raise LLMDeadlineException(
+                f"{self.model_name} sent no chunk within {self.deadline} s"
+            )
+        if isinstance(last_error, LLMDeadlineException):
+            raise last_error
+        raise LLMInteractionException(
+            f"Error prompting {self.model_name}: {str(last_error)}"
+        )
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic.dataclasses import dataclass
+
+from caching import LRUCache
+
+
+@dataclass
+class ResponseCacheStats:
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    expired: int = 0
+    disk_evictions: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.memory_hits + self.disk_hits + self.misses
+        return (self.memory_hits + self.disk_hits) / total if total else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.memory_hits} memory hits, {self.disk_hits} disk hits, {self.misses} misses "
+            f"({self.hit_rate:.0%} hit rate), {self.expired} expired, "
+            f"{self.disk_evictions} evicted from disk"
+        )
+
+
+class ResponseCache:
+    """Cache of LLM responses keyed by a hash of the model name, the messages and the tool
+    schemas, so that identical requests (the opening turn, test scenarios, replayed sessions)
+    are answered without a round trip. Opt-in by setting LLM.response_cache, the app sets it
+    on all backends if LLM_RESPONSE_CACHE_DIR is set.
+
+    Entries are kept in an LRU cache in memory and, if a directory is given, as one JSON file
+    per entry on disk, where they survive restarts and are shared between processes. Entries
+    older than ttl seconds are misses, an expired entry in memory is dropped and the disk is
+    checked for a fresher copy written by another process. The disk tier drops the oldest entries once it holds
+    more than max_disk_bytes.
+    """
+
+    def __init__(
+        self,
+        memory_size: int = 256,
+        directory: Optional[str] = None,
+        ttl: Optional[float] = None,
+        max_disk_bytes: int = 100 * 1024 * 1024,
+    ):
+        self.memory = LRUCache(maxsize=memory_size)
+        # the backends of a hedged call use the cache from several threads, the memory tier
+        # and the bookkeeping of the disk tier are only changed while holding the lock
+        self.lock = threading.Lock()
+        self.directory = directory
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self.stats = ResponseCacheStats()
+        # size and creation time of the files on disk by key, other processes write to the
+        # directory too, so it is listed again before evicting
+        self.disk_entries: Dict[str, Tuple[int, float]] = {}
+        self.disk_bytes = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            self.scan()
+
+    def scan(self):
+        self.disk_entries = {}
+        self.disk_bytes = 0
+        directory = self.directory
+        if directory is None:
+            return
+        for name in os.listdir(directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                stat = os.stat(os.path.join(directory, name))
+            except OSError:
+                # removed by another process in the meantime
+                continue
+            self.disk_entries[name[: -len(".json")]] = (stat.st_size, stat.st_mtime)
+            self.disk_bytes += stat.st_size
+
+    @staticmethod
+    def key(model_name: str, messages: List[Dict], tools: Optional[List[Dict]] = None) -> str:
+        request = json.dumps(
+            {"model": model_name, "messages": messages, "tools": tools},
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(request.encode("utf-8")).hexdigest()
+
+    def is_expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")  # type: ignore[arg-type]
+
+    # the cached JSON value of the key, None on a miss
+    def get(self, key: str) -> Optional[Any]:
+        expired = False
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                created, value = entry
+                if not self.is_expired(created):
+                    self.stats.memory_hits += 1
+                    return value
+                # another process may have written a fresher copy to disk
+                self.memory.pop(key)
+                expired = True
+        on_disk = self.read_from_disk(key)
+        with self.lock:
+            if on_disk is not None:
+                record, size = on_disk
+                if not self.is_expired(record["created"]):
+                    self.stats.disk_hits += 1
+                    self.memory.put(key, (record["created"], record["value"]))
+                    if key not in self.disk_entries:
+                        self.disk_entries[key] = (size, record["created"])
+                        self.disk_bytes += size
+                    return record["value"]
+                expired = True
+                self.remove_from_disk(key)
+            if expired:
+                self.stats.expired += 1
+            self.stats.misses += 1
+        return None
+
+    # the record of the key on disk and its size, the file may have been written by another
+    # process, a file which cannot be read is removed
+    def read_from_disk(self, key: str) -> Optional[Tuple[Dict, int]]:
+        if self.directory is None:
+            return None
+        try:
+            with open(self.path(key), encoding="utf-8") as f:
+                size = os.fstat(f.fileno()).st_size
+                return json.load(f), size
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            with self.lock:
+                self.remove_from_disk(key)
+            return None
+
+    def put(self, key: str, value: Any):
+        created = time.time()
+        with self.lock:
+            self.memory.put(key, (created, value))
+        if self.directory is None:
+            return
+        data = json.dumps({"created": created, "value": value}, default=str)
+        # written to a temporary file of the thread first, so that no other process or thread
+        # reads a partial entry
+        tmp_path = f"{self.path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path(key))
+        with self.lock:
+            if key in self.disk_entries:
+                self.disk_bytes -= self.disk_entries[key][0]
+            self.disk_entries[key] = (len(data.encode("utf-8")), created)
+            self.disk_bytes += self.disk_entries[key][0]
+            if self.disk_bytes > self.max_disk_bytes:
+                self.evict()
+
+    def remove_from_disk(self, key: str):
+        size, _ = self.disk_entries.pop(key, (0, 0.0))
+        self.disk_bytes -= size
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def evict(self):
+        self.scan()
+        for key, _ in sorted(self.disk_entries.items(), key=lambda item: item[1][1]):
+            if self.disk_bytes <= self.max_disk_bytes:
+                break
+            self.remove_from_disk(key)
+            self.stats.disk_evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            for key in list(self.disk_entries):
+                self.remove_from_disk(key)
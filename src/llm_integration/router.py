@@ -0,0 +1,235 @@
+import json
+import statistics
+import time
+from collections import deque
+from typing import Deque, Dict, Iterator, List, Optional
+
+from pydantic.dataclasses import dataclass
+
+from error_handling import LLMInteractionException
+from llm_integration.context_builder import CharTokenizer
+from llm_integration.llm_service import LLM, ResponseToolCallPair
+
+EXTRACTION = "extraction"
+ANSWER = "answer"
+
+
+class BackendStats:
+    """Rolling latency and error rate of the latest requests to a backend."""
+
+    def __init__(self, window: int = 50):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+
+    def record(self, latency: float, success: bool):
+        self.outcomes.append(success)
+        if success:
+            self.latencies.append(latency)
+
+    @property
+    def n_requests(self) -> int:
+        return len(self.outcomes)
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    @property
+    def median_latency(self) -> Optional[float]:
+        return statistics.median(self.latencies) if self.latencies else None
+
+    def to_dict(self) -> Dict:
+        return {
+            "requests": self.n_requests,
+            "error_rate": self.error_rate,
+            "median_latency": self.median_latency,
+        }
+
+
+@dataclass
+class RoutingDecision:
+    task: str
+    backend: str
+    request_tokens: int
+    reason: str
+
+    def __str__(self):
+        return f"{self.task} ({self.request_tokens} tokens) -> {self.backend}: {self.reason}"
+
+
+class ModelRouter(LLM):
+    """Picks the backend of every request by its task, extraction (prompt_tool) or answer
+    (prompt_conversation, streams and the single call turns of prompt_turn), from the
+    candidates of the task.
+
+    The candidates are ordered from the cheapest to the largest model. A request goes to the
+    first candidate which is healthy (error rate at most max_error_rate once it has
+    min_samples requests), whose context budget fits the request and whose median latency
+    is within latency_target. Requests above hard_request_tokens are hard turns and go to
+    the largest healthy candidate. If no candidate is within the latency target, the fastest
+    healthy one is used. A failed request is sent to the remaining candidates in order.
+
+    The latest decisions are kept in decisions and the stats by backend are returned by
+    stats(), both are printed by report().
+    """
+
+    def __init__(
+        self,
+        routes: Dict[str, List[LLM]],
+        latency_target: float = 5.0,
+        hard_request_tokens: int = 4000,
+        max_error_rate: float = 0.5,
+        min_samples: int = 4,
+        window: int = 50,
+    ):
+        if not routes or not all(routes.values()):
+            raise ValueError("ModelRouter needs at least one candidate per task")
+        self.routes = routes
+        self.latency_target = latency_target
+        self.hard_request_tokens = hard_request_tokens
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.tokenizer = CharTokenizer()
+        candidates = [llm for llms in routes.values() for llm in llms]
+        self.client = candidates[0].client
+        self.system_prompt = candidates[0].system_prompt
+        self.model_name = "router"
+        self.context_budget = min(llm.context_budget for llm in routes.get(ANSWER, candidates))
+        self.backend_stats: Dict[str, BackendStats] = {
+            llm.model_name: BackendStats(window) for llm in candidates
+        }
+        self.decisions: Deque[RoutingDecision] = deque(maxlen=100)
+
+    def request_tokens(self, input: List[Dict], tools: Optional[List[Dict]] = None) -> int:
+        return self.tokenizer.count(json.dumps(input, default=str)) + (
+            self.tokenizer.count(json.dumps(tools)) if tools else 0
+        )
+
+    def is_healthy(self, llm: LLM) -> bool:
+        stats = self.backend_stats[llm.model_name]
+        return stats.n_requests < self.min_samples or stats.error_rate <= self.max_error_rate
+
+    # candidates of the task in the order they are tried, the chosen one first
+    def route(self, task: str, request_tokens: int) -> List[LLM]:
+        candidates = self.routes.get(task) or self.routes[ANSWER]
+        fitting = [llm for llm in candidates if llm.context_budget >= request_tokens]
+        healthy = [llm for llm in fitting if self.is_healthy(llm)]
+        if not healthy:
+            healthy = sorted(
+                fitting or candidates,
+                key=lambda llm: self.backend_stats[llm.model_name].error_rate,
+            )
+            chosen, reason = healthy[0], "no healthy candidate, lowest error rate"
+        elif request_tokens > self.hard_request_tokens:
+            chosen, reason = healthy[-1], "hard turn, largest model"
+        else:
+            fast = [
+                llm
+                for llm in healthy
+                if (self.backend_stats[llm.model_name].median_latency or 0.0)
+                <= self.latency_target
+            ]
+            if fast:
+                chosen, reason = fast[0], "cheapest within latency target"
+            else:
+                chosen = min(
+                    healthy,
+                    key=lambda llm: self.backend_stats[llm.model_name].median_latency or 0.0,
+                )
+                reason = "no candidate within latency target, fastest"
+        self.decisions.append(
+            RoutingDecision(
+                task=task,
+                backend=chosen.model_name,
+                request_tokens=request_tokens,
+                reason=reason,
+            )
+        )
+        return [chosen] + [llm for llm in candidates if llm is not chosen]
+
+    def call(self, task: str, method: str, *args):
+        last_error: Optional[Exception] = None
+        for llm in self.route(task, self.request_tokens(*args)):
+            start = time.perf_counter()
+            try:
+                result = getattr(llm, method)(*args)
+            except Exception as e:
+                self.backend_stats[llm.model_name].record(time.perf_counter() - start, False)
+                last_error = e
+                continue
+            self.backend_stats[llm.model_name].record(time.perf_counter() - start, True)
+            return result
+        raise LLMInteractionException(f"Error prompting {task} backends: {str(last_error)}")
+
+    def prompt_conversation(self, input: List[Dict]) -> str:
+        return self.call(ANSWER, "prompt_conversation", input)
+
+    def prompt_tool(self, input: List[Dict], tools: List[Dict]) -> ResponseToolCallPair:
+        return self.call(EXTRACTION, "prompt_tool", input, tools)
+
+    # the answer is part of the completion, so it goes to the answer backends
+    def prompt_turn(self, input: List[Dict], tools: List[Dict]) -> ResponseToolCallPair:
+        return self.call(ANSWER, "prompt_tool", input, tools)
+
+    # call with the *_async methods of the candidates, which do not block a thread
+    async def call_async(self, task: str, method: str, *args):
+        last_error: Optional[Exception] = None
+        for llm in self.route(task, self.request_tokens(*args)):
+            start = time.perf_counter()
+            try:
+                result = await getattr(llm, method)(*args)
+            except Exception as e:
+                self.backend_stats[llm.model_name].record(time.perf_counter() - start, False)
+                last_error = e
+                continue
+            self.backend_stats[llm.model_name].record(time.perf_counter() - start, True)
+            return result
+        raise LLMInteractionException(f"Error prompting {task} backends: {str(last_error)}")
+
+    async def prompt_conversation_async(self, input: List[Dict]) -> str:
+        return await self.call_async(ANSWER, "prompt_conversation_async", input)
+
+    async def prompt_tool_async(
+        self, input: List[Dict], tools: List[Dict]
+    ) -> ResponseToolCallPair:
+        return await self.call_async(EXTRACTION, "prompt_tool_async", input, tools)
+
+    async def prompt_turn_async(
+        self, input: List[Dict], tools: List[Dict]
+    ) -> ResponseToolCallPair:
+        return await self.call_async(ANSWER, "prompt_tool_async", input, tools)
+
+    # the latency of a stream is the time to its first chunk
+    def send_request_stream(self, messages: List[Dict]) -> Iterator[str]:
+        last_error: Optional[Exception] = None
+        for llm in self.route(ANSWER, self.request_tokens(messages)):
+            start = time.perf_counter()
+            stream = llm.send_request_stream(messages)
+            try:
+                first = next(stream)
+            except StopIteration:
+                return
+            except Exception as e:
+                self.backend_stats[llm.model_name].record(time.perf_counter() - start, False)
+                last_error = e
+                continue
+            self.backend_stats[llm.model_name].record(time.perf_counter() - start, True)
+            yield first
+            yield from stream
+            return
+        raise LLMInteractionException(f"Error prompting {ANSWER} backends: {str(last_error)}")
+
+    def stats(self) -> Dict[str, Dict]:
+        return {name: stats.to_dict() for name, stats in self.backend_stats.items()}
+
+    def report(self) -> str:
+        lines = ["Backends:"]
+        for name, stats in self.stats().items():
+            latency = stats["median_latency"]
+            lines.append(
+                f"  {name}: {stats['requests']} requests, {stats['error_rate']:.0%} errors, "
+                + (f"median {latency:.2f} s" if latency is not None else "no latency yet")
+            )
+        lines.append("Latest decisions:")
+        lines += [f"  {decision}" for decision in list(self.decisions)[-10:]]
+        return "\n".join(lines)
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 # from builtins import classmethod
-from typing import List, Optional
+from typing import Callable, Dict, List, Optional, Tuple
+from pydantic import ConfigDict
+from pydantic.dataclasses import dataclass
 from iem_integration.install_app import install_app_on_edge_device
 from iem_integration.config_converter import ConfigConverter, AppType
 from iem_integration.constants import OPC_UA_CONNECTOR_APP_ID
@@ -11,6 +13,136 @@ from model.iem_base_model import *
 from model.iem_model import *
 
 from model.iem_model import DocumentationUAConnectorConfig
+from model.snapshot import (
+    ConfigChange,
+    ConfigSnapshot,
+    diff_descriptions,
+    diff_snapshots,
+    join_path,
+)
+
+
+def format_app_prompt(
+    application_name: str,
+    application_description: str,
+    installed_device_name: Optional[str],
+    config_prompt: str,
+) -> str:
+    return """
+        {{
+            app-name: {0},
+            app-description: {1},
+            installed_device_name: {2}
+            fields: {3}
+        }}
+        """.format(
+        application_name,
+        application_description,
+        installed_device_name,
+        config_prompt,
+    )
+
+
+# immutable state of an App, the config snapshot shares unchanged subtrees with the
+# snapshots taken before
+@dataclass(frozen=True, config=ConfigDict(arbitrary_types_allowed=True))
+class AppSnapshot:
+    application_name: str
+    app_id: str
+    application_description: str
+    installed_device_name: Optional[str]
+    config_class: type
+    config: ConfigSnapshot
+    # describe() of the config, memoized like the snapshot so it shares the descriptions of
+    # unchanged subtrees. The config promt is only rendered from it when it is needed, see
+    # History.genConfigPromt
+    config_description: Dict
+
+    def generate_prompt_string(self) -> str:
+        return format_app_prompt(
+            self.application_name,
+            self.application_description,
+            self.installed_device_name,
+            str(self.config_description),
+        )
+
+
+@dataclass(frozen=True, config=ConfigDict(arbitrary_types_allowed=True))
+class AppModelSnapshot:
+    apps: Tuple[AppSnapshot, ...]
+    # AppModel.version() when the snapshot was taken
+    version: int
+
+    def generate_prompt_string(self) -> str:
+        result = "["
+        for app in self.apps:
+            result += app.generate_prompt_string()
+        result += "]"
+        return result
+
+    # changes from this snapshot to the other one, the paths start with the application name
+    # like the paths of AppModel.get_field. With visible_only only the changes shown by the
+    # config promts are listed, see diff_snapshots
+    def diff(
+        self, other: AppModelSnapshot, visible_only: bool = False
+    ) -> List[ConfigChange]:
+        return self._diff_apps(
+            other,
+            lambda old, new, name: diff_snapshots(
+                old.config if old is not None else None,
+                new.config if new is not None else None,
+                name,
+                visible_only,
+            ),
+        )
+
+    # changes from this snapshot to the other one in the serialization of the config promts,
+    # i.e. with the displayed values of enum fields, see diff_descriptions. Only the apps of
+    # this snapshot are diffed, the added ones are described in full, see added_apps
+    def diff_described(self, other: AppModelSnapshot) -> List[ConfigChange]:
+        return self._diff_apps(
+            other,
+            lambda old, new, name: diff_descriptions(
+                old.config_description if old is not None else None,
+                new.config_description if new is not None else None,
+                name,
+            ),
+            include_added=False,
+        )
+
+    # apps of the other snapshot which are not in this one
+    def added_apps(self, other: AppModelSnapshot) -> List[AppSnapshot]:
+        names = {app.application_name for app in self.apps}
+        return [app for app in other.apps if app.application_name not in names]
+
+    def _diff_apps(
+        self,
+        other: AppModelSnapshot,
+        diff_configs: Callable[
+            [Optional[AppSnapshot], Optional[AppSnapshot], str], List[ConfigChange]
+        ],
+        include_added: bool = True,
+    ) -> List[ConfigChange]:
+        changes: List[ConfigChange] = []
+        old_apps = {app.application_name: app for app in self.apps}
+        for new_app in other.apps:
+            old_app = old_apps.pop(new_app.application_name, None)
+            if old_app is None and not include_added:
+                continue
+            name = new_app.application_name
+            changes += diff_configs(old_app, new_app, name)
+            old_device_name = old_app.installed_device_name if old_app is not None else None
+            if old_device_name != new_app.installed_device_name:
+                changes.append(
+                    ConfigChange(
+                        path=join_path(name, "installed_device_name"),
+                        old=old_device_name,
+                        new=new_app.installed_device_name,
+                    )
+                )
+        for name, old_app in old_apps.items():
+            changes += diff_configs(old_app, None, name)
+        return changes
 
 
 # class containing all data of an app including its Config
@@ -19,7 +151,7 @@ class App:
     application_name: str
     app_id: str
     application_description: str
-    installed_device_name: str = None
+    installed_device_name: Optional[str] = None
     config: AbstractAppConfig
 
     def __init__(self, name: str, id: str, description: str, config: AbstractAppConfig):
@@ -27,27 +159,64 @@ class App:
         self.application_description = description
         self.config = config
         self.app_id = id
+        self._structure_version = 0
+        self._version = 0
 
     def fill_from_json(self, json: Dict):
+        if self.application_name != json["App-name"]:
+            # the tool function names are prefixed with the application name
+            self._structure_version += 1
         self.application_name = json["App-name"]
         self.installed_device_name = json["Device-name"]
+        self._version += 1
         self.config.fill_from_json(json)
 
+    def structure_version(self) -> int:
+        return self._structure_version + self.config.structure_version()
+
+    # changes with every change of the app or its config, unlike structure_version also on values
+    def version(self) -> int:
+        return self._version + self.config.content_version()
+
+    def resolve_tool(self, tool_name: str) -> Optional[Callable[..., None]]:
+        if tool_name == self.application_name + "_submit_to_iem":
+            return self.submit_to_iem
+        if tool_name == self.application_name + "-set_device_name":
+            return self.set_device_name
+        return self.config.resolve_tool(tool_name)
+
     def generate_prompt_string(self) -> str:
-        return """
-        {{
-            app-name: {0},
-            app-description: {1},
-            installed_device_name: {2}
-            fields: {3}
-        }}
-        """.format(
+        return format_app_prompt(
             self.application_name,
             self.application_description,
             self.installed_device_name,
             self.config.generate_prompt_string(),
         )
 
+    def snapshot(self) -> AppSnapshot:
+        return AppSnapshot(
+            application_name=self.application_name,
+            app_id=self.app_id,
+            application_description=self.application_description,
+            installed_device_name=self.installed_device_name,
+            config_class=type(self.config),
+            config=self.config.snapshot(),
+            config_description=self.config.describe(),
+        )
+
+    def restore_snapshot(self, snapshot: AppSnapshot):
+        if self.application_name != snapshot.application_name:
+            self._structure_version += 1
+        if (
+            self.application_name != snapshot.application_name
+            or self.installed_device_name != snapshot.installed_device_name
+        ):
+            self._version += 1
+        self.application_name = snapshot.application_name
+        self.installed_device_name = snapshot.installed_device_name
+        if self.config.cached_snapshot() is not snapshot.config:
+            self.config.restore_snapshot(snapshot.config)
+
     def generate_tool_functions(self) -> List[FunctionDescriptionPair]:
         submit_dict = {
             "type": "function",
@@ -77,7 +246,7 @@ class App:
                             "description": "the new installed_device_name",
                         },
                     },
-                    "required": ["installed_device_name"],
+                    "required": ["val"],
                 },
             },
         }
@@ -118,11 +287,92 @@ class App:
 
     def set_device_name(self, val):
         self.installed_device_name = val
+        self._version += 1
 
 
 class AppModel:
     apps: List[App]
 
+    def __init__(self):
+        self.apps = []
+        self._structure_version = 0
+        self._version = 0
+        self.collapsed_tools = False
+
+    def structure_version(self) -> int:
+        # every app counts at least once, so appending an app always changes the version
+        return self._structure_version + sum(
+            app.structure_version() + 1 for app in self.apps
+        )
+
+    # changes with every change of an app or a value of its config, the rendered config
+    # promts are cached by it
+    def version(self) -> int:
+        return self._version + sum(app.version() + 1 for app in self.apps)
+
+    def snapshot(self) -> AppModelSnapshot:
+        return AppModelSnapshot(
+            apps=tuple(app.snapshot() for app in self.apps), version=self.version()
+        )
+
+    # makes version() larger than the given one, e.g. after resuming a session whose
+    # snapshots were taken by another AppModel, so that their versions are not reused
+    def advance_version(self, version: int):
+        if self.version() <= version:
+            self._version += version + 1 - self.version()
+
+    # brings the apps back to the state of the snapshot, apps which did not exist yet are
+    # recreated and apps added since are removed
+    def restore_snapshot(self, snapshot: AppModelSnapshot):
+        apps = []
+        for idx, app_snapshot in enumerate(snapshot.apps):
+            if idx < len(self.apps) and type(self.apps[idx].config) is app_snapshot.config_class:
+                app = self.apps[idx]
+            else:
+                app = App(
+                    name=app_snapshot.application_name,
+                    id=app_snapshot.app_id,
+                    description=app_snapshot.application_description,
+                    config=app_snapshot.config_class(),
+                )
+                app.config.set_collapsed_tools(self.collapsed_tools)
+            app.restore_snapshot(app_snapshot)
+            apps.append(app)
+        if len(apps) != len(self.apps) or any(a is not b for a, b in zip(apps, self.apps)):
+            # the versions of removed apps are kept, so that both versions keep increasing
+            for app in self.apps:
+                if all(app is not kept for kept in apps):
+                    self._structure_version += app.structure_version() + 1
+                    self._version += app.version() + 1
+            self._structure_version += 1
+            self._version += 1
+        self.apps[:] = apps
+
+    # switches the ListFields of all apps, including apps added later, to collapsed tools
+    # taking the index of the item as parameter
+    def set_collapsed_tools(self, collapsed: bool = True):
+        self.collapsed_tools = collapsed
+        for app in self.apps:
+            app.config.set_collapsed_tools(collapsed)
+
+    def resolve_tool(self, tool_name: str) -> Optional[Callable[..., None]]:
+        if tool_name == "add_app":
+            return self.add_app
+        for app in self.apps:
+            fct = app.resolve_tool(tool_name)
+            if fct is not None:
+                return fct
+        return None
+
+    # returns the field with the given path, which starts with the application name,
+    # e.g. "OPC_UA_CONNECTOR.datapoints.0.name"
+    def get_field(self, path: str) -> Field:
+        application_name, _, field_path = path.partition(".")
+        for app in self.apps:
+            if app.application_name == application_name:
+                return app.config.get_field(field_path)
+        raise KeyError(path)
+
     def generate_prompt_string(self) -> str:
         result = "["
         for app in self.apps:
@@ -183,5 +433,8 @@ class AppModel:
                 id="456e041339e744caa9514a1c86536067",
             )
             print("got here too")
+            new_app.config.set_collapsed_tools(self.collapsed_tools)
             self.apps.append(new_app)
+            self._structure_version += 1
+            self._version += 1
             print(f"now app.length = {len(self.apps)}")
@@ -0,0 +1,445 @@
+from __future__ import annotations
+
+import types
+import weakref
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from error_handling import ValidationException
+from model.iem_base_model import (
+    AbstractAppConfig,
+    memoized_serialization,
+    ConfigNode,
+    EnumField,
+    Field,
+    ListField,
+    NestedField,
+    ValueField,
+)
+from model.snapshot import ConfigSnapshot
+
+
+def _unwrap(function: Any) -> Any:
+    # the memoized serializations are computed on the fly for views, they have no cache of their own
+    return getattr(function, "__wrapped__", function)
+
+
+def _column_value(field: Any) -> Any:
+    if isinstance(field, EnumField):
+        return field.enum_key
+    return field.value
+
+
+class _View:
+    """Base of the lightweight stand-ins for items of a ColumnarListField and their subfields.
+
+    A view only stores its position, everything else is read from the columns or from the
+    metadata field of its column. Methods of the metadata field's class are called with the
+    view as self, so views behave like the Field they stand in for, including isinstance checks.
+    """
+
+    __slots__ = ("_items", "_row")
+
+    def __init__(self, items: ColumnarItems, row: int):
+        object.__setattr__(self, "_items", items)
+        object.__setattr__(self, "_row", row)
+
+    def _meta(self) -> Field:
+        raise NotImplementedError
+
+    @property  # type: ignore[misc]
+    def __class__(self):
+        return type(self._meta())
+
+    def __getattr__(self, name: str) -> Any:
+        meta = self._meta()
+        attr = getattr(type(meta), name, None)
+        if isinstance(attr, types.FunctionType):
+            return types.MethodType(_unwrap(attr), self)
+        return getattr(meta, name)
+
+    def __setattr__(self, name: str, value: Any):
+        # flags like visible and setter_active are kept per column
+        setattr(self._meta(), name, value)
+
+    def __eq__(self, other: Any) -> bool:
+        return (
+            type(other) is type(self)
+            and other._items is self._items
+            and other._row == self._row
+            and other._name_in_parent == self._name_in_parent
+        )
+
+    def __hash__(self) -> int:
+        return hash((id(self._items), self._row, self._name_in_parent))
+
+    def mark_dirty(self):
+        self._items.owner().mark_dirty()
+
+    def bump_structure_version(self):
+        self._items.owner().bump_structure_version()
+
+
+class ColumnarRow(_View):
+    __slots__ = ()
+
+    def _meta(self) -> Field:
+        return self._items.prototype
+
+    @property
+    def _name_in_parent(self) -> str:
+        return str(self._row)
+
+    def __getattr__(self, name: str) -> Any:
+        if name in self._items.columns:
+            return ColumnarCell(self._items, self._row, name)
+        return super().__getattr__(name)
+
+    def parent(self) -> Optional[ConfigNode]:
+        return self._items.owner()
+
+    def child_fields(self) -> List[Tuple[str, Field]]:
+        return [
+            (name, ColumnarCell(self._items, self._row, name))  # type: ignore[misc]
+            for name in self._items.columns
+        ]
+
+    def __repr__(self) -> str:
+        values = ", ".join(
+            f"{name}={column[self._row]!r}" for name, column in self._items.columns.items()
+        )
+        return f"{type(self._meta()).__name__}View({values})"
+
+
+class ColumnarCell(_View):
+    __slots__ = ("_name",)
+
+    def __init__(self, items: ColumnarItems, row: int, name: str):
+        super().__init__(items, row)
+        object.__setattr__(self, "_name", name)
+
+    def _meta(self) -> Field:
+        return self._items.prototype.__dict__[self._name]
+
+    @property
+    def _name_in_parent(self) -> str:
+        return self._name
+
+    def _get_column_value(self) -> Any:
+        return self._items.columns[self._name][self._row]
+
+    def _set_column_value(self, value: Any):
+        self._items.columns[self._name][self._row] = value
+
+    value = property(_get_column_value, _set_column_value)
+    enum_key = property(_get_column_value, _set_column_value)
+
+    def __setattr__(self, name: str, value: Any):
+        if name in ("value", "enum_key"):
+            object.__setattr__(self, name, value)
+        else:
+            super().__setattr__(name, value)
+
+    def parent(self) -> Optional[ConfigNode]:
+        return ColumnarRow(self._items, self._row)  # type: ignore[return-value]
+
+    def child_fields(self) -> List[Tuple[str, Field]]:
+        return []
+
+    def __repr__(self) -> str:
+        return f"{type(self._meta()).__name__}View({self._name}={self._get_column_value()!r})"
+
+
+class ColumnarItems(Sequence):
+    """Items of a ColumnarListField, one list of values per subfield of the blueprint.
+
+    The prototype is a single copy of the blueprint holding the metadata of all columns,
+    indexing returns a ColumnarRow view of the item.
+    """
+
+    def __init__(self, prototype: NestedField):
+        self.prototype = prototype
+        self.columns: Dict[str, List[Any]] = {
+            name: [] for name in prototype.child_field_layout
+        }
+        self.owner_ref: Optional[weakref.ReferenceType] = None
+
+    def owner(self) -> ColumnarListField:
+        owner = self.owner_ref() if self.owner_ref is not None else None
+        if owner is None:
+            raise RuntimeError("The columns are not attached to a ColumnarListField")
+        return owner
+
+    def __len__(self) -> int:
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def __getitem__(self, idx):  # type: ignore[override]
+        if isinstance(idx, slice):
+            return [ColumnarRow(self, row) for row in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("ColumnarItems index out of range")
+        return ColumnarRow(self, idx)
+
+    def __setitem__(self, idx: int, item: Any):
+        for name, column in self.columns.items():
+            column[idx] = _column_value(getattr(item, name))
+
+    def __delitem__(self, idx):
+        for column in self.columns.values():
+            del column[idx]
+
+    def append(self, item: Any):
+        for name, column in self.columns.items():
+            column.append(_column_value(getattr(item, name)))
+
+    def copy(self) -> ColumnarItems:
+        copied = ColumnarItems(self.prototype.clone())
+        copied.columns = {name: list(column) for name, column in self.columns.items()}
+        return copied
+
+    def __repr__(self) -> str:
+        return f"ColumnarItems({len(self)} x {list(self.columns)})"
+
+
+class ColumnarListField(ListField):
+    """ListField keeping its items in columns instead of one Field object graph per item.
+
+    The blueprint has to be a NestedField containing only ValueFields and EnumFields. Items are
+    returned as views which offer the usual Field API (set_value, describe, to_json, ...), but
+    visibility and setter flags are kept per column, so changing them for the subfield of one
+    item changes them for all items of the list. Items are resolved by the path index of the
+    AppConfig on access instead of being added to it.
+    """
+
+    def model_post_init(self, __context: Any):
+        if not isinstance(self.blueprint, NestedField) or not all(
+            isinstance(field_value, (ValueField, EnumField))
+            for _, field_value in self.blueprint.child_fields()
+        ):
+            raise ValueError(
+                f"Columnar storage needs a flat NestedField blueprint, got {type(self.blueprint).__name__}"
+            )
+        existing = self.items
+        self.__dict__["items"] = ColumnarItems(self.blueprint.clone())
+        for item in existing:
+            self.items.append(item)
+        super().model_post_init(__context)
+
+    @classmethod
+    def from_list_field(cls, list_field: ListField) -> ColumnarListField:
+        columnar = cls(
+            variable_name=list_field.variable_name,
+            description=list_field.description,
+            blueprint=list_field.blueprint,
+            setter_active=list_field.setter_active,
+            visible=list_field.visible,
+            create_item_active=list_field.create_item_active,
+        )
+        columnar.replace_item(0, list_field.items[0])
+        columnar.extend_items(list_field.items[1:])
+        return columnar
+
+    def _link_children(self):
+        self.items.owner_ref = weakref.ref(self)  # type: ignore[attr-defined]
+
+    def _clone_subfields_into(self, copied: ConfigNode):
+        copied.__dict__["items"] = self.items.copy()  # type: ignore[attr-defined]
+
+    def indexed_fields(self) -> List[Field]:
+        return []
+
+    def resolve_subpath(self, path: str) -> Optional[Field]:
+        row, _, name = path.partition(".")
+        if not row.isdigit() or int(row) >= len(self.items):
+            return None
+        if not name:
+            return self.items[int(row)]
+        if name in self.items.columns:  # type: ignore[attr-defined]
+            return ColumnarCell(self.items, int(row), name)  # type: ignore[arg-type,return-value]
+        return None
+
+    def resolve_item_tool_path(self, tool_path: str) -> Optional[Field]:
+        row, _, rest = tool_path.partition("-")
+        if not row.isdigit() or int(row) >= len(self.items):
+            return None
+        item = self.items[int(row)]
+        item_name = item.variable_name.replace(" ", "_")
+        if rest == item_name:
+            return item
+        for name, cell in item.child_fields():
+            if rest == f"{item_name}-{cell.variable_name.replace(' ', '_')}":
+                return cell
+        return None
+
+    def extend_items(self, items: List[Field]):
+        if not items:
+            return
+        for item in items:
+            self.items.append(item)
+        self.bump_structure_version()
+        self.mark_dirty()
+
+    def replace_item(self, idx: int, item: Field):
+        self.items[idx] = item  # type: ignore[index]
+        self.bump_structure_version()
+        self.mark_dirty()
+
+    # the serialization reads the columns directly, unless the blueprint or one of its subfields
+    # customizes how it is serialized
+    def _column_name(self, variable_name: str) -> str:
+        prototype = self.items.prototype  # type: ignore[attr-defined]
+        for name in self.items.columns:  # type: ignore[attr-defined]
+            if prototype.__dict__[name].variable_name == variable_name:
+                return name
+        raise KeyError(f"{self.type_name()} has no field {variable_name}")
+
+    def column_values(self, variable_name: str) -> List[Any]:
+        return list(self.items.columns[self._column_name(variable_name)])  # type: ignore[attr-defined]
+
+    # the column is validated as a whole and written in place, the caches are cleared once
+    def set_column(self, variable_name: str, values: List[Any]):
+        if len(values) > len(self.items):
+            raise ValidationException(
+                f"Got {len(values)} values for {len(self.items)} items of {self.variable_name}"
+            )
+        errors = self.validate_column(variable_name, values)
+        if errors:
+            raise ValidationException(
+                "\n".join(f"Item {idx}: {msg}" for idx, msg in errors.items())
+            )
+        column = self.items.columns[self._column_name(variable_name)]  # type: ignore[attr-defined]
+        column[: len(values)] = values
+        self.mark_dirty()
+
+    def _has_default_serialization(self, method_name: str) -> bool:
+        prototype = self.items.prototype  # type: ignore[attr-defined]
+        if getattr(type(prototype), method_name) is not getattr(NestedField, method_name):
+            return False
+        for _, field_value in prototype.child_fields():
+            base = EnumField if isinstance(field_value, EnumField) else ValueField
+            if getattr(type(field_value), method_name) is not getattr(base, method_name):
+                return False
+        return prototype.visible
+
+    def _serialized_columns(self) -> List[Tuple[str, Field, List[Any]]]:
+        prototype = self.items.prototype  # type: ignore[attr-defined]
+        columns = []
+        for name, column in self.items.columns.items():  # type: ignore[attr-defined]
+            meta = prototype.__dict__[name]
+            if not meta.visible:
+                continue
+            if isinstance(meta, EnumField):
+                mapping = meta.enum_mapping
+                column = [mapping[key] if key else None for key in column]
+            columns.append((name, meta, column))
+        return columns
+
+    @memoized_serialization
+    def to_json(self) -> Dict:
+        if not self.visible or not self._has_default_serialization("to_json"):
+            return super().to_json.__wrapped__(self)  # type: ignore[attr-defined]
+        columns = self._serialized_columns()
+        return {
+            "value": [
+                {name: column[row] for name, _, column in columns}
+                for row in range(len(self.items))
+            ]
+        }
+
+    @memoized_serialization
+    def describe(self) -> Dict:
+        if not self.visible or not self._has_default_serialization("describe"):
+            return super().describe.__wrapped__(self)  # type: ignore[attr-defined]
+        prototype = self.items.prototype  # type: ignore[attr-defined]
+        columns = self._serialized_columns()
+        return {
+            "variable_name": self.variable_name,
+            "description": self.description,
+            "items": [
+                {
+                    "variable_name": prototype.variable_name,
+                    "description": prototype.description,
+                    **{
+                        name: {
+                            "variable_name": meta.variable_name,
+                            "description": meta.description,
+                            "value": column[row],
+                        }
+                        for name, meta, column in columns
+                    },
+                }
+                for row in range(len(self.items))
+            ],
+        }
+
+    # the rows are built from the columns, there are no views with caches of their own
+    @memoized_serialization
+    def snapshot(self) -> ConfigSnapshot:
+        prototype = self.items.prototype  # type: ignore[attr-defined]
+        columns = self.items.columns  # type: ignore[attr-defined]
+        visible = {name: prototype.__dict__[name].visible for name in columns}
+        rows = zip(*columns.values())
+        return ConfigSnapshot(
+            visible=self.visible,
+            children=tuple(
+                (
+                    str(row),
+                    ConfigSnapshot(
+                        visible=prototype.visible,
+                        children=tuple(
+                            (name, ConfigSnapshot(value=value, visible=visible[name]))
+                            for name, value in zip(columns, values)
+                        ),
+                    ),
+                )
+                for row, values in enumerate(rows)
+            ),
+        )
+
+    def restore_snapshot(self, snapshot: ConfigSnapshot):
+        self._restore_visible(snapshot.visible)
+        n_items = len(snapshot.children)
+        self.truncate_items(n_items)
+        self.extend_items([self.new_item() for _ in range(n_items - len(self.items))])
+        columns = self.items.columns  # type: ignore[attr-defined]
+        for row, (_, row_snapshot) in enumerate(snapshot.children):
+            for name, cell_snapshot in row_snapshot.children:
+                columns[name][row] = cell_snapshot.value
+        self.mark_dirty()
+        self._cache_snapshot(snapshot)
+
+    def deactivate_setter(self):
+        self.items.prototype.deactivate_setter()  # type: ignore[attr-defined]
+        self.bump_structure_version()
+
+    def activate_setter(self):
+        self.items.prototype.activate_setter()  # type: ignore[attr-defined]
+        self.bump_structure_version()
+
+
+def make_columnar(list_field: ListField) -> ColumnarListField:
+    """Replaces a ListField within its config by a ColumnarListField holding the same items
+
+    Args:
+        list_field (ListField): list with a flat NestedField blueprint, e.g. OPCUADatapointConfig.tags
+
+    Returns:
+        ColumnarListField: the new list, which took the place of list_field in its parent
+    """
+    columnar = ColumnarListField.from_list_field(list_field)
+    parent = list_field.parent()
+    name = list_field._name_in_parent
+    if parent is None or name is None:
+        return columnar
+
+    parent.__dict__[name] = columnar
+    parent.adopt(columnar, name)  # type: ignore[arg-type]
+    root = parent.root()
+    if isinstance(root, AbstractAppConfig):
+        root.invalidate_index()
+    parent.bump_structure_version()
+    parent.mark_dirty()
+    return columnar
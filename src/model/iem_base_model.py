@@ -2,13 +2,40 @@ from __future__ import annotations
 from abc import ABC, abstractmethod
 
 # from builtins import classmethod
-from typing import Any, Dict, List, Callable, Optional
+from typing import Any, ClassVar, Dict, Iterator, List, Callable, Optional, Set, Tuple, Union
+from contextlib import contextmanager
+import functools
+import threading
+import weakref
 from pydantic.dataclasses import dataclass
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 from error_handling import ValidationException
+from model.snapshot import ConfigSnapshot
 import validators
 
 
+# nodes whose mark_dirty is deferred by batched_mark_dirty, per thread
+_dirty_batch = threading.local()
+
+
+# defers mark_dirty of the nodes changed in the block to its end, where the paths to the root
+# are walked together and every ancestor is only visited once, e.g. for hundreds of setters
+# on the items of one list. The serializations must not be read inside the block
+@contextmanager
+def batched_mark_dirty() -> Iterator[None]:
+    if getattr(_dirty_batch, "nodes", None) is not None:
+        yield
+        return
+    _dirty_batch.nodes = []
+    try:
+        yield
+    finally:
+        nodes, _dirty_batch.nodes = _dirty_batch.nodes, None
+        visited: Set[int] = set()
+        for node in nodes:
+            node._mark_dirty_path(visited)
+
+
 @dataclass
 class FunctionDescriptionPair:
     name: str
@@ -16,8 +43,346 @@ class FunctionDescriptionPair:
     llm_description: Dict
 
 
+# function of a collapsed list tool, resolves the item from the index parameters of the call
+# and calls method_name on the field at the end of the steps. Every step consumes one index
+# parameter of a list and then follows the subfield names from the item to the next list
+# (or to the target field), so the owner is the outermost collapsed list
+class CollapsedItemTool:
+    def __init__(
+        self,
+        owner: ListField,
+        steps: List[Tuple[str, Tuple[str, ...]]],
+        method_name: str,
+    ):
+        self.owner = owner
+        self.steps = steps
+        self.method_name = method_name
+
+    def resolve(self, **kwargs) -> Field:
+        node: Any = self.owner
+        for index_param, names in self.steps:
+            idx = kwargs.get(index_param)
+            if type(idx) is not int or not 0 <= idx < len(node.items):
+                raise ValidationException(
+                    f"{idx} is not a valid {index_param} for {node.variable_name}"
+                )
+            node = node.items[idx]
+            for name in names:
+                node = dict(node.child_fields())[name]
+        return node
+
+    def __call__(self, **kwargs):
+        field = self.resolve(**kwargs)
+        for index_param, _ in self.steps:
+            kwargs.pop(index_param, None)
+        if self.method_name == "set_value" and not field.setter_active:
+            raise ValidationException(f"{field.variable_name} can not be changed")
+        if self.method_name == "create_item" and not field.create_item_active:
+            raise ValidationException(f"No entries can be added to {field.variable_name}")
+        return getattr(field, self.method_name)(**kwargs)
+
+
+# copy of a tool description with an additional required integer parameter in front
+def with_index_parameter(llm_description: Dict, param_name: str, description: str) -> Dict:
+    function = dict(llm_description["function"])
+    parameters = function.get("parameters") or {}
+    function["parameters"] = {
+        "type": "object",
+        "properties": {
+            param_name: {"type": "integer", "description": description},
+            **parameters.get("properties", {}),
+        },
+        "required": [param_name] + list(parameters.get("required", [])),
+    }
+    return {**llm_description, "function": function}
+
+
+def join_tool_name(prefix: str, name: str) -> str:
+    if not prefix:
+        return name
+    return f"{prefix}-{name}"
+
+
+# the parameter schema of a setter only depends on the kind and name of the field, so one dict is
+# shared by the setters of all list items instead of building a new one per item
+@functools.lru_cache(maxsize=None)
+def setter_parameters(param_name: str, param_type: str, param_description: str) -> Dict:
+    return {
+        "type": "object",
+        "properties": {
+            param_name: {
+                "type": param_type,
+                "description": param_description,
+            },
+        },
+        "required": [param_name],
+    }
+
+
+# the checks of the validators package are pure, their results are memoized since the same
+# server addresses show up in thousands of tags and every fill_from_json replays all of them
+@functools.lru_cache(maxsize=4096)
+def _cached_check(check: Callable[[Any], Any], val: Any) -> bool:
+    return bool(check(val))
+
+
+def check_value(check: Callable[[Any], Any], val: Any) -> bool:
+    try:
+        hash(val)
+    except TypeError:
+        return bool(check(val))
+    return _cached_check(check, val)
+
+
+def is_ip_address(val: Any) -> bool:
+    return check_value(validators.ipv4, val) or check_value(validators.ipv6, val)
+
+
+# memoizes the serialization of a node until the node or one of its subfields is marked dirty,
+# the returned dicts are shared with the cache (and the caches of the parents) and must not be modified
+def memoized_serialization(method: Callable[[Any], Any]) -> Callable[[Any], Any]:
+    key = method.__name__
+
+    @functools.wraps(method)
+    def wrapper(self):
+        private = self.__pydantic_private__
+        cache = private["_serialization_cache"]
+        if cache is None:
+            cache = private["_serialization_cache"] = {}
+        if key not in cache:
+            cache[key] = method(self)
+        return cache[key]
+
+    return wrapper
+
+
+# common base of Fields and AppConfigs, linking every node of the config tree to its parent
+# so that changes can be propagated up to the root
+class ConfigNode(BaseModel):
+    # names of the attributes holding subfields in definition order, computed once per class
+    child_field_layout: ClassVar[Tuple[str, ...]] = ()
+    # initial values of the private attributes, all of them immutable so clones can share them
+    private_defaults: ClassVar[Dict[str, Any]] = {}
+
+    # weak reference, a strong one would make deep copies of a subtree copy all of its ancestors
+    _parent_ref: Optional[weakref.ReferenceType] = PrivateAttr(default=None)
+    # incremented whenever the set of generated tool functions of this subtree may have changed
+    _structure_version: int = PrivateAttr(default=0)
+    # incremented on every change of a value in this subtree, see mark_dirty
+    _content_version: int = PrivateAttr(default=0)
+    # results of describe(), to_json() etc. which are still valid for the current values,
+    # created on first use
+    _serialization_cache: Optional[Dict[str, Any]] = PrivateAttr(default=None)
+    # attribute name within the parent, or index for items of a ListField
+    _name_in_parent: Optional[str] = PrivateAttr(default=None)
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs: Any):
+        super().__pydantic_init_subclass__(**kwargs)
+        cls.child_field_layout = cls.compute_child_field_layout()
+        cls.private_defaults = {
+            name: private_attr.get_default()
+            for name, private_attr in cls.__private_attributes__.items()
+        }
+
+    @classmethod
+    def compute_child_field_layout(cls) -> Tuple[str, ...]:
+        return tuple(
+            field_name
+            for field_name, field_info in cls.model_fields.items()
+            if (
+                isinstance(field_info.annotation, type)
+                and issubclass(field_info.annotation, ConfigNode)
+            )
+            or isinstance(field_info.default, ConfigNode)
+        )
+
+    def model_post_init(self, __context: Any):
+        self._link_children()
+
+    def __deepcopy__(self, memo: Optional[Dict[int, Any]] = None):
+        copied = super().__deepcopy__(memo)
+        # the copied references still point into the original tree
+        copied._parent_ref = None
+        copied._link_children()
+        return copied
+
+    # creates a new node from this one as prototype, much cheaper than model_copy(deep=True):
+    # descriptions, enum mappings and other metadata are shared with the prototype and must
+    # therefore never be modified in place, only the subfields are cloned
+    def clone(self):
+        cls = type(self)
+        copied = cls.__new__(cls)
+        object.__setattr__(copied, "__dict__", self.__dict__.copy())
+        object.__setattr__(
+            copied, "__pydantic_fields_set__", self.__pydantic_fields_set__.copy()
+        )
+        object.__setattr__(copied, "__pydantic_extra__", self.__pydantic_extra__)
+        object.__setattr__(copied, "__pydantic_private__", cls.private_defaults.copy())
+        self._clone_subfields_into(copied)
+        copied._link_children()
+        return copied
+
+    def _clone_subfields_into(self, copied: ConfigNode):
+        for field_name in self.child_field_layout:
+            copied.__dict__[field_name] = self.__dict__[field_name].clone()
+
+    def child_fields(self) -> List[Tuple[str, Field]]:
+        fields = self.__dict__
+        return [(field_name, fields[field_name]) for field_name in self.child_field_layout]
+
+    # subfields which are added to the path index of the AppConfig
+    def indexed_fields(self) -> List[Field]:
+        return [field_value for _, field_value in self.child_fields()]
+
+    # names of the subfields leading from the given ancestor down to this node
+    def relative_path(self, ancestor: ConfigNode) -> Tuple[str, ...]:
+        names: List[str] = []
+        node: Optional[ConfigNode] = self
+        while node is not ancestor:
+            if node is None or node._name_in_parent is None:
+                raise ValueError(f"{ancestor} is not an ancestor of {self}")
+            names.append(node._name_in_parent)
+            node = node.parent()
+        return tuple(reversed(names))
+
+    def _child_snapshots(self) -> Tuple[Tuple[str, ConfigSnapshot], ...]:
+        return tuple((name, child.snapshot()) for name, child in self.child_fields())
+
+    # immutable state of the subtree, memoized like the serializations so unchanged subtrees
+    # are shared between consecutive snapshots
+    @memoized_serialization
+    def snapshot(self) -> ConfigSnapshot:
+        return ConfigSnapshot(children=self._child_snapshots())
+
+    def cached_snapshot(self) -> Optional[ConfigSnapshot]:
+        private = self.__pydantic_private__
+        assert private is not None
+        cache = private["_serialization_cache"]
+        return cache.get("snapshot") if cache else None
+
+    def _cache_snapshot(self, snapshot: ConfigSnapshot):
+        private = self.__pydantic_private__
+        assert private is not None
+        if private["_serialization_cache"] is None:
+            private["_serialization_cache"] = {}
+        private["_serialization_cache"]["snapshot"] = snapshot
+
+    # brings the subtree back to the state of the snapshot, subtrees still holding the
+    # snapshot they are restored to are skipped
+    def restore_snapshot(self, snapshot: ConfigSnapshot):
+        children = dict(self.child_fields())
+        for name, child_snapshot in snapshot.children:
+            child = children[name]
+            if child.cached_snapshot() is not child_snapshot:
+                child.restore_snapshot(child_snapshot)
+        self._cache_snapshot(snapshot)
+
+    # switches all ListFields below this node between one set of tools per item and collapsed
+    # tools which take the index of the item as parameter
+    def set_collapsed_tools(self, collapsed: bool = True):
+        for _, field_value in self.child_fields():
+            field_value.set_collapsed_tools(collapsed)
+
+    # resolves a path below this node for subfields which are not part of the path index
+    def resolve_subpath(self, path: str) -> Optional[Field]:
+        return None
+
+    # resolves a tool path of an item of this node for items which are not part of the path index
+    def resolve_item_tool_path(self, tool_path: str) -> Optional[Field]:
+        return None
+
+    # the private attributes used while walking up the tree are read from __pydantic_private__
+    # directly, BaseModel.__getattr__ is too slow for the number of calls in bulk updates.
+    # Every ConfigNode has private attributes, the asserts narrow the Optional of BaseModel
+    def parent(self) -> Optional[ConfigNode]:
+        private = self.__pydantic_private__
+        assert private is not None
+        parent_ref = private["_parent_ref"]
+        if parent_ref is None:
+            return None
+        return parent_ref()
+
+    def root(self) -> ConfigNode:
+        node = self
+        parent = node.parent()
+        while parent is not None:
+            node = parent
+            parent = node.parent()
+        return node
+
+    # canonical path of the node below the root, e.g. "datapoints.0.tags.3.name"
+    def path(self) -> str:
+        names: List[str] = []
+        node = self
+        parent = node.parent()
+        while parent is not None:
+            # set by adopt for every node with a parent
+            name = node._name_in_parent
+            if name is not None:
+                names.append(name)
+            node = parent
+            parent = node.parent()
+        return ".".join(reversed(names))
+
+    def adopt(self, child: ConfigNode, name: str):
+        # written directly instead of through BaseModel.__setattr__, this runs for every cloned node
+        private = child.__pydantic_private__
+        assert private is not None
+        private["_parent_ref"] = weakref.ref(self)
+        private["_name_in_parent"] = name
+
+    def _link_children(self):
+        for field_name, field_value in self.child_fields():
+            self.adopt(field_value, field_name)
+
+    # prefix which is handed to generate_tool_functions of the given child
+    def child_tool_prefix(self, child: Field) -> str:
+        return ""
+
+    def structure_version(self) -> int:
+        return self._structure_version
+
+    # called on every change which influences the generated tool functions
+    def bump_structure_version(self):
+        node: Optional[ConfigNode] = self
+        while node is not None:
+            private = node.__pydantic_private__
+            assert private is not None
+            private["_structure_version"] += 1
+            node = node.parent()
+
+    def content_version(self) -> int:
+        return self._content_version
+
+    # called on every change which influences describe() or to_json(), the memoized
+    # serializations of the node and all of its parents are dropped, siblings keep theirs
+    def mark_dirty(self):
+        nodes = getattr(_dirty_batch, "nodes", None)
+        if nodes is not None:
+            nodes.append(self)
+        else:
+            self._mark_dirty_path(None)
+
+    # stops at the first node in visited, which was marked with its parents already
+    def _mark_dirty_path(self, visited: Optional[Set[int]]):
+        node: Optional[ConfigNode] = self
+        while node is not None:
+            if visited is not None:
+                if id(node) in visited:
+                    return
+                visited.add(id(node))
+            private = node.__pydantic_private__
+            assert private is not None
+            private["_content_version"] += 1
+            cache = private["_serialization_cache"]
+            if cache:
+                cache.clear()
+            node = node.parent()
+
+
 # most general definition of a Field
-class Field(ABC, BaseModel):
+class Field(ABC, ConfigNode):
     variable_name: str
     description: str
 
@@ -28,19 +393,52 @@ class Field(ABC, BaseModel):
     def generate_tool_functions(self, prefix="") -> List[FunctionDescriptionPair]:
         pass
 
+    def tool_prefix(self) -> str:
+        parent = self.parent()
+        if parent is None:
+            return ""
+        return parent.child_tool_prefix(self)
+
+    # name of the generated tool functions without the action suffix, e.g. "0-OPCUAServer_Datapoint-name"
+    def tool_path(self) -> str:
+        return join_tool_name(self.tool_prefix(), self.variable_name.replace(" ", "_"))
+
     def deactivate_setter(self):
-        self.setter_active = False
+        if self.setter_active:
+            self.setter_active = False
+            self.bump_structure_version()
 
     def activate_setter(self):
-        if self.visible:
+        if self.visible and not self.setter_active:
             self.setter_active = True
+            self.bump_structure_version()
 
     def set_visible(self):
-        self.visible = True
+        if not self.visible:
+            self.visible = True
+            self.bump_structure_version()
+            self.mark_dirty()
 
     def set_invisible(self):
-        self.visible = False
-        self.setter_active = False
+        if self.visible or self.setter_active:
+            self.visible = False
+            self.setter_active = False
+            self.bump_structure_version()
+            self.mark_dirty()
+
+    @memoized_serialization
+    def snapshot(self) -> ConfigSnapshot:
+        return ConfigSnapshot(visible=self.visible, children=self._child_snapshots())
+
+    def _restore_visible(self, visible: bool):
+        if visible and not self.visible:
+            self.set_visible()
+        elif not visible and self.visible:
+            self.set_invisible()
+
+    def restore_snapshot(self, snapshot: ConfigSnapshot):
+        self._restore_visible(snapshot.visible)
+        super().restore_snapshot(snapshot)
 
     @abstractmethod
     def describe(self) -> Dict:
@@ -69,6 +467,7 @@ class EnumField(Field, ABC):
     def set_value(self, key: str):
         if self.validate_value(key):
             self.enum_key = key
+            self.mark_dirty()
         else:
             # To be pushed
             raise ValidationException("Selector option is not available")
@@ -87,16 +486,11 @@ class EnumField(Field, ABC):
             "function": {
                 "name": self.setter_name(prefix),
                 "description": f"Select value for selector {self.variable_name}. Available values are {' '.join(self.enum_mapping.keys())}",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "key": {
-                            "type": "string",
-                            "description": f"Selected option from selector {self.variable_name}",
-                        },
-                    },
-                    "required": [self.variable_name],
-                },
+                "parameters": setter_parameters(
+                    "key",
+                    "string",
+                    f"Selected option from selector {self.variable_name}",
+                ),
             },
         }
         return [
@@ -107,6 +501,7 @@ class EnumField(Field, ABC):
             )
         ]
 
+    @memoized_serialization
     def describe(self) -> Dict:
         if self.visible:
             return {
@@ -117,6 +512,7 @@ class EnumField(Field, ABC):
         else:
             return {}
 
+    @memoized_serialization
     def to_json(self) -> Dict:
         if self.visible:
             return {
@@ -125,14 +521,27 @@ class EnumField(Field, ABC):
         else:
             return {}
 
+    @memoized_serialization
+    def snapshot(self) -> ConfigSnapshot:
+        return ConfigSnapshot(value=self.enum_key, visible=self.visible)
+
+    def restore_snapshot(self, snapshot: ConfigSnapshot):
+        self._restore_visible(snapshot.visible)
+        if self.enum_key != snapshot.value:
+            self.enum_key = snapshot.value
+            self.mark_dirty()
+        self._cache_snapshot(snapshot)
+
     # Idk how this enum works
     def fill_from_json(self, json: Any):
         for k, v in self.enum_mapping.items():
             if v == json:
                 self.enum_key = k
+                self.mark_dirty()
                 return
         if json is None:
             self.enum_key = None
+            self.mark_dirty()
             return
         raise ValueError(f"No matching key found for {json}")
 
@@ -140,15 +549,132 @@ class EnumField(Field, ABC):
 class ListField(Field):
     items: List[Field] = []
     create_item_active: bool = True
+    # if set, one tool per field of the blueprint is generated, taking the index of the item
+    # as parameter, instead of one tool per field of every item
+    collapsed_tools: bool = False
 
     blueprint: Field
 
     def __init__(self, /, **data: Any):
         super().__init__(**data)
-        self.items.append(self.blueprint.model_copy(deep=True))
+        self.append_item(self.new_item())
+
+    @classmethod
+    def compute_child_field_layout(cls) -> Tuple[str, ...]:
+        # the blueprint is not part of the config, the subfields of a ListField are its items
+        return ()
+
+    def child_fields(self) -> List[Tuple[str, Field]]:
+        return [(str(idx), item) for idx, item in enumerate(self.items)]
+
+    # the blueprint is shared by all clones of the list
+    def _clone_subfields_into(self, copied: ConfigNode):
+        copied.__dict__["items"] = [item.clone() for item in self.items]
+
+    def child_tool_prefix(self, child: Field) -> str:
+        return join_tool_name(self.tool_prefix(), str(child._name_in_parent))
+
+    def tool_path(self) -> str:
+        return join_tool_name(self.tool_prefix(), self.variable_name)
+
+    # returns a fresh copy of the blueprint, which is not yet part of the list
+    def new_item(self) -> Field:
+        return self.blueprint.clone()
+
+    def append_item(self, item: Field):
+        self.extend_items([item])
+
+    # appends several items at once, the structure version and the caches are only updated once
+    def extend_items(self, items: List[Field]):
+        if not items:
+            return
+        root = self.root()
+        for item in items:
+            self.adopt(item, str(len(self.items)))
+            self.items.append(item)
+            if isinstance(root, AbstractAppConfig):
+                root.register_fields(item)
+        self.bump_structure_version()
+        self.mark_dirty()
+
+    def replace_item(self, idx: int, item: Field):
+        root = self.root()
+        if isinstance(root, AbstractAppConfig):
+            # while it is still attached, so that its paths are the indexed ones
+            root.unregister_fields(self.items[idx])
+        self.adopt(item, str(idx))
+        self.items[idx] = item
+        if isinstance(root, AbstractAppConfig):
+            root.register_fields(item)
+        self.bump_structure_version()
+        self.mark_dirty()
 
     def create_item(self):
-        self.items.append(self.blueprint.model_copy(deep=True))
+        self.append_item(self.new_item())
+
+    # the field of the blueprint describing the column variable_name of the items
+    def column_field(self, variable_name: str) -> Union[ValueField, EnumField]:
+        if isinstance(self.blueprint, NestedField):
+            for _, field in self.blueprint.child_fields():
+                if field.variable_name == variable_name and isinstance(
+                    field, (ValueField, EnumField)
+                ):
+                    return field
+        raise KeyError(f"{type(self.blueprint).__name__} has no field {variable_name}")
+
+    def column_values(self, variable_name: str) -> List[Any]:
+        values = []
+        for item in self.items:
+            for _, field in item.child_fields():
+                if field.variable_name == variable_name:
+                    if isinstance(field, EnumField):
+                        values.append(field.enum_key)
+                    elif isinstance(field, ValueField):
+                        values.append(field.value)
+                    break
+        return values
+
+    # validates a whole column in one pass (by default the current values of the items) and
+    # returns the errors of all invalid rows by index instead of stopping at the first one,
+    # every distinct value is only checked once
+    def validate_column(
+        self, variable_name: str, values: Optional[List[Any]] = None
+    ) -> Dict[int, str]:
+        field = self.column_field(variable_name)
+        if values is None:
+            values = self.column_values(variable_name)
+        results: Dict[Any, bool] = {}
+        errors = {}
+        for idx, val in enumerate(values):
+            try:
+                valid = results[val]
+            except KeyError:
+                valid = results[val] = bool(field.validate_value(val))
+            except TypeError:
+                valid = bool(field.validate_value(val))
+            if not valid:
+                errors[idx] = f"Invalid value {val!r} for field {variable_name}"
+        return errors
+
+    # sets the column variable_name of the first len(values) items, nothing is changed
+    # if any of the values is invalid, the raised exception lists all invalid rows
+    def set_column(self, variable_name: str, values: List[Any]):
+        if len(values) > len(self.items):
+            raise ValidationException(
+                f"Got {len(values)} values for {len(self.items)} items of {self.variable_name}"
+            )
+        errors = self.validate_column(variable_name, values)
+        if errors:
+            raise ValidationException(
+                "\n".join(f"Item {idx}: {msg}" for idx, msg in errors.items())
+            )
+        for item, val in zip(self.items, values):
+            for _, field in item.child_fields():
+                if field.variable_name == variable_name and isinstance(
+                    field, (ValueField, EnumField)
+                ):
+                    field.set_value(val)
+                    break
 
     def create_prefix(self, preprefix: str) -> str:
         if preprefix == "":
@@ -181,7 +707,53 @@ class ListField(Field):
         else:
             return f"{prefix}-{self.variable_name}-create_item"
 
+    def index_parameter_name(self) -> str:
+        return f"{self.variable_name.replace(' ', '_')}_index"
+
+    def set_collapsed_tools(self, collapsed: bool = True):
+        if self.collapsed_tools != collapsed:
+            self.collapsed_tools = collapsed
+            self.bump_structure_version()
+        # nested lists are collapsed as well, their tools are generated from the blueprint
+        self.blueprint.set_collapsed_tools(collapsed)
+        super().set_collapsed_tools(collapsed)
+
+    # the tools of the blueprint, dispatched to the item given by the index parameter,
+    # the number of tools does not depend on the number of items
+    def generate_collapsed_tool_functions(self, prefix="") -> List[FunctionDescriptionPair]:
+        index_param = self.index_parameter_name()
+        index_description = (
+            f"Index of the {self.blueprint.variable_name} in {self.variable_name}"
+        )
+        all_pairs = []
+        blueprint_pairs = self.blueprint.generate_tool_functions(
+            prefix=join_tool_name(prefix, self.variable_name)
+        )
+        for pair in blueprint_pairs:
+            fct = pair.fct
+            if isinstance(fct, CollapsedItemTool):
+                # tool of a nested collapsed list, the steps continue below its owner
+                steps = [(index_param, fct.owner.relative_path(self.blueprint))]
+                steps += fct.steps
+                method_name = fct.method_name
+            else:
+                steps = [(index_param, fct.__self__.relative_path(self.blueprint))]  # type: ignore
+                method_name = fct.__name__
+            all_pairs.append(
+                FunctionDescriptionPair(
+                    name=pair.name,
+                    fct=CollapsedItemTool(self, steps, method_name),
+                    llm_description=with_index_parameter(
+                        pair.llm_description, index_param, index_description
+                    ),
+                )
+            )
+        all_pairs += self.generate_create_function(prefix=prefix)
+        return all_pairs
+
     def generate_tool_functions(self, prefix="") -> List[FunctionDescriptionPair]:
+        if self.collapsed_tools:
+            return self.generate_collapsed_tool_functions(prefix=prefix)
         all_pairs = []
         for idx, i in enumerate(self.items):
             if prefix:
@@ -201,6 +773,7 @@ class ListField(Field):
         for i in self.items:
             i.activate_setter()
 
+    @memoized_serialization
     def describe(self) -> Dict:
         if self.visible:
             return {
@@ -211,63 +784,64 @@ class ListField(Field):
         else:
             return {}
 
+    @memoized_serialization
     def to_json(self) -> Dict:
         if self.visible:
             return {"value": [i.to_json()["value"] for i in self.items]}
         else:
             return {}
 
+    # removes all items from index n on
+    def truncate_items(self, n: int):
+        if n >= len(self.items):
+            return
+        del self.items[n:]
+        root = self.root()
+        if isinstance(root, AbstractAppConfig):
+            root.invalidate_index()
+        self.bump_structure_version()
+        self.mark_dirty()
+
+    def restore_snapshot(self, snapshot: ConfigSnapshot):
+        n_items = len(snapshot.children)
+        self.truncate_items(n_items)
+        self.extend_items([self.new_item() for _ in range(n_items - len(self.items))])
+        super().restore_snapshot(snapshot)
+
     def fill_from_json(self, json: Any):
         if isinstance(json, list):
             for idx, i in enumerate(json):
                 if idx < len(self.items):
                     self.items[idx].fill_from_json(i)
                 else:
-                    new_item = self.blueprint.model_copy(deep=True)
+                    new_item = self.new_item()
                     new_item.fill_from_json(i)
-                    self.items.append(new_item)
+                    self.append_item(new_item)
 
 
 # general definition of a Field containing other Fields
 class NestedField(Field, ABC):
 
+    def child_tool_prefix(self, child: Field) -> str:
+        return self.tool_path()
+
     # generating a list containing all FunctionDescriptionPairs in all subfields of the nested field
     def generate_tool_functions(self, prefix="") -> List[FunctionDescriptionPair]:
         all_functions = []
-        for field_name, field_value in self.__dict__.items():
-
-            if isinstance(field_value, Field):
-                if hasattr(field_value, "generate_tool_functions") and callable(
-                    getattr(field_value, "generate_tool_functions")
-                ):
-                    if prefix:
-                        new_prefix = prefix + "-" + self.variable_name.replace(" ", "_")
-                    else:
-                        new_prefix = self.variable_name.replace(" ", "_")
-                    sub_functions = getattr(field_value, "generate_tool_functions")(
-                        new_prefix
-                    )
-                    all_functions += sub_functions
+        new_prefix = join_tool_name(prefix, self.variable_name.replace(" ", "_"))
+        for _, field_value in self.child_fields():
+            all_functions += field_value.generate_tool_functions(new_prefix)
         return all_functions
 
     def deactivate_setter(self):
-        for _, field_value in self.__dict__.items():
-
-            if isinstance(field_value, Field):
-                if hasattr(field_value, "deactivate_setter") and callable(
-                    getattr(field_value, "deactivate_setter")
-                ):
-                    getattr(field_value, "deactivate_setter")()
+        for _, field_value in self.child_fields():
+            field_value.deactivate_setter()
 
     def activate_setter(self):
-        for _, field_value in self.__dict__.items():
-
-            if isinstance(field_value, Field):
-                if hasattr(field_value, "activate_sette") and callable(
-                    getattr(field_value, "activate_sette")
-                ):
-                    getattr(field_value, "activate_setter")()
+        for _, field_value in self.child_fields():
+            field_value.activate_setter()
 
+    @memoized_serialization
     def describe(self) -> Dict:
         base: Dict = {}
         if not self.visible:
@@ -276,27 +850,26 @@ class NestedField(Field, ABC):
         base["variable_name"] = self.variable_name
         base["description"] = self.description
 
-        for field_name, field_value in self.__dict__.items():
-            if isinstance(field_value, Field):
-                if field_value.visible:
-                    base[field_name] = field_value.describe()
+        for field_name, field_value in self.child_fields():
+            if field_value.visible:
+                base[field_name] = field_value.describe()
         return base
 
+    @memoized_serialization
     def to_json(self) -> Dict:
         if not self.visible:
             return {"value": {}}
 
         base: Dict = {}
 
-        for field_name, field_value in self.__dict__.items():
-            if isinstance(field_value, Field):
-                if field_value.visible:
-                    base[field_name] = field_value.to_json()["value"]
+        for field_name, field_value in self.child_fields():
+            if field_value.visible:
+                base[field_name] = field_value.to_json()["value"]
         return {"value": base}
 
     def fill_from_json(self, json: Any):
         if isinstance(json, dict):
-            for k, v in self.__dict__.items():
+            for k, v in self.child_fields():
                 if k in json:
                     v.fill_from_json(json[k])
         else:
@@ -310,6 +883,7 @@ class ValueField(Field, ABC):
     def set_value(self, val: Any):
         if self.validate_value(val):
             self.value = val
+            self.mark_dirty()
         else:
             raise ValidationException(
                 f"Value Validation failed / yielded fals for field {self.variable_name} for value {self.value}."
@@ -338,16 +912,11 @@ class ValueField(Field, ABC):
             "function": {
                 "name": self.setter_name(prefix),
                 "description": f"Update the {self.variable_name}",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "val": {
-                            "type": self.data_type(),
-                            "description": f"the new {self.variable_name}",
-                        },
-                    },
-                    "required": [self.variable_name],
-                },
+                "parameters": setter_parameters(
+                    "val",
+                    self.data_type(),
+                    f"the new {self.variable_name}",
+                ),
             },
         }
         return [
@@ -358,6 +927,7 @@ class ValueField(Field, ABC):
             )
         ]
 
+    @memoized_serialization
     def describe(self) -> Dict:
         if self.visible:
             return {
@@ -368,12 +938,25 @@ class ValueField(Field, ABC):
         else:
             return {}
 
+    @memoized_serialization
     def to_json(self) -> Dict:
         if self.visible:
             return {"value": self.value}
         else:
             return {}
 
+    @memoized_serialization
+    def snapshot(self) -> ConfigSnapshot:
+        return ConfigSnapshot(value=self.value, visible=self.visible)
+
+    # the value is taken over without validation, it was valid when the snapshot was taken
+    def restore_snapshot(self, snapshot: ConfigSnapshot):
+        self._restore_visible(snapshot.visible)
+        if self.value != snapshot.value:
+            self.value = snapshot.value
+            self.mark_dirty()
+        self._cache_snapshot(snapshot)
+
     def fill_from_json(self, json: Any):
         self.set_value(json)
 
@@ -403,7 +986,7 @@ class IPField(StringField):
 
     def validate_value(self, val) -> bool:
         if val != None:
-            return validators.ipv4(val) or validators.ipv6(val)
+            return is_ip_address(val)
         else:
             return True
 
@@ -412,7 +995,7 @@ class IPv4Field(IPField):
 
     def validate_value(self, val) -> bool:
         if val != None:
-            return validators.ipv4(val)
+            return check_value(validators.ipv4, val)
         else:
             return True
 
@@ -421,7 +1004,7 @@ class IPv6Field(IPField):
 
     def validate_value(self, val) -> bool:
         if val != None:
-            return validators.ipv6(val)
+            return check_value(validators.ipv6, val)
         else:
             return True
 
@@ -430,7 +1013,7 @@ class PortField(IntField):
 
     def validate_value(self, val) -> bool:
         if val != None:
-            return 0 <= val <= 65535  # type: ignore
+            return isinstance(val, int) and 0 <= val <= 65535
         else:
             return True
 
@@ -439,7 +1022,7 @@ class EmailField(StringField):
 
     def validate_value(self, val) -> bool:
         if val != None:
-            return validators.email(val)
+            return check_value(validators.email, val)
         else:
             return True
 
@@ -452,8 +1035,109 @@ class UrlField(StringField):
         return True
 
 
-class AbstractAppConfig(ABC, BaseModel):
+class AbstractAppConfig(ABC, ConfigNode):
+    # all fields below the config by canonical path and by tool path, built on first use
+    # and extended by ListField.append_item afterwards
+    _field_index: Optional[Dict[str, Field]] = PrivateAttr(default=None)
+    _tool_index: Optional[Dict[str, Field]] = PrivateAttr(default=None)
+
+    # drops the index, it is rebuilt on next use, needed when subfields are replaced
+    def invalidate_index(self):
+        self._field_index = None
+        self._tool_index = None
+
+    def _build_index(self):
+        self._field_index = {}
+        self._tool_index = {}
+        for _, field_value in self.child_fields():
+            self.register_fields(field_value)
 
+    # adds the field and all of its subfields to the index
+    def register_fields(self, field: Field):
+        if self._field_index is None or self._tool_index is None:
+            # the index is not built yet and will contain the field once it is
+            return
+        stack = [field]
+        while stack:
+            node = stack.pop()
+            self._field_index[node.path()] = node
+            self._tool_index[node.tool_path()] = node
+            stack.extend(node.indexed_fields())
+
+    # removes the field and all of its subfields from the index
+    def unregister_fields(self, field: Field):
+        if self._field_index is None or self._tool_index is None:
+            return
+        stack = [field]
+        while stack:
+            node = stack.pop()
+            if self._field_index.get(node.path()) is node:
+                del self._field_index[node.path()]
+            if self._tool_index.get(node.tool_path()) is node:
+                del self._tool_index[node.tool_path()]
+            stack.extend(node.indexed_fields())
+
+    def field_index(self) -> Dict[str, Field]:
+        if self._field_index is None:
+            self._build_index()
+        return self._field_index  # type: ignore
+
+    def tool_index(self) -> Dict[str, Field]:
+        if self._tool_index is None:
+            self._build_index()
+        return self._tool_index  # type: ignore
+
+    # returns the field with the given canonical path, e.g. "datapoints.0.tags.3.name"
+    def get_field(self, path: str) -> Field:
+        field = self.field_index().get(path)
+        if field is None:
+            field = self._resolve_unindexed_path(path)
+        if field is None:
+            raise KeyError(path)
+        return field
+
+    # fields below a ListField in columnar mode are not part of the index, the list resolves them
+    def _resolve_unindexed_path(self, path: str) -> Optional[Field]:
+        prefix = path
+        while "." in prefix:
+            prefix, _, _ = prefix.rpartition(".")
+            node = self.field_index().get(prefix)
+            if node is not None:
+                return node.resolve_subpath(path[len(prefix) + 1 :])
+        return None
+
+    def _resolve_unindexed_tool_path(self, tool_path: str) -> Optional[Field]:
+        prefix = tool_path
+        while prefix:
+            prefix, _, _ = prefix.rpartition("-")
+            node = self.tool_index().get(prefix) if prefix else self
+            if node is None:
+                continue
+            rest = tool_path[len(prefix) + 1 :] if prefix else tool_path
+            for _, field_value in node.child_fields():
+                field = field_value.resolve_item_tool_path(rest)
+                if field is not None:
+                    return field
+        return None
+
+    def fill_field_from_json(self, path: str, json: Any):
+        self.get_field(path).fill_from_json(json)
+
+    # returns the function behind a generated tool name or None if no such tool is available
+    def resolve_tool(self, tool_name: str) -> Optional[Callable[..., None]]:
+        tool_path, _, action = tool_name.rpartition("-")
+        field = self.tool_index().get(tool_path)
+        if field is None:
+            field = self._resolve_unindexed_tool_path(tool_path)
+        if field is None:
+            return None
+        if action == "set_value" and isinstance(field, (ValueField, EnumField)):
+            return field.set_value if field.setter_active else None
+        if action == "create_item" and isinstance(field, ListField):
+            return field.create_item if field.create_item_active else None
+        return None
+
+    @memoized_serialization
     def generate_prompt_string(self):
         return str(self.describe())
 
@@ -467,34 +1151,27 @@ class AbstractAppConfig(ABC, BaseModel):
     # returns a list containing the FunctionDescriptionPairs of all Fields and Subfields of the AppConfig
     def generate_tool_functions(self) -> List[FunctionDescriptionPair]:
         all_functions = []
-        for field_name, field_value in self.__dict__.items():
-            if isinstance(field_value, Field):
-                if hasattr(field_value, "generate_tool_functions") and callable(
-                    getattr(field_value, "generate_tool_functions")
-                ):
-                    sub_functions = getattr(field_value, "generate_tool_functions")(
-                        prefix=""
-                    )
-                    all_functions += sub_functions
+        for _, field_value in self.child_fields():
+            all_functions += field_value.generate_tool_functions(prefix="")
         return all_functions
 
+    @memoized_serialization
     def describe(self) -> Dict:
         base: Dict = {}
-        for field_name, field_value in self.__dict__.items():
-            if isinstance(field_value, Field):
-                if field_value.visible:
-                    base[field_name] = field_value.describe()
+        for field_name, field_value in self.child_fields():
+            if field_value.visible:
+                base[field_name] = field_value.describe()
         return base
 
+    @memoized_serialization
     def to_json(self) -> Dict:
         base: Dict = {}
-        for field_name, field_value in self.__dict__.items():
-            if isinstance(field_value, Field):
-                if field_value.visible:
-                    base[field_name] = field_value.to_json()["value"]
+        for field_name, field_value in self.child_fields():
+            if field_value.visible:
+                base[field_name] = field_value.to_json()["value"]
         return base
 
     def fill_from_json(self, json: Dict):
-        for k, v in self.__dict__.items():
+        for k, v in self.child_fields():
             if k in json:
                 v.fill_from_json(json[k])
@@ -22,6 +22,7 @@ class OPCUATagAddressField(NestedField):
         else:
             return {}
 
+    @memoized_serialization
     def describe(self) -> Dict:
         if self.visible:
             return {
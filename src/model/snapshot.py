@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic.dataclasses import dataclass
+
+
+class ConfigSnapshot:
+    """Immutable state of a config node, its value (for leaf fields), its visibility and the
+    snapshots of its subfields by name.
+
+    Snapshots are memoized like the serializations of a node, so a subtree without changes
+    returns the same snapshot object as before and consecutive snapshots share all unchanged
+    subtrees. Shared subtrees are skipped by diffs and by restoring.
+    """
+
+    __slots__ = ("value", "visible", "children")
+    value: Any
+    visible: bool
+    children: Tuple[Tuple[str, ConfigSnapshot], ...]
+
+    def __init__(
+        self,
+        value: Any = None,
+        visible: bool = True,
+        children: Tuple[Tuple[str, ConfigSnapshot], ...] = (),
+    ):
+        object.__setattr__(self, "value", value)
+        object.__setattr__(self, "visible", visible)
+        object.__setattr__(self, "children", children)
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError("ConfigSnapshot is immutable")
+
+    # immutable, so copies (e.g. of the caches of a deep copied node) can share it
+    def __copy__(self) -> ConfigSnapshot:
+        return self
+
+    def __deepcopy__(self, memo: dict) -> ConfigSnapshot:
+        return self
+
+    def __reduce__(self):
+        return (ConfigSnapshot, (self.value, self.visible, self.children))
+
+    def child(self, name: str) -> Optional[ConfigSnapshot]:
+        for child_name, child in self.children:
+            if child_name == name:
+                return child
+        return None
+
+    def __repr__(self) -> str:
+        if self.children:
+            return f"ConfigSnapshot({len(self.children)} subfields)"
+        return f"ConfigSnapshot(value={self.value!r})"
+
+
+# kind is "set" for a changed value, "added" or "removed" for a subfield which only exists on
+# one side (e.g. a list item or an app) and "visibility" for a field which was shown or hidden
+@dataclass
+class ConfigChange:
+    path: str
+    old: Any
+    new: Any
+    kind: str = "set"
+
+    def __str__(self) -> str:
+        if self.kind == "added":
+            return f"{self.path}: added"
+        if self.kind == "removed":
+            return f"{self.path}: removed"
+        if self.kind == "visibility":
+            return f"{self.path}: {'shown' if self.new else 'hidden'}"
+        return f"{self.path}: {json.dumps(self.old, default=str)} -> {json.dumps(self.new, default=str)}"
+
+
+def join_path(prefix: str, name: str) -> str:
+    if not prefix:
+        return name
+    return f"{prefix}.{name}"
+
+
+def leaf_values(
+    snapshot: ConfigSnapshot, path: str = "", visible_only: bool = False
+) -> List[Tuple[str, Any]]:
+    if visible_only and not snapshot.visible:
+        return []
+    if not snapshot.children:
+        return [(path, snapshot.value)]
+    values = []
+    for name, child in snapshot.children:
+        values += leaf_values(child, join_path(path, name), visible_only)
+    return values
+
+
+# the changes between two snapshots. A subfield which only exists in the new one (e.g. an added
+# list item) yields an "added" change followed by its values which are set, one which only
+# exists in the old one a single "removed" change. With visible_only the changes are limited to
+# what the config promts show: hidden subfields are skipped and a field which is shown again
+# yields its values like an added one.
+def diff_snapshots(
+    old: Optional[ConfigSnapshot],
+    new: Optional[ConfigSnapshot],
+    path: str = "",
+    visible_only: bool = False,
+) -> List[ConfigChange]:
+    if old is new:
+        return []
+    if old is None and new is None:
+        return []
+    if old is None:
+        if visible_only and not new.visible:  # type: ignore[union-attr]
+            return []
+        return [ConfigChange(path=path, old=None, new=None, kind="added")] + [
+            ConfigChange(path=p, old=None, new=v)
+            for p, v in leaf_values(new, path, visible_only)  # type: ignore[arg-type]
+            if v is not None
+        ]
+    if new is None:
+        if visible_only and not old.visible:
+            return []
+        return [ConfigChange(path=path, old=None, new=None, kind="removed")]
+
+    changes = []
+    if old.visible != new.visible:
+        changes.append(
+            ConfigChange(path=path, old=old.visible, new=new.visible, kind="visibility")
+        )
+        if visible_only:
+            if not new.visible:
+                return changes
+            return changes + [
+                ConfigChange(path=p, old=None, new=v)
+                for p, v in leaf_values(new, path, visible_only)
+                if v is not None
+            ]
+    elif visible_only and not new.visible:
+        return []
+
+    if not old.children and not new.children:
+        if old.value != new.value:
+            changes.append(ConfigChange(path=path, old=old.value, new=new.value))
+        return changes
+
+    old_children = dict(old.children)
+    for name, new_child in new.children:
+        changes += diff_snapshots(
+            old_children.pop(name, None), new_child, join_path(path, name), visible_only
+        )
+    for name, old_child in old_children.items():
+        changes += diff_snapshots(old_child, None, join_path(path, name), visible_only)
+    return changes
+
+
+# keys of a describe() serialization which describe the field itself, the others are its value
+# ("value"), its items ("items") or its subfields
+DESCRIPTION_KEYS = ("variable_name", "description")
+
+
+def described_values(description: Dict, path: str = "") -> List[Tuple[str, Any]]:
+    if "value" in description:
+        return [(path, description["value"])]
+    values = []
+    for idx, item in enumerate(description.get("items", [])):
+        values += described_values(item, join_path(path, str(idx)))
+    for name, child in description.items():
+        if name not in DESCRIPTION_KEYS and name != "items":
+            values += described_values(child, join_path(path, name))
+    return values
+
+
+# the changes between two describe() serializations of a config, i.e. as the config promts show
+# them: enum fields with their mapped values and without the hidden fields, list items numbered
+# among the shown items. The kinds of the changes are the ones of diff_snapshots with
+# visible_only
+def diff_descriptions(
+    old: Optional[Dict], new: Optional[Dict], path: str = ""
+) -> List[ConfigChange]:
+    if old is new:
+        return []
+    if new is None:
+        return [ConfigChange(path=path, old=None, new=None, kind="removed")]
+    if old is None:
+        return [ConfigChange(path=path, old=None, new=None, kind="added")] + [
+            ConfigChange(path=p, old=None, new=v)
+            for p, v in described_values(new, path)
+            if v is not None
+        ]
+
+    if "value" in old or "value" in new:
+        if old.get("value") != new.get("value"):
+            return [ConfigChange(path=path, old=old.get("value"), new=new.get("value"))]
+        return []
+
+    changes = []
+    old_items, new_items = old.get("items", []), new.get("items", [])
+    for idx in range(max(len(old_items), len(new_items))):
+        changes += diff_descriptions(
+            old_items[idx] if idx < len(old_items) else None,
+            new_items[idx] if idx < len(new_items) else None,
+            join_path(path, str(idx)),
+        )
+    for name, new_child in new.items():
+        if name in DESCRIPTION_KEYS or name == "items":
+            continue
+        child_path = join_path(path, name)
+        if name in old:
+            changes += diff_descriptions(old[name], new_child, child_path)
+        else:
+            # hidden fields are left out of the description
+            changes.append(ConfigChange(path=child_path, old=False, new=True, kind="visibility"))
+            changes += [
+                ConfigChange(path=p, old=None, new=v)
+                for p, v in described_values(new_child, child_path)
+                if v is not None
+            ]
+    for name in old:
+        if name not in new and name not in DESCRIPTION_KEYS and name != "items":
+            changes.append(
+                ConfigChange(path=join_path(path, name), old=True, new=False, kind="visibility")
+            )
+    return changes
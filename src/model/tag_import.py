@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import csv
+import json
+import time
+from dataclasses import field
+from pydantic.dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Union
+
+from error_handling import ValidationException
+from model.iem_base_model import BoolField, EnumField, Field, IntField, ListField
+from model.iem_model import OPCUADatapointConfig
+
+
+@dataclass
+class ImportReport:
+    imported: int = 0
+    failed: int = 0
+    duration: float = 0.0
+    # only the first max_errors messages are kept, so the report stays small for broken files
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def tags_per_second(self) -> float:
+        if self.duration == 0:
+            return 0.0
+        return self.imported / self.duration
+
+    def __str__(self) -> str:
+        return (
+            f"Imported {self.imported} tags ({self.failed} failed) in {self.duration:.2f}s, "
+            f"{self.tags_per_second:.0f} tags/s"
+        )
+
+
+# a tag as dict, or a line of a JSON Lines export which is parsed by import_tags
+TagRecord = Union[Dict[str, Any], str]
+
+
+def read_tag_records(path: str) -> Iterator[TagRecord]:
+    """Reads a tag export line by line, never holding more than one record in memory
+
+    Args:
+        path (str): path of a JSON Lines (.jsonl) or CSV (.csv) file with one tag per line/row
+
+    Returns:
+        Iterator[TagRecord]: one dict per CSV row, keys are the field names of OPCUATagConfig,
+            or one unparsed line per JSON Lines record, so that a broken line only fails
+            its own record in import_tags
+    """
+    if path.endswith(".csv"):
+        with open(path, newline="") as f:
+            for row in csv.DictReader(f):
+                yield row
+    elif path.endswith(".jsonl"):
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    yield line
+    else:
+        raise ValueError(f"Unsupported tag export format: {path}")
+
+
+# CSV only knows strings, convert them into what fill_from_json of the field expects
+def _coerce_value(target: Field, raw: Any) -> Any:
+    if not isinstance(raw, str):
+        return raw
+    if raw == "":
+        return None
+    if isinstance(target, IntField):
+        return int(raw)
+    if isinstance(target, BoolField):
+        return raw.strip().lower() in ("true", "1", "yes")
+    if isinstance(target, EnumField):
+        if raw in target.enum_mapping:
+            return target.enum_mapping[raw]
+        for value in target.enum_mapping.values():
+            if str(value) == raw:
+                return value
+    return raw
+
+
+def _is_untouched(tags: ListField) -> bool:
+    # a new datapoint always holds one empty tag, which is replaced by the first imported tag
+    return len(tags.items) == 1 and tags.items[0].to_json() == tags.blueprint.to_json()
+
+
+def import_tags(
+    tags: ListField,
+    records: Iterable[TagRecord],
+    batch_size: int = 1000,
+    max_errors: int = 100,
+) -> ImportReport:
+    """Fills the items of a ListField of tags from a stream of records in batches
+
+    Every record is parsed and validated by filling a new item from it, records which are no
+    JSON object or fail validation are skipped and reported. Only one batch of items is held outside of the list at any time.
+
+    Args:
+        tags (ListField): list of OPCUATagConfig items, e.g. OPCUADatapointConfig.tags
+        records (Iterable[TagRecord]): tag records, e.g. from read_tag_records
+        batch_size (int): number of items appended to the list at once
+        max_errors (int): maximum number of error messages kept in the report
+
+    Returns:
+        ImportReport: number of imported and failed tags and the throughput
+    """
+    report = ImportReport()
+    start = time.perf_counter()
+    reuse_first = _is_untouched(tags)
+    batch: List[Field] = []
+
+    for line, record in enumerate(records, start=1):
+        item = tags.new_item()
+        try:
+            if isinstance(record, str):
+                record = json.loads(record)
+            if not isinstance(record, dict):
+                raise ValueError(f"expected a JSON object, got {type(record).__name__}")
+            for field_name, target in item.child_fields():
+                if field_name in record:
+                    target.fill_from_json(_coerce_value(target, record[field_name]))
+        except (ValidationException, ValueError, TypeError) as e:
+            report.failed += 1
+            if len(report.errors) < max_errors:
+                report.errors.append(f"Record {line}: {e}")
+            continue
+
+        report.imported += 1
+        if reuse_first:
+            tags.replace_item(0, item)
+            reuse_first = False
+            continue
+        batch.append(item)
+        if len(batch) >= batch_size:
+            tags.extend_items(batch)
+            batch = []
+
+    tags.extend_items(batch)
+    report.duration = time.perf_counter() - start
+    return report
+
+
+def import_tag_file(
+    datapoint: OPCUADatapointConfig, path: str, batch_size: int = 1000
+) -> ImportReport:
+    return import_tags(datapoint.tags, read_tag_records(path), batch_size=batch_size)
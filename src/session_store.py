@@ -0,0 +1,222 @@
+import importlib
+import json
+import os
+import re
+import time
+from typing import IO, Dict, List, Optional
+
+from history import History
+from model.app_model import AppModel, AppModelSnapshot, AppSnapshot
+from model.iem_base_model import AbstractAppConfig
+from model.snapshot import ConfigSnapshot
+
+# node records start with their id, so that they can be indexed without parsing them
+NODE_ID_PATTERN = re.compile(rb'^\{"type": "node", "id": (\d+)')
+
+
+class SessionStore:
+    """Append-only JSON Lines log of a History, so that a session survives a restart of the
+    app and is resumed without calling the LLM or the tool functions again.
+
+    Every promt, config and undo/redo is one record. The config snapshots are written as
+    their nodes, a node which is shared with an earlier snapshot (every unchanged subtree) is
+    only referenced by its id, so a turn writes about as much as it changed. Records are
+    buffered and written with one fsync every sync_every records, after sync_interval
+    seconds or on flush, a crash loses at most the records since then.
+
+    On load the promts are replayed into a new History, the config snapshots are only read
+    from the log when the History needs them (getConfig), and the model is restored from the
+    latest one.
+    """
+
+    def __init__(self, path: str, sync_every: int = 256, sync_interval: float = 5.0):
+        self.path = path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.pending: List[str] = []
+        self.last_sync = time.monotonic()
+        self.file: Optional[IO[str]] = None
+        self.reader: Optional[IO[bytes]] = None
+        # nodes which are written or loaded by their id in the log, and the other way round
+        # by id() of the snapshot. The snapshots are kept alive so that id() is not reused
+        self.nodes: Dict[int, ConfigSnapshot] = {}
+        self.node_ids: Dict[int, int] = {}
+        self.node_offsets: Dict[int, int] = {}
+        self.next_node_id = 0
+        self.config_records: List[Dict] = []
+        # configs the snapshots are restored into by load_config, by config class
+        self.loaded_configs: Dict[str, AbstractAppConfig] = {}
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path) and os.path.getsize(self.path) > 0
+
+    def attach(self, history: History):
+        history.store = self
+        if self.file is None:
+            self.file = open(self.path, "a", encoding="utf-8")
+
+    def write(self, record: Dict):
+        self.pending.append(json.dumps(record, default=str))
+        if (
+            len(self.pending) >= self.sync_every
+            or time.monotonic() - self.last_sync >= self.sync_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        if self.file is None or not self.pending:
+            return
+        self.file.write("\n".join(self.pending) + "\n")
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending.clear()
+        self.last_sync = time.monotonic()
+
+    def close(self):
+        self.flush()
+        for f in (self.file, self.reader):
+            if f is not None:
+                f.close()
+        self.file = self.reader = None
+
+    def log_system_promt(self, systemPromt: str):
+        self.write({"type": "system", "content": systemPromt})
+
+    def log_promt(self, promt: Dict):
+        self.write({"type": "promt", "role": promt["role"], "content": promt["content"]})
+
+    def log_cursor(self, cursor: int, redoStack: List[int]):
+        self.write({"type": "cursor", "cursor": cursor, "redo": list(redoStack)})
+
+    def log_config(self, snapshot: AppModelSnapshot, parent: int):
+        apps = []
+        for app in snapshot.apps:
+            apps.append(
+                {
+                    "application_name": app.application_name,
+                    "app_id": app.app_id,
+                    "application_description": app.application_description,
+                    "installed_device_name": app.installed_device_name,
+                    "config_class": f"{app.config_class.__module__}:{app.config_class.__qualname__}",
+                    "config": self.write_node(app.config),
+                }
+            )
+        record = {"type": "config", "version": snapshot.version, "parent": parent, "apps": apps}
+        self.config_records.append(record)
+        self.write(record)
+
+    # writes the node and its children which are not in the log yet, returns its id
+    def write_node(self, snapshot: ConfigSnapshot) -> int:
+        node_id = self.node_ids.get(id(snapshot))
+        if node_id is not None:
+            return node_id
+        children = [[name, self.write_node(child)] for name, child in snapshot.children]
+        node_id = self.next_node_id
+        self.next_node_id += 1
+        self.nodes[node_id] = snapshot
+        self.node_ids[id(snapshot)] = node_id
+        # the key order is relied on by NODE_ID_PATTERN
+        self.write(
+            {
+                "type": "node",
+                "id": node_id,
+                "value": snapshot.value,
+                "visible": snapshot.visible,
+                "children": children,
+            }
+        )
+        return node_id
+
+    def read_node(self, node_id: int) -> ConfigSnapshot:
+        snapshot = self.nodes.get(node_id)
+        if snapshot is not None:
+            return snapshot
+        if self.reader is None:
+            self.reader = open(self.path, "rb")
+        self.reader.seek(self.node_offsets[node_id])
+        record = json.loads(self.reader.readline())
+        snapshot = ConfigSnapshot(
+            value=record["value"],
+            visible=record["visible"],
+            children=tuple(
+                (name, self.read_node(child_id)) for name, child_id in record["children"]
+            ),
+        )
+        self.nodes[node_id] = snapshot
+        self.node_ids[id(snapshot)] = node_id
+        return snapshot
+
+    def load_config(self, index: int) -> AppModelSnapshot:
+        record = self.config_records[index]
+        apps = []
+        for app in record["apps"]:
+            module, name = app["config_class"].split(":")
+            config_class = getattr(importlib.import_module(module), name)
+            snapshot = self.read_node(app["config"])
+            # the description is not logged, it is taken from a config in that state. One
+            # config per class is restored from snapshot to snapshot, which only visits the
+            # changed subtrees and keeps the descriptions of the others
+            config = self.loaded_configs.get(app["config_class"])
+            if config is None:
+                config = self.loaded_configs[app["config_class"]] = config_class()
+            config.restore_snapshot(snapshot)
+            apps.append(
+                AppSnapshot(
+                    application_name=app["application_name"],
+                    app_id=app["app_id"],
+                    application_description=app["application_description"],
+                    installed_device_name=app["installed_device_name"],
+                    config_class=config_class,
+                    config=snapshot,
+                    config_description=config.describe(),
+                )
+            )
+        return AppModelSnapshot(apps=tuple(apps), version=record["version"])
+
+    def load(self, model: AppModel) -> History:
+        """History of the logged session with the model restored to its current config, or
+        an empty History if nothing is logged yet. Either way the History is attached.
+        """
+        history = History()
+        if self.exists():
+            self.replay(history)
+            history.configLoader = self.load_config
+            if history.configCursor >= 0:
+                model.restore_snapshot(history.getConfig(history.configCursor))
+                model.advance_version(
+                    max(record["version"] for record in self.config_records)
+                )
+        self.attach(history)
+        return history
+
+    def replay(self, history: History):
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                match = NODE_ID_PATTERN.match(line)
+                if match is not None and line.endswith(b"\n"):
+                    node_id = int(match.group(1))
+                    self.node_offsets[node_id] = offset
+                    self.next_node_id = max(self.next_node_id, node_id + 1)
+                    offset += len(line)
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the last record was not written completely, it is dropped
+                    break
+                offset += len(line)
+                if record["type"] == "system":
+                    history.addSystemPromt(record["content"])
+                elif record["type"] == "promt":
+                    history.addPromt_withStrs(record["role"], record["content"])
+                elif record["type"] == "config":
+                    self.config_records.append(record)
+                    history.configCursor = record["parent"]
+                    history.addSnapshot(None)
+                elif record["type"] == "cursor":
+                    history.configCursor = record["cursor"]
+                    history.redoStack[:] = record["redo"]
+        if offset < os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
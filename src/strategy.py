@@ -1,29 +1,79 @@
 from __future__ import annotations
+import asyncio
+import os
+import time
 from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from pydantic.dataclasses import dataclass
 
 from iem_integration.devices import get_device_list
 from model.iem_model import UAConnectorConfig, DocumentationUAConnectorConfig
 from model.app_model import AppModel, App
 from llm_integration.data_extraction import DataExtractor
-from llm_integration.llm_service import GPT4o
+from llm_integration.llm_service import LLM, ResponseToolCallPair
+from llm_integration.resilience import ResilientLLM
+from llm_integration.response_cache import ResponseCache
+from llm_integration.router import ANSWER, EXTRACTION, ModelRouter
 from llm_integration.nl_service import NLService
-from typing import Tuple
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 from history import History
+from session_store import SessionStore
+
+# a turn is the extraction and the answer to the latest user promt, requested one after the
+# other or both from one completion
+TWO_CALLS = "two_calls"
+SINGLE_CALL = "single_call"
+TURN_MODES = (TWO_CALLS, SINGLE_CALL)
+
+# device section of the system promt until the device list is loaded from the IEM
+DEVICES_LOADING = "The list of devices is still loading."
+DEVICES_UNAVAILABLE = "The list of devices could not be loaded from the IEM."
+
+# runs the requests of starting sessions, so that the UI does not wait for them
+_startup_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="session-start")
+
+
+@dataclass
+class TurnResult:
+    mode: str
+    response: str
+    llm_calls: int
+    duration: float = 0.0
+    # why a single call turn needed a second request for the answer
+    follow_up_reason: Optional[str] = None
+
+    def __str__(self):
+        text = f"{self.mode}: {self.llm_calls} LLM calls in {self.duration:.2f} s"
+        if self.follow_up_reason is not None:
+            text += f" ({self.follow_up_reason})"
+        return text
 
 
 class Strategy(ABC):
-    def __init__(self):
+    def __init__(self, session_path: Optional[str] = None):
         self.history = History()
+        # the history is logged to session_path and resumed from it if it exists
+        self.session_store = SessionStore(session_path) if session_path else None
 
     model: AppModel
+    turn_mode: str = TWO_CALLS
+    last_turn: Optional[TurnResult] = None
 
     @abstractmethod
-    def send_message(self, prompt: str, history: list) -> Tuple[str, AppModel]:
+    def send_message(self, mode: Optional[str] = None) -> TurnResult:
         pass
 
 
 class EdgeConfigStrategy(Strategy):
     model: AppModel
+    # see send_message_async
+    speculative_response = True
+    speculation_hits = 0
+    # see apply_prefetched
+    startup_futures: Dict[str, Future] = {}
+    startup_timings: Dict[str, float] = {}
+    llm_router: Optional[ModelRouter] = None
     system_prompt = """
     You are an expert for configuring Siemens IEM.
 There are many different kinds of customers, some more experienced, but also beginners, which do not how to
@@ -157,31 +207,312 @@ Currently, IEnsight offers the following features:
             self.opc_ua_connector.generate_prompt_string()
         )
 
-    def __init__(self) -> None:
-        super().__init__()
-        adapted_system_prompt = self.system_prompt.format(
-            self.create_app_overview(),
-            "\n".join(
-                [f"{device.name} ({device.status})" for device in get_device_list()]
-            ),
-        )
+    def format_system_prompt(self, device_list: str) -> str:
+        return self.system_prompt.format(self.create_app_overview(), device_list)
+
+    def __init__(self, session_path: Optional[str] = None) -> None:
+        """Starts the session without waiting for the IEM or the LLM clients.
+
+        The device list is requested from the IEM in the background, the system promt says
+        that it is loading until then. The LLM clients, the router and the tool schemas of
+        the DataExtractor are built in the background as well. apply_prefetched takes over
+        whatever has arrived, every turn waits for all of it first. The time of every phase
+        is kept in startup_timings.
+        """
+        super().__init__(session_path)
+        self.startup_start = time.perf_counter()
+        self.startup_timings: Dict[str, float] = {}
+        self.startup_futures: Dict[str, Future] = {
+            "devices": _startup_executor.submit(self.timed, "devices", get_device_list)
+        }
 
         self.model: AppModel = AppModel()
         self.model.apps = []
-        self.nl_service = NLService(self.model, GPT4o(adapted_system_prompt))
-        self.data_extractor = DataExtractor(self.model)
-
-        self.history.addSystemPromt(adapted_system_prompt)
+        deadline = float(os.environ.get("LLM_DEADLINE", "60"))
+        self.turn_mode = os.environ.get("TURN_MODE", TWO_CALLS)
+        if self.turn_mode not in TURN_MODES:
+            raise ValueError(f"TURN_MODE has to be one of {', '.join(TURN_MODES)}")
+
+        if self.session_store is not None:
+            # restores the model to the latest config of the session
+            self.history = self.timed("session", self.session_store.load, self.model)
+
+        # the system promt of the resumed session, the one with the device list is only logged
+        # to the session store if it differs, the placeholder is never logged
+        self.logged_system_prompt = self.history.systemPromt
+        devices = self.startup_futures["devices"]
+        if devices.done():
+            self.apply_device_list(devices)
+            del self.startup_futures["devices"]
+        else:
+            self.history.systemPromt = self.format_system_prompt(DEVICES_LOADING)
 
         # add first entry to the configHistory
-        self.history.addConfig(self.model)
+        if not self.history.configHistory:
+            self.history.addConfig(self.model)
+
+        # started after the session is loaded, as the tool schemas are generated from the model
+        self.llm_deadline = deadline
+        self.start_llm_services()
+        self.startup_timings["interactive"] = time.perf_counter() - self.startup_start
+
+    def timed(self, phase: str, fct: Callable, *args: Any) -> Any:
+        start = time.perf_counter()
+        try:
+            return fct(*args)
+        finally:
+            self.startup_timings[phase] = time.perf_counter() - start
+
+    def build_router(self, system_prompt: str, deadline: float) -> ModelRouter:
+        # every task has a chain of backends which is tried in order within a call, e.g.
+        # LLM_EXTRACTION_BACKENDS=Groq,GPT4o, by default LLM_FALLBACK_CHAIN or only GPT4o.
+        # With LLM_HEDGE_AFTER a request which is still open after that many seconds is also
+        # sent to the next backend of the chain. A streamed answer falls back to the next
+        # backend if its first chunk takes longer than LLM_FIRST_CHUNK_TIMEOUT seconds, by
+        # default LLM_DEADLINE. With LLM_RESPONSE_CACHE_DIR identical requests of all backends
+        # are answered from a ResponseCache in that directory, whose entries expire after
+        # LLM_RESPONSE_CACHE_TTL seconds if set
+        hedge_after = os.environ.get("LLM_HEDGE_AFTER")
+        first_chunk_after = float(os.environ.get("LLM_FIRST_CHUNK_TIMEOUT", deadline))
+        cache_dir = os.environ.get("LLM_RESPONSE_CACHE_DIR")
+        cache_ttl = os.environ.get("LLM_RESPONSE_CACHE_TTL")
+        response_cache = (
+            ResponseCache(directory=cache_dir, ttl=float(cache_ttl) if cache_ttl else None)
+            if cache_dir
+            else None
+        )
+
+        def chain(variable: str) -> List[LLM]:
+            names = os.environ.get(variable) or os.environ.get("LLM_FALLBACK_CHAIN", "GPT4o")
+            llm = ResilientLLM.from_names(
+                names.split(","),
+                system_prompt,
+                deadline=deadline,
+                hedge_after=float(hedge_after) if hedge_after else None,
+                first_chunk_after=first_chunk_after,
+            )
+            for backend in llm.backends:
+                backend.response_cache = response_cache
+            return [llm]
+
+        return ModelRouter(
+            {
+                EXTRACTION: chain("LLM_EXTRACTION_BACKENDS"),
+                ANSWER: chain("LLM_ANSWER_BACKENDS"),
+            }
+        )
 
-    def send_message(self):
+    def build_llm_services(
+        self, system_prompt: str, deadline: float
+    ) -> Tuple[ModelRouter, NLService, DataExtractor]:
+        router = self.timed("llm_clients", self.build_router, system_prompt, deadline)
+        data_extractor = self.timed("tools", DataExtractor, self.model, router)
+        return router, NLService(self.model, router), data_extractor
 
-        self.data_extractor.update_data(
-            self.history
-        )  # changes model, adds new model to configHistory and adds validation promts to promtHistory if necessary
+    def start_llm_services(self):
+        self.startup_futures["llm"] = _startup_executor.submit(
+            self.build_llm_services, self.history.systemPromt, self.llm_deadline
+        )
+
+    def apply_prefetched(self, wait: bool = False):
+        """Takes over the device list and the LLM services once they are loaded, with wait
+        until they are. Called from the thread of the UI, so that the history and the
+        services are not changed while a turn uses them.
+        """
+        futures = self.startup_futures
+        if not futures:
+            return
+
+        devices = futures.get("devices")
+        if devices is not None and (wait or devices.done()):
+            self.apply_device_list(devices)
+            del futures["devices"]
+
+        llm = futures.get("llm")
+        if llm is not None and (wait or llm.done()):
+            del futures["llm"]
+            try:
+                self.llm_router, self.nl_service, self.data_extractor = llm.result()
+            except Exception:
+                # raised once in the thread of the UI, like the constructors of the LLM clients
+                # did before they were built in the background (e.g. without OPENAI_API_KEY),
+                # the next turn waits for a new build
+                self.start_llm_services()
+                raise
+
+        if not futures:
+            self.startup_timings["ready"] = time.perf_counter() - self.startup_start
+            print(f"Startup: {self.startup_report()}")
+
+    def apply_device_list(self, devices: Future):
+        try:
+            device_list = "\n".join(
+                [f"{device.name} ({device.status})" for device in devices.result()]
+            )
+        except Exception as e:
+            print(f"Loading the device list failed: {e!r}")
+            device_list = DEVICES_UNAVAILABLE
+        self.history.systemPromt = self.logged_system_prompt
+        self.history.addSystemPromt(self.format_system_prompt(device_list))
+
+    def startup_report(self) -> str:
+        return ", ".join(
+            f"{phase} {seconds:.2f} s" for phase, seconds in self.startup_timings.items()
+        )
+
+    def send_message(self, mode: Optional[str] = None) -> TurnResult:
+        """Answers the latest user promt with the turn_mode of the strategy or the given mode.
+
+        With TWO_CALLS the values are extracted first and the answer is requested with the
+        changed config. With SINGLE_CALL one completion returns the tool calls and the answer
+        next to them, which halves the requests of a turn. The answer is requested again if
+        the completion has no text or some of its tool calls failed, as it was written
+        assuming that they succeed.
+        """
+        mode = mode or self.turn_mode
+        self.apply_prefetched(wait=True)
+        start = time.perf_counter()
+        if mode == SINGLE_CALL:
+            result = self.send_message_single_call()
+        elif mode == TWO_CALLS:
+            self.data_extractor.update_data(
+                self.history
+            )  # changes model, adds new model to configHistory and adds validation promts to promtHistory if necessary
+
+            response = self.nl_service.retrieve_model(
+                self.history
+            )  # adds assistent response to history
+            result = TurnResult(mode=TWO_CALLS, response=response, llm_calls=2)
+        else:
+            raise ValueError(f"Unknown turn mode {mode}")
+        result.duration = time.perf_counter() - start
+        self.last_turn = result
+        print(f"Turn: {result}")
+
+        # one fsync per turn
+        if self.session_store is not None:
+            self.session_store.flush()
+        return result
+
+    def send_message_single_call(self) -> TurnResult:
+        response_pair = self.nl_service.retrieve_model_with_tools(
+            self.history, self.data_extractor.get_tools()
+        )
+        reason = self.apply_single_call(response_pair)
+        if reason is None:
+            response = response_pair.response
+        else:
+            response = self.nl_service.retrieve_model(self.history)
+        return TurnResult(
+            mode=SINGLE_CALL,
+            response=response,
+            llm_calls=1 if reason is None else 2,
+            follow_up_reason=reason,
+        )
+
+    async def send_message_single_call_async(self) -> TurnResult:
+        response_pair = await self.nl_service.retrieve_model_with_tools_async(
+            self.history, self.data_extractor.get_tools()
+        )
+        reason = self.apply_single_call(response_pair)
+        if reason is None:
+            response = response_pair.response
+        else:
+            response = await self.nl_service.retrieve_model_async(self.history)
+        return TurnResult(
+            mode=SINGLE_CALL,
+            response=response,
+            llm_calls=1 if reason is None else 2,
+            follow_up_reason=reason,
+        )
+
+    # applies the tool calls of a single call turn and adds its answer to the history, returns
+    # why the answer has to be requested again or None
+    def apply_single_call(self, response_pair: ResponseToolCallPair) -> Optional[str]:
+        validationPromts = self.data_extractor.apply_response(self.history, response_pair)
+        if not response_pair.response:
+            return "no answer next to the tool calls"
+        if validationPromts:
+            return "tool calls failed"
+        self.history.addPromt_withStrs("assistant", response_pair.response)
+        return None
+
+    # send_message with the response yielded in chunks as it arrives, the extraction is done
+    # before the first chunk
+    def send_message_stream(self) -> Iterator[str]:
+        self.apply_prefetched(wait=True)
+        start = time.perf_counter()
+        self.data_extractor.update_data(self.history)
+        yield from self.nl_service.retrieve_model_stream(self.history)
+        self.last_turn = TurnResult(
+            mode=TWO_CALLS,
+            response=self.history.getLatestPromtAsStr("assistant"),
+            llm_calls=2,
+            duration=time.perf_counter() - start,
+        )
 
-        self.nl_service.retrieve_model(
-            self.history
-        )  # adds assistent response to history
+        if self.session_store is not None:
+            self.session_store.flush()
+
+    async def send_message_async(self, mode: Optional[str] = None) -> TurnResult:
+        """Same as send_message without blocking while waiting for the LLM.
+
+        With TWO_CALLS and speculative_response the response is requested with the current
+        config while the extraction is running. It is used if the extraction did not change
+        the promt (e.g. for questions which set no values), otherwise it is cancelled and the
+        response is requested again. The requests go through the *_async methods of the
+        LLMs, which wait on the event loop instead of in a thread per request, so that one
+        process can serve many sessions. The Streamlit app does not use it, it runs every
+        session in a thread of its own and streams the answer with send_message_stream.
+        """
+        mode = mode or self.turn_mode
+        if self.startup_futures:
+            await asyncio.to_thread(self.apply_prefetched, True)
+        start = time.perf_counter()
+        if mode == SINGLE_CALL:
+            result = await self.send_message_single_call_async()
+        elif mode == TWO_CALLS:
+            result = await self.send_message_two_calls_async()
+        else:
+            raise ValueError(f"Unknown turn mode {mode}")
+        result.duration = time.perf_counter() - start
+        self.last_turn = result
+        print(f"Turn: {result}")
+
+        if self.session_store is not None:
+            self.session_store.flush()
+        return result
+
+    async def send_message_two_calls_async(self) -> TurnResult:
+        llm = self.nl_service.client
+        speculation = None
+        if self.speculative_response:
+            speculative_promt = llm.get_context_builder().build(self.history)
+            speculation = asyncio.create_task(
+                llm.prompt_conversation_async(speculative_promt)
+            )
+
+        def discard(task: asyncio.Task):
+            task.cancel()
+            # a failed speculation is not an error of the turn
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+        try:
+            await self.data_extractor.update_data_async(self.history)
+        except BaseException:
+            if speculation is not None:
+                discard(speculation)
+            raise
+
+        llmPromt = llm.get_context_builder().build(self.history)
+        llm_calls = 2
+        if speculation is not None and llmPromt == speculative_promt:
+            self.speculation_hits += 1
+            response = await speculation
+        else:
+            if speculation is not None:
+                discard(speculation)
+                llm_calls += 1
+            response = await llm.prompt_conversation_async(llmPromt)
+        self.history.addPromt_withStrs("assistant", response)
+        return TurnResult(mode=TWO_CALLS, response=response, llm_calls=llm_calls)
@@ -1,6 +1,7 @@
 import streamlit as st
+import itertools
 import os
-from strategy import Strategy, EdgeConfigStrategy
+from strategy import SINGLE_CALL, Strategy, EdgeConfigStrategy
 import json
 from code_editor import code_editor  # type: ignore
 
@@ -17,7 +18,11 @@ target = st.radio("Target", ["Edge Config"])
 if target == "Edge Config":
     # create strategy but only in first run
     if "strategy" not in st.session_state:
-        st.session_state.strategy = EdgeConfigStrategy()
+        st.session_state.strategy = EdgeConfigStrategy(
+            session_path=os.environ.get("SESSION_STORE_PATH")
+        )
+    # the device list and the LLM clients are loaded in the background, taken over once they arrived
+    st.session_state.strategy.apply_prefetched()
 
 messages = st.session_state.strategy.history.getPromtHistory_withoutSysPromts()
 for message in messages:
@@ -32,13 +37,26 @@ if prompt := st.chat_input("Write something"):
 
     st.session_state.strategy.history.addPromt_withStrs("user", prompt)
 
-    with st.spinner("Waiting for assistant response..."):
-        # Calling the LLM and possibly change values
-        st.session_state.strategy.send_message()
-
-    with st.chat_message("assistant"):
-        st.markdown(st.session_state.strategy.history.getLatestPromtAsStr("assistant"))
-
+    # Calling the LLM and possibly change values
+    # every session runs in a script thread of its own, so the blocking send_message and
+    # send_message_stream are used, send_message_async is for servers running the sessions
+    # on one event loop
+    if st.session_state.strategy.turn_mode == SINGLE_CALL:
+        with st.chat_message("assistant"):
+            with st.spinner("Waiting for assistant response..."):
+                turn = st.session_state.strategy.send_message()
+            st.markdown(turn.response)
+            st.caption(str(turn))
+    else:
+        # the response is shown while it arrives
+        response_stream = st.session_state.strategy.send_message_stream()
+        with st.chat_message("assistant"):
+            with st.spinner("Waiting for assistant response..."):
+                first_chunk = next(response_stream, "")
+            st.write_stream(itertools.chain([first_chunk], response_stream))
+            timings = st.session_state.strategy.nl_service.client.last_stream_timings
+            if timings is not None:
+                st.caption(str(timings))
 
 with st.sidebar:
     if len(st.session_state.strategy.model.apps) > 0:
@@ -80,6 +98,15 @@ with st.sidebar:
 
     st.divider()
 
+    with st.expander("LLM Routing"):
+        if st.session_state.strategy.llm_router is not None:
+            st.text(st.session_state.strategy.llm_router.report())
+        else:
+            st.text("The LLM clients are still starting.")
+
+    with st.expander("Startup"):
+        st.text(st.session_state.strategy.startup_report())
+
     with st.expander("Your API Settings"):
         model = st.radio("Model", ["gpt-4o", "mixtral-7b-instruct"])
         st.session_state["model"] = model
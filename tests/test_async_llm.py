@@ -0,0 +1,148 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from openai.types.chat import ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
+
+from error_handling import LLMInteractionException
+from history import History
+from llm_integration.data_extraction import DataExtractor
+from llm_integration.llm_service import LLM, ResponseToolCallPair
+from llm_integration.nl_service import NLService
+from model.app_model import AppModel
+from strategy import EdgeConfigStrategy
+
+
+class StubLLM(LLM):
+    """Answers after a delay and records how many requests were in flight at once."""
+
+    def __init__(self, tool_calls=None, delay=0.05):
+        self.model_name = "stub"
+        self.tool_calls = tool_calls
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = []
+
+    async def request(self, messages):
+        self.requests.append(messages)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+
+    async def prompt_conversation_async(self, input):
+        await self.request(input)
+        return f"answer {len(self.requests)}"
+
+    async def prompt_tool_async(self, input, tools):
+        await self.request(input)
+        return ResponseToolCallPair(response=None, tool_calls=self.tool_calls)
+
+
+def build_strategy(llm):
+    strategy = EdgeConfigStrategy.__new__(EdgeConfigStrategy)
+    strategy.session_store = None
+    strategy.model = AppModel()
+    strategy.model.add_app("OPC_UA_CONNECTOR")
+    strategy.history = History()
+    strategy.history.addSystemPromt("system promt")
+    strategy.history.addConfig(strategy.model)
+    strategy.nl_service = NLService(strategy.model, llm)
+    strategy.data_extractor = DataExtractor(strategy.model, llm=llm)
+    return strategy
+
+
+def test_requests_run_concurrently():
+    llm = StubLLM(delay=0.1)
+    histories = []
+    for turn in range(5):
+        history = History()
+        history.addPromt_withStrs("user", f"question {turn}")
+        histories.append(history)
+
+    async def run():
+        return await asyncio.gather(*(llm.prompt_async(history) for history in histories))
+
+    asyncio.run(run())
+    assert llm.max_in_flight == 5
+    assert all(history.getLatestPromtAsStr("assistant") for history in histories)
+
+
+def test_speculative_response_used_without_changes():
+    llm = StubLLM()
+    strategy = build_strategy(llm)
+    strategy.history.addPromt_withStrs("user", "What does the OPC UA connector do?")
+    result = asyncio.run(strategy.send_message_async())
+
+    # extraction and response were requested at the same time, the response was kept
+    assert llm.max_in_flight == 2
+    assert len(llm.requests) == 2
+    assert result.llm_calls == 2 and strategy.last_turn is result
+    assert strategy.speculation_hits == 1
+    assert strategy.history.getLatestPromtAsStr("assistant").startswith("answer")
+
+
+def test_response_requested_again_after_changes():
+    tool_calls = [
+        ChatCompletionMessageToolCall(
+            id="call_0",
+            type="function",
+            function=Function(
+                name="OPC_UA_CONNECTOR-set_device_name",
+                arguments=json.dumps({"val": "edge-1"}),
+            ),
+        )
+    ]
+    llm = StubLLM(tool_calls=tool_calls)
+    strategy = build_strategy(llm)
+    strategy.history.addPromt_withStrs("user", "Install it on edge-1")
+    result = asyncio.run(strategy.send_message_async())
+
+    assert strategy.model.apps[0].installed_device_name == "edge-1"
+    assert strategy.speculation_hits == 0
+    # the response was requested again with the changed config
+    assert len(llm.requests) == 3
+    assert result.llm_calls == 3
+    assert "edge-1" in llm.requests[-1][-1]["content"]
+
+
+class StreamingStubLLM(LLM):
+    def __init__(self, chunks):
+        self.model_name = "stub"
+        self.chunks = chunks
+
+    def send_request_stream(self, messages):
+        for chunk in self.chunks:
+            time.sleep(0.01)
+            yield chunk
+
+
+def test_stream_records_final_message_and_timings():
+    llm = StreamingStubLLM(["The ", "connector ", "is ", "configured."])
+    history = History()
+    history.addPromt_withStrs("user", "Is it configured?")
+
+    stream = llm.prompt_stream(history)
+    assert next(stream) == "The "
+    # the history only gets the complete response
+    assert history.getLatestPromtAsStr("assistant") == ""
+    assert list(stream) == ["connector ", "is ", "configured."]
+
+    assert history.getLatestPromtAsStr("assistant") == "The connector is configured."
+    timings = llm.last_stream_timings
+    assert timings.n_chunks == 4
+    assert 0 < timings.time_to_first_token < timings.total_time
+
+
+def test_empty_stream_raises():
+    history = History()
+    history.addPromt_withStrs("user", "Hello")
+    with pytest.raises(LLMInteractionException):
+        list(StreamingStubLLM([]).prompt_stream(history))
+    assert history.getLatestPromtAsStr("assistant") == ""
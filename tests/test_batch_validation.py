@@ -0,0 +1,68 @@
+import pytest
+
+from error_handling import ValidationException
+from model.columnar import make_columnar
+from model.iem_base_model import (
+    AbstractAppConfig,
+    IPField,
+    ListField,
+    NestedField,
+    PortField,
+    _cached_check,
+)
+
+
+class ServerConfig(NestedField):
+    ip: IPField = IPField(variable_name="ip", description="Server address", value=None)
+    port: PortField = PortField(variable_name="port", description="Server port", value=None)
+
+
+class ServerListConfig(AbstractAppConfig):
+    servers: ListField = ListField(
+        variable_name="servers",
+        description="Servers",
+        blueprint=ServerConfig(variable_name="server", description="A server"),
+    )
+
+
+IPS = ["192.168.0.1", "not an ip", "::1", "192.168.0.1", "999.1.1.1"]
+
+
+def build_servers(columnar=False):
+    config = ServerListConfig()
+    config.servers.fill_from_json([{"ip": "10.0.0.1"}, {"ip": "10.0.0.2"}])
+    for _ in range(len(IPS) - 2):
+        config.servers.create_item()
+    if columnar:
+        make_columnar(config.servers)
+    return config.servers
+
+
+def test_validate_column_collects_all_errors():
+    servers = build_servers()
+    errors = servers.validate_column("ip", IPS)
+    assert sorted(errors) == [1, 4]
+    assert servers.validate_column("port", [1, 70000, "80", None]).keys() == {1, 2}
+    assert servers.validate_column("ip") == {}
+
+
+def test_repeated_values_are_memoized():
+    servers = build_servers()
+    _cached_check.cache_clear()
+    servers.validate_column("ip", ["172.16.0.1"] * 50)
+    servers.items[0].ip.set_value("172.16.0.1")
+    assert _cached_check.cache_info().misses <= 2
+
+
+@pytest.mark.parametrize("columnar", [False, True])
+def test_set_column(columnar):
+    servers = build_servers(columnar)
+    with pytest.raises(ValidationException) as e:
+        servers.set_column("ip", IPS)
+    assert "Item 1" in str(e.value) and "Item 4" in str(e.value)
+    assert servers.column_values("ip")[:2] == ["10.0.0.1", "10.0.0.2"]
+
+    servers.to_json()
+    servers.set_column("ip", ["10.0.0.3"] * len(IPS))
+    assert servers.column_values("ip") == ["10.0.0.3"] * len(IPS)
+    assert servers.to_json()["value"][0]["ip"] == "10.0.0.3"
@@ -0,0 +1,22 @@
+import pytest
+
+from caching import LRUCache
+
+
+def test_lru_eviction_and_stats():
+    cache = LRUCache(maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+
+    assert "b" not in cache
+    assert cache.get("b") is None
+    assert cache.get_or_create("c", lambda: pytest.fail("cached value recreated")) == 3
+    assert len(cache) == 2
+    assert (cache.stats.hits, cache.stats.misses, cache.stats.evictions) == (2, 1, 1)
+
+
+def test_invalid_size():
+    with pytest.raises(ValueError):
+        LRUCache(maxsize=0)
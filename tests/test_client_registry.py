@@ -0,0 +1,45 @@
+import asyncio
+
+from llm_integration.client_registry import get_async_client, get_client
+from llm_integration.llm_service import GPT4o, Llama3, Qwen25
+
+
+def test_clients_shared_by_settings(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "key a")
+    assert get_client() is get_client(api_key="key a")
+    assert GPT4o().client is GPT4o().client
+    # the same server, the connections are reused by all models
+    assert Qwen25().client is Llama3().client
+    assert Qwen25().client is not GPT4o().client
+
+    monkeypatch.setenv("OPENAI_API_KEY", "key b")
+    assert GPT4o().client is not get_client(api_key="key a")
+
+
+def test_async_clients_per_event_loop(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "key a")
+    llm = GPT4o()
+
+    async def clients():
+        return llm.get_async_client(), get_async_client(api_key="key a")
+
+    first, same = asyncio.run(clients())
+    second, _ = asyncio.run(clients())
+    assert first is same
+    assert first is not second
+    assert str(first.base_url) == str(llm.client.base_url)
+
+
+def test_async_client_keeps_timeout_of_client(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "key a")
+    llm = GPT4o()
+    llm.client = llm.client.with_options(timeout=3.0, max_retries=0)
+
+    async def clients():
+        return llm.get_async_client(), get_async_client(api_key="key a")
+
+    bounded, shared = asyncio.run(clients())
+    assert bounded.timeout == 3.0 and bounded.max_retries == 0
+    assert shared.max_retries != 0
+    # the copy uses the connections of the shared client
+    assert bounded._client is shared._client
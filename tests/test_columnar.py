@@ -0,0 +1,70 @@
+import pytest
+
+from error_handling import ValidationException
+from model.columnar import ColumnarListField, make_columnar
+from model.iem_model import DocumentationUAConnectorConfig, OPCUATagConfig, StringField
+from .mock_data import ContactInformation
+
+TAGS = [
+    {"name": "pressure", "acquisitionCycle": 1000, "accessMode": "rw"},
+    {"name": "flow", "dataType": "Real"},
+]
+
+
+def build_configs():
+    objects = DocumentationUAConnectorConfig()
+    objects.datapoints.items[0].tags.fill_from_json(TAGS)
+    columnar = DocumentationUAConnectorConfig()
+    columnar.datapoints.items[0].tags.fill_from_json(TAGS)
+    make_columnar(columnar.datapoints.items[0].tags)
+    return objects, columnar
+
+
+def test_same_serialization_as_objects():
+    objects, columnar = build_configs()
+    assert isinstance(columnar.datapoints.items[0].tags, ColumnarListField)
+    assert columnar.to_json() == objects.to_json()
+    assert columnar.describe() == objects.describe()
+
+
+def test_item_views():
+    _, columnar = build_configs()
+    tags = columnar.datapoints.items[0].tags
+    tag = tags.items[1]
+
+    assert isinstance(tag, OPCUATagConfig)
+    assert isinstance(tag.name, StringField)
+    assert tag.name.value == "flow"
+
+    tag.name.set_value("level")
+    tags.create_item()
+    tags.items[2].accessMode.set_value("Read")
+
+    json = columnar.to_json()["datapoints"][0]["tags"]
+    assert json[1]["name"] == "level"
+    assert json[2]["accessMode"] == "r"
+    with pytest.raises(ValidationException):
+        tag.accessMode.set_value("Write only")
+
+
+def test_tools_resolvable():
+    _, columnar = build_configs()
+    for pair in columnar.generate_tool_functions():
+        assert columnar.resolve_tool(pair.name) is not None
+
+    columnar.resolve_tool("0-OPCUAServer_Datapoint-1-tag-name-set_value")("level")
+    assert columnar.get_field("datapoints.0.tags.1.name").value == "level"
+
+
+def test_needs_flat_blueprint():
+    with pytest.raises(ValueError):
+        ColumnarListField(
+            variable_name="datapoints",
+            description="",
+            blueprint=DocumentationUAConnectorConfig().datapoints.blueprint,
+        )
+    ColumnarListField(
+        variable_name="contacts",
+        description="",
+        blueprint=ContactInformation(variable_name="contact", description=""),
+    )
@@ -0,0 +1,134 @@
+from history import History
+from model.app_model import AppModel
+from llm_integration.context_builder import (
+    ContextBuilder,
+    OMITTED_CONFIG,
+    Tokenizer,
+    WordTokenizer,
+)
+
+
+class ConfigStub:
+    def __init__(self, text):
+        self.text = text
+        self.version = text
+
+    def generate_prompt_string(self):
+        return self.text
+
+    def snapshot(self):
+        return self
+
+
+def build_history(n_turns, config_size=10):
+    history = History()
+    history.deltaConfigs = False
+    history.addSystemPromt("system promt")
+    history.addConfig(ConfigStub("config 0 " + "x" * config_size))
+    for turn in range(1, n_turns + 1):
+        history.addPromt_withStrs("user", f"user promt {turn}")
+        history.addConfig(ConfigStub(f"config {turn} " + "x" * config_size))
+        if turn < n_turns:
+            history.addPromt_withStrs("assistant", f"assistant answer {turn}")
+    return history
+
+
+def test_same_messages_as_history_within_budget():
+    history = build_history(5)
+    builder = ContextBuilder(budget=10000, n_oldAnswerResponsePairs=2)
+    assert builder.build(history) == history.genPromtForLLM(n_oldAnswerResponsePairs=2)
+    assert builder.last_report.omitted_turns == 0
+
+
+def test_old_config_dumps_dropped_first():
+    history = build_history(3, config_size=400)
+    full = ContextBuilder(budget=100000).build(history)
+    budget = ContextBuilder(budget=100000).total_tokens(full) - 50
+    builder = ContextBuilder(budget=budget)
+
+    messages = builder.build(history)
+    report = builder.last_report
+
+    assert report.within_budget
+    assert report.omitted_turns == 0
+    assert report.omitted_config_promts >= 1
+    assert {"role": "system", "content": OMITTED_CONFIG} in messages
+    assert messages[-1] == full[-1]
+
+
+def test_older_turns_summarized_and_config_truncated():
+    history = build_history(10, config_size=4000)
+    builder = ContextBuilder(budget=600, n_oldAnswerResponsePairs=5)
+
+    messages = builder.build(history)
+    report = builder.last_report
+
+    assert report.within_budget
+    assert report.config_truncated
+    assert messages[-1]["content"].endswith("(truncated)")
+    assert messages[-2]["content"] == "user promt 10"
+    assert report.omitted_turns + report.included_turns == 6
+
+
+def test_pluggable_tokenizer():
+    class CountingTokenizer(Tokenizer):
+        calls = 0
+
+        def count(self, text):
+            CountingTokenizer.calls += 1
+            return len(text.split())
+
+    history = build_history(3)
+    builder = ContextBuilder(budget=1000, tokenizer=CountingTokenizer())
+    builder.build(history)
+    assert CountingTokenizer.calls > 0
+    assert WordTokenizer().count("{'value': 'opc.tcp://10.0.0.1'}") > 5
+
+
+def test_delta_configs_sent_with_base():
+    model = AppModel()
+    model.add_app("OPC_UA_CONNECTOR")
+    history = History()
+    history.addSystemPromt("system promt")
+    history.addConfig(model)
+    name = model.apps[0].config.datapoints.items[0].name
+    for turn in range(1, 4):
+        history.addPromt_withStrs("user", f"user promt {turn}")
+        name.set_value(f"plc {turn}")
+        history.addConfig(model)
+        if turn < 3:
+            history.addPromt_withStrs("assistant", f"assistant answer {turn}")
+
+    builder = ContextBuilder(budget=100000, n_oldAnswerResponsePairs=1)
+    assert builder.build(history) == history.genPromtForLLM(n_oldAnswerResponsePairs=1)
+
+    # only the base and the changes up to the current config if the older changes do not fit
+    messages = builder.build(history)
+    required = [messages[0], messages[1], messages[-2], messages[-1]]
+    older_turn = [messages[2], messages[4]]
+    builder.budget = builder.total_tokens(required) + builder.total_tokens(older_turn)
+    messages = builder.build(history)
+    assert messages == required[:2] + older_turn + required[2:3] + [
+        history.genConfigDeltaPromt(history.baseConfig, history.configCursor)
+    ]
+    assert builder.last_report.omitted_config_promts == 1
+    assert '"plc 1" -> "plc 3"' in messages[-1]["content"]
+
+
+def test_truncate_clamps_budget():
+    builder = ContextBuilder(budget=100)
+    message = {"role": "system", "content": "x" * 400}
+    assert builder.truncate(message, 0) is None
+    assert builder.truncate(message, -10) is None
+    assert builder.message_tokens(builder.truncate(message, 20)) <= 20
+
+
+def test_config_left_out_without_budget():
+    history = build_history(2, config_size=400)
+    builder = ContextBuilder(budget=1)
+
+    messages = builder.build(history)
+
+    assert builder.last_report.config_truncated
+    assert builder.last_report.config_tokens == 0
+    assert [m["content"] for m in messages] == ["system promt", "user promt 2"]
@@ -0,0 +1,68 @@
+import pytest
+
+from model.iem_model import DocumentationUAConnectorConfig, DocumentationDatabusConfig
+from .mock_data import UserData
+
+
+@pytest.mark.parametrize(
+    "config_type", [UserData, DocumentationUAConnectorConfig, DocumentationDatabusConfig]
+)
+def test_all_tools_resolvable(config_type):
+    dataObj = config_type()
+    for pair in dataObj.generate_tool_functions():
+        assert dataObj.resolve_tool(pair.name) == pair.fct
+
+
+def test_get_field_by_path():
+    dataObj = DocumentationUAConnectorConfig()
+    tag = dataObj.datapoints.items[0].tags.items[0]
+    assert dataObj.get_field("datapoints.0.tags.0.name") is tag.name
+    assert tag.name.path() == "datapoints.0.tags.0.name"
+
+
+def test_index_extended_by_create_item():
+    dataObj = DocumentationUAConnectorConfig()
+    dataObj.field_index()
+    dataObj.datapoints.items[0].tags.create_item()
+
+    new_tag = dataObj.datapoints.items[0].tags.items[1]
+    assert dataObj.get_field("datapoints.0.tags.1.address") is new_tag.address
+    assert (
+        dataObj.resolve_tool("0-OPCUAServer_Datapoint-1-tag-address-set_value")
+        == new_tag.address.set_value
+    )
+
+
+def test_resolve_inactive_setter():
+    dataObj = UserData()
+    dataObj.name.deactivate_setter()
+    assert dataObj.resolve_tool("name-set_value") is None
+    assert dataObj.resolve_tool("unknown-set_value") is None
+
+
+def test_fill_field_from_json():
+    dataObj = DocumentationUAConnectorConfig()
+    dataObj.fill_field_from_json("datapoints.0.tags", [{"name": "a"}, {"name": "b"}])
+    assert dataObj.get_field("datapoints.0.tags.1.name").value == "b"
+
+
+def test_index_updated_by_replace_item():
+    dataObj = DocumentationUAConnectorConfig()
+    datapoints = dataObj.datapoints
+    datapoints.items[0].tags.create_item()
+    datapoints.items[0].tags.create_item()
+    dataObj.field_index()
+    old_tag = datapoints.items[0].tags.items[2]
+    new_datapoint = datapoints.new_item()
+    datapoints.replace_item(0, new_datapoint)
+
+    # the new datapoint has a single tag, the tags of the old one are gone
+    with pytest.raises(KeyError):
+        dataObj.get_field("datapoints.0.tags.2.name")
+    assert dataObj.resolve_tool("0-OPCUAServer_Datapoint-2-tag-name-set_value") is None
+    assert dataObj.get_field("datapoints.0.tags.0.name") is new_datapoint.tags.items[0].name
+    assert (
+        dataObj.resolve_tool("0-OPCUAServer_Datapoint-0-tag-name-set_value")
+        == new_datapoint.tags.items[0].name.set_value
+    )
+    assert all(field is not old_tag.name for field in dataObj.field_index().values())
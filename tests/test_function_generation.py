@@ -1,6 +1,15 @@
+import json
+
 import pytest
+from openai.types.chat import ChatCompletionMessageToolCall
+
+from error_handling import ValidationException
+from history import History
+from llm_integration.llm_service import ResponseToolCallPair
+from model.app_model import AppModel
 
 from model.iem_model import AbstractAppConfig, StringField, NestedField, ListField
+from model.iem_model import DocumentationUAConnectorConfig
 from llm_integration.data_extraction import DataExtractor
 from .mock_data import AuthenticationData, ContactInformation, ContactList, UserData
 
@@ -25,3 +34,234 @@ def test_hidden_setter():
     extractor._refresh_tools()
 
     assert len(extractor.tool_descriptions) == 3
+
+
+def test_tools_cached_without_structural_change():
+    dataObj = UserData()
+    extractor = DataExtractor(dataObj)
+    function_lib = extractor.function_lib
+
+    dataObj.name.set_value("Carl")
+    extractor._refresh_tools()
+
+    assert extractor.function_lib is function_lib
+
+
+def test_nested_create_item_invalidates_tools():
+    dataObj = DocumentationUAConnectorConfig()
+    extractor = DataExtractor(dataObj)
+    n_tools = len(extractor.tool_descriptions)
+
+    dataObj.datapoints.items[0].tags.create_item()
+    extractor._refresh_tools()
+
+    assert len(extractor.tool_descriptions) > n_tools
+    assert "0-OPCUAServer_Datapoint-1-tag-name-set_value" in extractor.function_lib
+
+
+def test_set_invisible_invalidates_tools():
+    dataObj = UserData()
+    extractor = DataExtractor(dataObj)
+
+    dataObj.name.set_invisible()
+    extractor._refresh_tools()
+
+    assert len(extractor.tool_descriptions) == 3
+
+
+def test_reactivate_nested_setter():
+    dataObj = DocumentationUAConnectorConfig()
+    n_tools = len(dataObj.generate_tool_functions())
+    datapoint = dataObj.datapoints.items[0]
+
+    datapoint.deactivate_setter()
+    assert len(dataObj.generate_tool_functions()) < n_tools
+
+    datapoint.activate_setter()
+    assert len(dataObj.generate_tool_functions()) == n_tools
+
+
+def test_child_field_layout():
+    assert UserData.child_field_layout == ("contacts", "name")
+    assert ContactList.child_field_layout == ()
+
+
+def test_collapsed_tools_do_not_grow_with_items():
+    dataObj = DocumentationUAConnectorConfig()
+    dataObj.set_collapsed_tools()
+    names = [pair.name for pair in dataObj.generate_tool_functions()]
+
+    for _ in range(3):
+        dataObj.datapoints.create_item()
+        dataObj.datapoints.items[0].tags.create_item()
+
+    assert [pair.name for pair in dataObj.generate_tool_functions()] == names
+    assert "datapoints-OPCUAServer_Datapoint-tags-tag-name-set_value" in names
+    assert len(names) < len(DocumentationUAConnectorConfig().generate_tool_functions()) + 2
+
+
+def test_collapsed_tools_dispatch_to_item():
+    dataObj = DocumentationUAConnectorConfig()
+    dataObj.datapoints.create_item()
+    extractor = DataExtractor(dataObj, collapse_list_tools=True)
+    lib = extractor.function_lib
+
+    description = next(
+        tool["function"]
+        for tool in extractor.tool_descriptions
+        if tool["function"]["name"] == "datapoints-OPCUAServer_Datapoint-tags-tag-name-set_value"
+    )
+    assert description["parameters"]["required"][:2] == ["datapoints_index", "tags_index"]
+    assert "val" in description["parameters"]["properties"]
+
+    lib["datapoints-OPCUAServer_Datapoint-tags-create_item"](datapoints_index=1)
+    lib["datapoints-OPCUAServer_Datapoint-tags-tag-name-set_value"](
+        datapoints_index=1, tags_index=1, val="pressure"
+    )
+    assert dataObj.datapoints.items[1].tags.items[1].name.value == "pressure"
+    assert dataObj.datapoints.items[0].tags.items[0].name.value is None
+
+    with pytest.raises(ValidationException):
+        lib["datapoints-OPCUAServer_Datapoint-name-set_value"](
+            datapoints_index=2, val="server"
+        )
+
+
+def test_collapsed_tools_in_update_data():
+    model = AppModel()
+    model.set_collapsed_tools()
+    model.add_app("OPC_UA_CONNECTOR")
+
+    calls = [
+        ("datapoints-create_item", {}),
+        ("datapoints-OPCUAServer_Datapoint-name-set_value", {"datapoints_index": 1, "val": "plc"}),
+    ]
+    tool_calls = [
+        ChatCompletionMessageToolCall(
+            id=str(idx),
+            type="function",
+            function={"name": name, "arguments": json.dumps(args)},
+        )
+        for idx, (name, args) in enumerate(calls)
+    ]
+
+    class StubLLM:
+        def prompt_tool(self, input, tools):
+            return ResponseToolCallPair(response=None, tool_calls=tool_calls)
+
+    history = History()
+    history.addPromt_withStrs("user", "Add a second server called plc")
+    DataExtractor(model, llm=StubLLM()).update_data(history)
+
+    assert model.get_field("OPC_UA_CONNECTOR.datapoints.1.name").value == "plc"
+
+
+def make_tool_calls(calls):
+    return [
+        ChatCompletionMessageToolCall(
+            id=str(idx),
+            type="function",
+            function={
+                "name": name,
+                "arguments": args if isinstance(args, str) else json.dumps(args),
+            },
+        )
+        for idx, (name, args) in enumerate(calls)
+    ]
+
+
+def test_tool_calls_rolled_back_on_unexpected_error():
+    dataObj = UserData()
+    extractor = DataExtractor(dataObj, llm=object())
+
+    def broken(val):
+        raise RuntimeError("connection lost")
+
+    extractor.function_lib["0-Contact_Information-address-set_value"] = broken
+    history = History()
+    extractor.apply_response(
+        history,
+        ResponseToolCallPair(
+            response=None,
+            tool_calls=make_tool_calls(
+                [
+                    ("name-set_value", {"val": "Carl"}),
+                    ("contacts-create_item", {}),
+                    ("0-Contact_Information-address-set_value", {"val": "Street 1"}),
+                ]
+            ),
+        ),
+    )
+
+    assert dataObj.name.value is None
+    assert len(dataObj.contacts.items) == 1
+    assert "None of the changes" in str(history.getLatestPromtAsDict("system")["content"])
+
+
+def test_tool_call_arguments_checked_before_applying():
+    dataObj = UserData()
+    extractor = DataExtractor(dataObj, llm=object())
+    history = History()
+    extractor.apply_response(
+        history,
+        ResponseToolCallPair(
+            response=None,
+            tool_calls=make_tool_calls(
+                [
+                    ("name-set_value", "{not json"),
+                    ("0-Contact_Information-address-set_value", {"value": "Street 1"}),
+                    ("0-Contact_Information-phone_number-set_value", {"val": "0123"}),
+                ]
+            ),
+        ),
+    )
+
+    assert dataObj.name.value is None
+    assert dataObj.contacts.items[0].address.value is None
+    assert dataObj.contacts.items[0].phone_number.value == "0123"
+    validation = str(history.getLatestPromtAsDict("system")["content"])
+    assert "no valid JSON" in validation and "no parameters value" in validation
+
+
+def test_tool_call_missing_required_parameter_reported_alone():
+    dataObj = UserData()
+    extractor = DataExtractor(dataObj, llm=object())
+    history = History()
+    validation = extractor.apply_response(
+        history,
+        ResponseToolCallPair(
+            response=None,
+            tool_calls=make_tool_calls(
+                [
+                    ("0-Contact_Information-address-set_value", {}),
+                    ("name-set_value", {"val": "Carl"}),
+                ]
+            ),
+        ),
+    )
+
+    assert dataObj.name.value == "Carl"
+    assert dataObj.contacts.items[0].address.value is None
+    assert len(validation) == 1 and "missing the parameters val" in validation[0]
+    content = history.getLatestPromtAsDict("system")["content"]
+    assert isinstance(content, str) and "missing the parameters val" in content
+
+
+def test_batched_setters_mark_parents_dirty_once():
+    dataObj = UserData()
+    extractor = DataExtractor(dataObj, llm=object())
+    contact = dataObj.contacts.items[0]
+    versions = (dataObj.content_version(), dataObj.contacts.content_version())
+
+    extractor.apply_tool_calls(
+        make_tool_calls(
+            [
+                ("0-Contact_Information-phone_number-set_value", {"val": "0123"}),
+                ("0-Contact_Information-address-set_value", {"val": "Street 1"}),
+            ]
+        )
+    )
+
+    assert contact.phone_number.value == "0123" and contact.address.value == "Street 1"
+    assert dataObj.content_version() == versions[0] + 1
+    assert dataObj.contacts.content_version() == versions[1] + 1
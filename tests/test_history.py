@@ -0,0 +1,209 @@
+from caching import LRUCache
+from history import History
+from model.app_model import App, AppModel
+from model.iem_model import DocumentationUAConnectorConfig
+
+
+class ConfigStub:
+    def __init__(self, name):
+        self.name = name
+        self.version = name
+
+    def generate_prompt_string(self):
+        return self.name
+
+    def snapshot(self):
+        return self
+
+
+def build_history(n_turns):
+    history = History()
+    history.deltaConfigs = False
+    history.addSystemPromt("system promt")
+    history.addConfig(ConfigStub("config 0"))
+    for turn in range(1, n_turns + 1):
+        history.addPromt_withStrs("user", f"user {turn}")
+        history.addPromt_withStrs("system", f"validation {turn}")
+        history.addConfig(ConfigStub(f"config {turn}"))
+        if turn < n_turns:
+            history.addPromt_withStrs("assistant", f"assistant {turn}")
+    return history
+
+
+def contents(promts):
+    return [promt["content"].replace("The current configuration is: ", "") for promt in promts]
+
+
+def test_latest_pair_with_configs_of_their_turns():
+    history = build_history(3)
+    assert contents(history.genPromtForLLM(n_oldAnswerResponsePairs=1)) == [
+        "system promt",
+        "config 1",
+        "user 2",
+        "validation 2",
+        "config 2",
+        "assistant 2",
+        "user 3",
+        "validation 3",
+        "config 3",
+    ]
+
+
+def test_more_pairs_than_turns():
+    history = build_history(2)
+    assert contents(history.genPromtForLLM(n_oldAnswerResponsePairs=5)) == [
+        "system promt",
+        "config 0",
+        "user 1",
+        "validation 1",
+        "config 1",
+        "assistant 1",
+        "user 2",
+        "validation 2",
+        "config 2",
+    ]
+
+
+def test_turns_are_indexed():
+    history = build_history(1000)
+    assert len(history.turns) == 1000
+    assert history.getTurn(500).messages[0]["content"] == "user 501"
+    assert [turn.index for turn in history.getLatestTurns(3)] == [997, 998, 999]
+
+
+def test_config_promts_rendered_once_per_version():
+    model = AppModel()
+    model.add_app("OPC_UA_CONNECTOR")
+    history = History()
+    history.deltaConfigs = False
+    history.addConfig(model)
+    for turn in range(3):
+        history.addPromt_withStrs("user", f"user {turn}")
+        if turn == 1:
+            model.apps[0].config.dbservicename.set_value("databus")
+        history.addConfig(model)
+        history.genPromtForLLM(n_oldAnswerResponsePairs=1)
+        history.addPromt_withStrs("assistant", f"assistant {turn}")
+
+    # the config only changed once, so two distinct states were rendered
+    stats = history.configPromtCache.stats
+    assert stats.misses == 2
+    assert stats.hits > stats.misses
+
+
+def test_version_changes_with_every_mutation():
+    model = AppModel()
+    versions = [model.version()]
+    model.add_app("OPC_UA_CONNECTOR")
+    versions.append(model.version())
+    config = model.apps[0].config
+    config.datapoints.items[0].tags.items[0].name.set_value("pressure")
+    versions.append(model.version())
+    model.apps[0].set_device_name("edge-1")
+    versions.append(model.version())
+    model.restore_snapshot(AppModel().snapshot())
+    versions.append(model.version())
+
+    assert versions == sorted(set(versions))
+
+
+def build_model_session(n_turns):
+    model = AppModel()
+    model.add_app("OPC_UA_CONNECTOR")
+    history = History()
+    history.addSystemPromt("system promt")
+    history.addConfig(model)
+    tags = model.apps[0].config.datapoints.items[0].tags
+    for turn in range(n_turns):
+        history.addPromt_withStrs("user", f"user {turn}")
+        if turn > 0:
+            tags.create_item()
+        tags.items[turn].name.set_value(f"tag {turn}")
+        history.addConfig(model)
+        history.addPromt_withStrs("assistant", f"assistant {turn}")
+    history.addPromt_withStrs("user", "next")
+    return model, history
+
+
+def test_delta_config_promts():
+    model, history = build_model_session(3)
+    promts = history.genPromtForLLM(n_oldAnswerResponsePairs=1)
+    config_promts = [promt["content"] for promt in promts if promt["role"] == "system"][1:]
+
+    # the base is the only full config, the changes follow in the order of the turns
+    assert config_promts[0].startswith("The current configuration is: ")
+    assert all(promt.startswith("Changes to the configuration") for promt in config_promts[1:])
+    assert "datapoints.0.tags.2: added" in config_promts[-1]
+    assert 'datapoints.0.tags.2.name: null -> "tag 2"' in config_promts[-1]
+    assert sum(len(promt) for promt in config_promts[1:]) < len(config_promts[0])
+
+
+def test_full_config_periodically_and_on_request():
+    model, history = build_model_session(2)
+    history.fullConfigInterval = 2
+    history.genPromtForLLM()
+    base = history.baseConfig
+    history.addPromt_withStrs("user", "again")
+    history.genPromtForLLM()
+    assert history.baseConfig == base
+
+    history.addPromt_withStrs("user", "and again")
+    history.genPromtForLLM()
+    assert history.baseConfig > base
+
+    history.requestFullConfig()
+    model.apps[0].set_device_name("edge-1")
+    history.addConfig(model)
+    promts = history.genPromtForLLM()
+    assert history.baseConfigTurn == len(history.turns)
+    assert promts[1] == history.genConfigPromt(history.baseConfig)
+    assert 'OPC_UA_CONNECTOR.installed_device_name: null -> "edge-1"' in promts[-1]["content"]
+
+
+def test_delta_config_promt_shows_enum_values():
+    model, history = build_model_session(1)
+    model.apps[0].config.datapoints.items[0].tags.items[0].accessMode.set_value("Read & Write")
+    history.addConfig(model)
+    promts = history.genPromtForLLM(n_oldAnswerResponsePairs=1)
+
+    # like in the full config promt, the mapped value of the enum is shown
+    assert "'value': 'rw'" in history.genConfigPromt(len(history.configHistory) - 1)["content"]
+    assert promts[-1]["content"].startswith("Changes to the configuration")
+    assert 'datapoints.0.tags.0.accessMode: null -> "rw"' in promts[-1]["content"]
+
+
+def test_delta_config_promt_describes_added_apps():
+    model, history = build_model_session(3)
+    model.apps[0].set_device_name("edge-1")
+    model.apps.append(
+        App(
+            name="SECOND_CONNECTOR",
+            id="2",
+            description="second connector",
+            config=DocumentationUAConnectorConfig(),
+        )
+    )
+    history.addConfig(model)
+    old_index, new_index = len(history.configHistory) - 2, len(history.configHistory) - 1
+    delta = history.genConfigDeltaPromt(old_index, new_index)["content"]
+
+    assert delta.startswith("Changes to the configuration")
+    assert 'OPC_UA_CONNECTOR.installed_device_name: null -> "edge-1"' in delta
+    # the added app is described like in the full config promt, not as added values
+    added = history.getConfig(new_index).apps[1]
+    assert delta.endswith("Added apps: " + added.generate_prompt_string())
+    assert "SECOND_CONNECTOR." not in delta
+
+
+def test_config_promts_rendered_only_when_sent():
+    model, history = build_model_session(3)
+    # taking the snapshots rendered nothing
+    assert len(history.configPromtCache) == 0
+
+    history.configPromtCache = LRUCache(maxsize=1)
+    history.genConfigPromt(0)
+    history.genConfigPromt(1)
+    history.genConfigPromt(0)
+    # the first promt was evicted and is rendered again
+    assert history.configPromtCache.stats.misses == 3
+    assert len(history.configPromtCache) == 1
@@ -1,6 +1,7 @@
 import pytest
 
 from model.iem_model import AbstractAppConfig, StringField, NestedField, ListField
+from model.iem_model import DocumentationUAConnectorConfig
 from .mock_data import UserData
 
 
@@ -46,3 +47,32 @@ def test_to_json_hidden():
         "contacts": [{'address': None, 'phone_number': None}],
         "name": None,
     }
+
+
+def test_describe_after_set_value():
+    dataObj = UserData()
+    dataObj.describe()
+    dataObj.name.set_value("Carl")
+    assert dataObj.describe()["name"]["value"] == "Carl"
+    assert dataObj.to_json()["name"] == "Carl"
+
+
+def test_serialization_reuses_unchanged_subtrees():
+    dataObj = DocumentationUAConnectorConfig()
+    dataObj.datapoints.create_item()
+    first_datapoint = dataObj.to_json()["datapoints"][0]
+    second_datapoint = dataObj.to_json()["datapoints"][1]
+
+    dataObj.datapoints.items[1].tags.items[0].name.set_value("temperature")
+    json = dataObj.to_json()
+
+    assert json["datapoints"][0] is first_datapoint
+    assert json["datapoints"][1] is not second_datapoint
+    assert json["datapoints"][1]["tags"][0]["name"] == "temperature"
+
+
+def test_describe_after_create_item():
+    dataObj = UserData()
+    assert len(dataObj.describe()["contacts"]["items"]) == 1
+    dataObj.contacts.create_item()
+    assert len(dataObj.describe()["contacts"]["items"]) == 2
@@ -1,6 +1,7 @@
 import pytest
 
 from model.iem_model import AbstractAppConfig, StringField, NestedField, ListField
+from model.iem_model import DocumentationUAConnectorConfig
 from .mock_data import UserData, IcreamChoice
 
 
@@ -26,3 +27,25 @@ def test_load_enum():
     choice = IcreamChoice()
     choice.fill_from_json("Banana")
     assert choice.enum_key == "B"
+
+
+def test_created_items_share_metadata():
+    datapoint = DocumentationUAConnectorConfig().datapoints.items[0]
+    datapoint.tags.create_item()
+    first, second = datapoint.tags.items
+
+    assert first.acquisitionCycle.enum_mapping is second.acquisitionCycle.enum_mapping
+    assert first.name is not second.name
+
+    second.name.set_value("temperature")
+    assert first.name.value is None
+    assert second.name.parent() is second
+    assert second.parent() is datapoint.tags
+
+
+def test_created_lists_share_blueprint():
+    connector = DocumentationUAConnectorConfig()
+    connector.datapoints.create_item()
+    first, second = connector.datapoints.items
+    assert first.tags.blueprint is second.tags.blueprint
+    assert first.tags.items[0] is not second.tags.items[0]
@@ -0,0 +1,176 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from error_handling import LLMDeadlineException, LLMInteractionException
+from llm_integration.llm_service import LLM
+from llm_integration.resilience import ResilientLLM, RetryPolicy
+
+NO_DELAY = RetryPolicy(max_attempts=3, base_delay=0.0)
+
+
+class Client:
+    """Records the options of the clients derived from it."""
+
+    def __init__(self, options=None):
+        self.options = options or {}
+        self.derived = []
+
+    def with_options(self, **options):
+        client = Client(options)
+        self.derived.append(client)
+        return client
+
+
+class Backend(LLM):
+    """Answers after delay seconds, fails the first n_failures calls."""
+
+    def __init__(self, name, delay=0.0, n_failures=0, context_budget=8000):
+        self.client = Client()
+        self.system_prompt = ""
+        self.model_name = name
+        self.delay = delay
+        self.n_failures = n_failures
+        self.context_budget = context_budget
+        # clients of the calls, shared with the copies of the backend the calls run on
+        self.calls = []
+
+    @property
+    def n_calls(self):
+        return len(self.calls)
+
+    def prompt_conversation(self, input):
+        self.calls.append(self.client)
+        time.sleep(self.delay)
+        if self.n_calls <= self.n_failures:
+            raise LLMInteractionException(f"{self.model_name} failed")
+        return f"answer of {self.model_name}"
+
+    async def prompt_conversation_async(self, input):
+        self.calls.append(self.client)
+        # on the event loop, not in a thread per request
+        assert threading.current_thread() is threading.main_thread()
+        await asyncio.sleep(self.delay)
+        if self.n_calls <= self.n_failures:
+            raise LLMInteractionException(f"{self.model_name} failed")
+        return f"answer of {self.model_name}"
+
+    def send_request_stream(self, messages):
+        self.calls.append(self.client)
+        if self.n_calls <= self.n_failures:
+            raise LLMInteractionException(f"{self.model_name} failed")
+        time.sleep(self.delay)
+        yield "answer "
+        yield f"of {self.model_name}"
+
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+def test_falls_back_in_chain_order():
+    local, hosted = Backend("local", n_failures=1), Backend("hosted")
+    llm = ResilientLLM([local, hosted], retry=NO_DELAY)
+    assert llm.prompt_conversation(MESSAGES) == "answer of hosted"
+    assert llm.last_backend is hosted
+    assert llm.errors == {"local": 1}
+    assert llm.context_budget == 8000
+
+
+def test_retries_whole_chain():
+    backend = Backend("flaky", n_failures=2)
+    llm = ResilientLLM([backend], retry=NO_DELAY)
+    assert llm.prompt_conversation(MESSAGES) == "answer of flaky"
+    assert backend.n_calls == 3
+
+    broken = ResilientLLM([Backend("broken", n_failures=10)], retry=NO_DELAY)
+    with pytest.raises(LLMInteractionException):
+        broken.prompt_conversation(MESSAGES)
+
+
+def test_deadline_bounds_stalled_backend():
+    llm = ResilientLLM([Backend("stalled", delay=2.0)], deadline=0.2, retry=NO_DELAY)
+    start = time.monotonic()
+    with pytest.raises(LLMDeadlineException):
+        llm.prompt_conversation(MESSAGES)
+    assert time.monotonic() - start < 1.0
+
+
+def test_attempt_bounded_by_deadline():
+    backend = Backend("hosted")
+    llm = ResilientLLM([backend], deadline=5.0, retry=NO_DELAY)
+    assert llm.prompt_conversation(MESSAGES) == "answer of hosted"
+    (client,) = backend.client.derived
+    assert client.options["max_retries"] == 0
+    assert 4.0 < client.options["timeout"] <= 5.0
+    # the attempt ran on a copy, the backend keeps its client
+    assert backend.calls == [client]
+    assert backend.client is not client
+
+
+def test_hedged_request_keeps_first_reply():
+    slow, fast = Backend("slow", delay=1.0), Backend("fast", delay=0.05)
+    llm = ResilientLLM([slow, fast], hedge_after=0.1, retry=NO_DELAY)
+    start = time.monotonic()
+    assert llm.prompt_conversation(MESSAGES) == "answer of fast"
+    assert time.monotonic() - start < 0.8
+    assert slow.n_calls == fast.n_calls == 1
+
+
+def test_async_falls_back_and_retries():
+    local, hosted = Backend("local", n_failures=1), Backend("hosted")
+    llm = ResilientLLM([local, hosted], retry=NO_DELAY)
+    assert asyncio.run(llm.prompt_conversation_async(MESSAGES)) == "answer of hosted"
+    assert llm.errors == {"local": 1}
+
+    flaky = Backend("flaky", n_failures=2)
+    llm = ResilientLLM([flaky], retry=NO_DELAY)
+    assert asyncio.run(llm.prompt_conversation_async(MESSAGES)) == "answer of flaky"
+    assert flaky.n_calls == 3
+
+
+def test_async_deadline_and_hedge():
+    llm = ResilientLLM([Backend("stalled", delay=2.0)], deadline=0.2, retry=NO_DELAY)
+    start = time.monotonic()
+    with pytest.raises(LLMDeadlineException):
+        asyncio.run(llm.prompt_conversation_async(MESSAGES))
+    assert time.monotonic() - start < 1.0
+
+    slow, fast = Backend("slow", delay=1.0), Backend("fast", delay=0.05)
+    llm = ResilientLLM([slow, fast], hedge_after=0.1, retry=NO_DELAY)
+    start = time.monotonic()
+    assert asyncio.run(llm.prompt_conversation_async(MESSAGES)) == "answer of fast"
+    assert time.monotonic() - start < 0.8
+    assert llm.last_backend is fast
+
+
+def test_stream_falls_back_before_first_chunk():
+    llm = ResilientLLM([Backend("local", n_failures=1), Backend("hosted")])
+    assert "".join(llm.send_request_stream(MESSAGES)) == "answer of hosted"
+
+
+def test_stream_falls_back_on_stalled_first_chunk():
+    stalled, hosted = Backend("stalled", delay=2.0), Backend("hosted")
+    llm = ResilientLLM([stalled, hosted], first_chunk_after=0.1)
+    start = time.monotonic()
+    assert "".join(llm.send_request_stream(MESSAGES)) == "answer of hosted"
+    assert time.monotonic() - start < 1.0
+    assert llm.last_backend is hosted
+    assert llm.errors == {"stalled": 1}
+
+
+def test_stream_deadline_bounds_first_chunk():
+    llm = ResilientLLM([Backend("stalled", delay=2.0)], deadline=0.2)
+    start = time.monotonic()
+    with pytest.raises(LLMDeadlineException):
+        "".join(llm.send_request_stream(MESSAGES))
+    assert time.monotonic() - start < 1.0
+
+
+def test_from_names():
+    with pytest.raises(ValueError):
+        ResilientLLM.from_names(["NoSuchModel"])
+    llm = ResilientLLM.from_names(["Qwen25", "Llama3"], deadline=10)
+    assert llm.model_name == "qwen2.5:32b -> llama3.1"
+    assert llm.context_budget == 6000
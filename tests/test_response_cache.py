@@ -0,0 +1,145 @@
+import json
+import threading
+import time
+
+from openai.types.chat import ChatCompletionMessageToolCall
+
+from llm_integration.llm_service import LLM, ResponseToolCallPair
+from llm_integration.response_cache import ResponseCache
+
+
+class CountingLLM(LLM):
+    def __init__(self, cache):
+        self.model_name = "stub"
+        self.response_cache = cache
+        self.n_requests = 0
+
+    def send_request(self, messages):
+        self.n_requests += 1
+
+        class Message:
+            content = f"answer {self.n_requests}"
+
+        class Choice:
+            message = Message()
+
+        class Response:
+            choices = [Choice()]
+
+        return Response()
+
+
+MESSAGES = [{"role": "user", "content": "How can you help me?"}]
+
+
+def test_identical_requests_answered_from_memory():
+    llm = CountingLLM(ResponseCache())
+    assert llm.prompt_conversation(MESSAGES) == "answer 1"
+    assert llm.prompt_conversation(MESSAGES) == "answer 1"
+    assert llm.prompt_conversation(MESSAGES + [{"role": "user", "content": "x"}]) == "answer 2"
+    assert llm.n_requests == 2
+    assert llm.response_cache.stats.memory_hits == 1
+    assert llm.response_cache.stats.misses == 2
+
+
+def test_key_depends_on_model_and_tools():
+    tools = [{"type": "function", "function": {"name": "set_value"}}]
+    keys = {
+        ResponseCache.key("a", MESSAGES),
+        ResponseCache.key("b", MESSAGES),
+        ResponseCache.key("a", MESSAGES, tools),
+    }
+    assert len(keys) == 3
+    assert ResponseCache.key("a", MESSAGES) == ResponseCache.key("a", json.loads(json.dumps(MESSAGES)))
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    pair = ResponseToolCallPair(
+        response=None,
+        tool_calls=[
+            ChatCompletionMessageToolCall(
+                id="0",
+                type="function",
+                function={"name": "OPC_UA_CONNECTOR-set_device_name", "arguments": "{}"},
+            )
+        ],
+    )
+    key = ResponseCache.key("stub", MESSAGES, [])
+    ResponseCache(directory=str(tmp_path)).put(key, pair.to_json())
+
+    cache = ResponseCache(directory=str(tmp_path))
+    assert ResponseToolCallPair.from_json(cache.get(key)) == pair
+    assert cache.get(key) is not None
+    assert cache.stats.disk_hits == 1
+    assert cache.stats.memory_hits == 1
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = ResponseCache(directory=str(tmp_path), ttl=0.05)
+    cache.put("key", "value")
+    assert cache.get("key") == "value"
+    time.sleep(0.1)
+    assert cache.get("key") is None
+    assert ResponseCache(directory=str(tmp_path), ttl=0.05).get("key") is None
+    assert cache.stats.expired == 1
+
+
+def test_expired_memory_entry_replaced_from_disk(tmp_path):
+    cache = ResponseCache(directory=str(tmp_path), ttl=0.05)
+    cache.put("key", "old")
+    time.sleep(0.1)
+    # written by another process after the entry in memory expired
+    ResponseCache(directory=str(tmp_path), ttl=0.05).put("key", "new")
+    assert cache.get("key") == "new"
+    assert cache.stats.disk_hits == 1 and cache.stats.misses == 0
+    assert cache.get("key") == "new"
+    assert cache.stats.memory_hits == 1
+
+    time.sleep(0.1)
+    assert cache.get("key") is None
+    assert "key" not in cache.memory and not list(tmp_path.iterdir())
+
+
+def test_concurrent_use_from_threads(tmp_path):
+    cache = ResponseCache(memory_size=8, directory=str(tmp_path))
+
+    def use(thread_idx):
+        for idx in range(200):
+            key = f"key {idx % 20}"
+            if cache.get(key) is None:
+                cache.put(key, f"value {thread_idx}")
+
+    threads = [threading.Thread(target=use, args=(idx,)) for idx in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(cache.memory) <= 8
+    assert cache.stats.memory_hits + cache.stats.disk_hits + cache.stats.misses == 8 * 200
+    assert cache.disk_bytes == sum(path.stat().st_size for path in tmp_path.iterdir())
+
+
+def test_disk_size_limit(tmp_path):
+    cache = ResponseCache(directory=str(tmp_path), max_disk_bytes=300)
+    for idx in range(10):
+        cache.put(f"key {idx}", "x" * 50)
+    assert cache.disk_bytes <= 300
+    assert cache.stats.disk_evictions > 0
+    assert len(list(tmp_path.iterdir())) == len(cache.disk_entries)
+    # the newest entries are kept
+    assert "key 9" in cache.disk_entries
+
+
+def test_disk_tier_shared_between_instances(tmp_path):
+    # two processes using the same directory
+    first = ResponseCache(directory=str(tmp_path), max_disk_bytes=500)
+    second = ResponseCache(directory=str(tmp_path), max_disk_bytes=500)
+    first.put("key", "value")
+    assert second.get("key") == "value"
+    assert second.stats.disk_hits == 1
+
+    for idx in range(10):
+        first.put(f"first {idx}", "x" * 50)
+        second.put(f"second {idx}", "x" * 50)
+    assert sum(path.stat().st_size for path in tmp_path.iterdir()) <= 500
+    assert "second 9" in second.disk_entries
@@ -0,0 +1,99 @@
+import asyncio
+
+import pytest
+
+from error_handling import LLMInteractionException
+from llm_integration.llm_service import LLM, ResponseToolCallPair
+from llm_integration.router import ANSWER, EXTRACTION, ModelRouter
+
+
+class Backend(LLM):
+    def __init__(self, name, context_budget=8000, fail=False):
+        self.client = None
+        self.system_prompt = ""
+        self.model_name = name
+        self.context_budget = context_budget
+        self.fail = fail
+        self.n_calls = 0
+        self.n_async_calls = 0
+
+    def prompt_conversation(self, input):
+        self.n_calls += 1
+        if self.fail:
+            raise LLMInteractionException(f"{self.model_name} failed")
+        return self.model_name
+
+    def prompt_tool(self, input, tools):
+        return ResponseToolCallPair(response=self.prompt_conversation(input), tool_calls=None)
+
+    async def prompt_conversation_async(self, input):
+        self.n_async_calls += 1
+        return self.prompt_conversation(input)
+
+    async def prompt_tool_async(self, input, tools):
+        return ResponseToolCallPair(
+            response=await self.prompt_conversation_async(input), tool_calls=None
+        )
+
+
+def build_router(**kwargs):
+    local, large = Backend("local", context_budget=2000), Backend("large", context_budget=16000)
+    router = ModelRouter({EXTRACTION: [local, large], ANSWER: [large]}, **kwargs)
+    return router, local, large
+
+
+def messages(n_chars):
+    return [{"role": "user", "content": "x" * n_chars}]
+
+
+def test_cheap_extraction_local_and_hard_turns_large():
+    router, local, large = build_router(hard_request_tokens=1000)
+    assert router.prompt_tool(messages(100), []).response == "local"
+    assert router.prompt_conversation(messages(100)) == "large"
+    # a hard turn, which would also fit the local model
+    assert router.prompt_tool(messages(6000), []).response == "large"
+    # too large for the context of the local model
+    router.hard_request_tokens = 100000
+    assert router.prompt_tool(messages(10000), []).response == "large"
+
+    reasons = [decision.reason for decision in router.decisions]
+    assert reasons[2] == "hard turn, largest model"
+    assert router.decisions[0].backend == "local"
+    assert "local: 1 requests" in router.report()
+
+
+def test_slow_backend_avoided():
+    router, local, large = build_router(latency_target=1.0)
+    router.backend_stats["local"].record(3.0, True)
+    router.backend_stats["large"].record(0.5, True)
+    assert router.prompt_tool(messages(100), []).response == "large"
+    assert router.decisions[-1].reason == "cheapest within latency target"
+
+
+def test_failing_backend_falls_back_and_is_avoided():
+    router, local, large = build_router(min_samples=2)
+    local.fail = True
+    for _ in range(3):
+        assert router.prompt_tool(messages(100), []).response == "large"
+    # after min_samples failures the local model is not tried first any more
+    assert local.n_calls == 2
+    assert router.stats()["local"]["error_rate"] == 1.0
+
+    large.fail = True
+    with pytest.raises(LLMInteractionException):
+        router.prompt_conversation(messages(100))
+
+
+def test_single_call_turn_routed_as_answer():
+    router, local, large = build_router()
+    assert router.prompt_turn(messages(100), []).response == "large"
+    assert router.decisions[-1].task == ANSWER
+
+
+def test_async_requests_use_async_backends():
+    router, local, large = build_router()
+    local.fail = True
+    assert asyncio.run(router.prompt_tool_async(messages(100), [])).response == "large"
+    assert asyncio.run(router.prompt_turn_async(messages(100), [])).response == "large"
+    assert local.n_async_calls == 1 and large.n_async_calls == 2
+    assert router.backend_stats["local"].error_rate == 1.0
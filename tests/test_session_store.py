@@ -0,0 +1,91 @@
+import os
+
+from model.app_model import AppModel
+from session_store import SessionStore
+
+
+def run_session(path, n_turns):
+    model = AppModel()
+    store = SessionStore(path)
+    history = store.load(model)
+    history.addSystemPromt("system promt")
+    model.add_app("OPC_UA_CONNECTOR")
+    history.addConfig(model)
+    tags = model.apps[0].config.datapoints.items[0].tags
+    for turn in range(n_turns):
+        history.addPromt_withStrs("user", f"user {turn}")
+        if turn > 0:
+            tags.create_item()
+        tags.items[turn].name.set_value(f"tag {turn}")
+        history.addConfig(model)
+        history.addPromt_withStrs("assistant", f"assistant {turn}")
+    store.close()
+    return model, history
+
+
+def test_resume_session(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    model, history = run_session(path, 5)
+
+    resumed_model = AppModel()
+    store = SessionStore(path)
+    resumed = store.load(resumed_model)
+
+    assert resumed_model.apps[0].config.to_json() == model.apps[0].config.to_json()
+    assert resumed.promtHistory == history.promtHistory
+    assert resumed.systemPromt == "system promt"
+    assert [turn.config_index for turn in resumed.turns] == [
+        turn.config_index for turn in history.turns
+    ]
+    # only the current config was loaded, the others are loaded when they are needed
+    assert resumed.configHistory.count(None) == len(history.configHistory) - 1
+    assert resumed.genPromtForLLM() == history.genPromtForLLM()
+    # the configs loaded out of order are described like the ones of the session
+    for index in reversed(range(len(history.configHistory))):
+        assert resumed.genConfigPromt(index) == history.genConfigPromt(index)
+    assert resumed_model.version() > max(s.version for s in history.configHistory)
+
+    # the resumed session continues the same log
+    resumed.addPromt_withStrs("user", "undo that")
+    assert resumed.undo(resumed_model)
+    assert len(resumed_model.apps[0].config.datapoints.items[0].tags.items) == 4
+    store.close()
+
+    again_model = AppModel()
+    again = SessionStore(path).load(again_model)
+    assert again.configCursor == resumed.configCursor
+    assert again.redoStack == resumed.redoStack
+    assert again_model.apps[0].config.to_json() == resumed_model.apps[0].config.to_json()
+
+
+def test_unchanged_nodes_written_once(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    model = AppModel()
+    store = SessionStore(path, sync_every=1)
+    history = store.load(model)
+    model.add_app("OPC_UA_CONNECTOR")
+    tags = model.apps[0].config.datapoints.items[0].tags
+    for _ in range(200):
+        tags.create_item()
+    history.addConfig(model)
+    size_first = os.path.getsize(path)
+
+    for turn in range(5):
+        tags.items[turn].name.set_value(f"tag {turn}")
+        history.addConfig(model)
+    # a turn writes the nodes on the path to the changed value, not the whole config
+    assert os.path.getsize(path) - size_first < size_first / 4
+    store.close()
+
+
+def test_incomplete_last_record_dropped(tmp_path):
+    path = str(tmp_path / "session.jsonl")
+    model, history = run_session(path, 2)
+    with open(path, "a") as f:
+        f.write('{"type": "promt", "role": "user", "cont')
+
+    resumed = SessionStore(path).load(AppModel())
+    assert resumed.promtHistory == history.promtHistory
+    resumed.addPromt_withStrs("user", "next")
+    resumed.store.close()
+    assert SessionStore(path).load(AppModel()).promtHistory[-1]["content"] == "next"
@@ -0,0 +1,163 @@
+from history import History
+from model.app_model import AppModel
+from model.columnar import make_columnar
+from model.iem_model import DocumentationUAConnectorConfig
+from model.snapshot import ConfigChange, diff_descriptions, diff_snapshots
+
+
+def build_model():
+    model = AppModel()
+    model.add_app("OPC_UA_CONNECTOR")
+    return model, model.apps[0].config
+
+
+def test_unchanged_subtrees_are_shared():
+    config = DocumentationUAConnectorConfig()
+    config.datapoints.create_item()
+    before = config.snapshot()
+
+    config.datapoints.items[1].name.set_value("plc")
+    after = config.snapshot()
+
+    assert before is not after
+    assert after.child("datapoints").child("0") is before.child("datapoints").child("0")
+    assert after.child("username") is before.child("username")
+    assert config.snapshot() is after
+
+
+def test_snapshot_keeps_prompt_of_its_turn():
+    model, config = build_model()
+    history = History()
+    history.addConfig(model)
+    prompt = model.generate_prompt_string()
+
+    config.dbservicename.set_value("databus")
+    history.addConfig(model)
+
+    assert history.configHistory[0].generate_prompt_string() == prompt
+    assert history.configHistory[1].generate_prompt_string() == model.generate_prompt_string()
+
+
+def test_diff_between_turns():
+    model, config = build_model()
+    history = History()
+    history.addConfig(model)
+    config.datapoints.items[0].name.set_value("plc")
+    config.datapoints.items[0].tags.create_item()
+    config.datapoints.items[0].tags.items[1].name.set_value("pressure")
+    history.addConfig(model)
+
+    changes = history.diffConfigs(0, 1)
+    assert ConfigChange(path="OPC_UA_CONNECTOR.datapoints.0.name", old=None, new="plc") in changes
+    assert (
+        ConfigChange(path="OPC_UA_CONNECTOR.datapoints.0.tags.1.name", old=None, new="pressure")
+        in changes
+    )
+    assert all(change.path.startswith("OPC_UA_CONNECTOR.datapoints.0") for change in changes)
+    assert history.diffConfigs(1, 1) == []
+
+
+def test_undo_redo():
+    model, config = build_model()
+    history = History()
+    history.addConfig(model)
+    config.datapoints.items[0].name.set_value("plc")
+    config.datapoints.create_item()
+    history.addConfig(model)
+    json_after = config.to_json()
+
+    assert history.undo(model)
+    assert config.datapoints.items[0].name.value is None
+    assert len(config.datapoints.items) == 1
+    assert config.get_field("datapoints.0.name") is config.datapoints.items[0].name
+    assert not history.undo(model)
+
+    assert history.redo(model)
+    assert config.to_json() == json_after
+    assert not history.redo(model)
+
+    history.undo(model)
+    config.username.set_value("admin")
+    history.addConfig(model)
+    assert not history.redo(model)
+    assert history.undo(model)
+    assert config.username.value == "edge"
+
+
+def test_undo_add_app():
+    model = AppModel()
+    history = History()
+    history.addConfig(model)
+    model.add_app("OPC_UA_CONNECTOR")
+    model.apps[0].config.dbservicename.set_value("databus")
+    history.addConfig(model)
+
+    history.undo(model)
+    assert model.apps == []
+    history.redo(model)
+    assert model.apps[0].config.dbservicename.value == "databus"
+
+
+def test_restore_columnar_list():
+    config = DocumentationUAConnectorConfig()
+    tags = config.datapoints.items[0].tags
+    tags.fill_from_json([{"name": "pressure"}, {"name": "flow"}])
+    make_columnar(tags)
+    tags = config.datapoints.items[0].tags
+    before = config.snapshot()
+    json_before = config.to_json()
+
+    tags.items[1].name.set_value("level")
+    tags.create_item()
+    config.restore_snapshot(before)
+
+    assert config.to_json() == json_before
+    assert len(tags.items) == 2
+
+
+def test_diff_kinds_and_visibility():
+    config = DocumentationUAConnectorConfig()
+    before = config.snapshot()
+    config.username.set_invisible()
+    config.password.set_value("secret")
+    config.datapoints.create_item()
+    config.datapoints.items[1].name.set_value("plc")
+    after = config.snapshot()
+
+    changes = diff_snapshots(before, after, visible_only=True)
+    assert ConfigChange(path="username", old=True, new=False, kind="visibility") in changes
+    assert ConfigChange(path="datapoints.1", old=None, new=None, kind="added") in changes
+    assert ConfigChange(path="datapoints.1.name", old=None, new="plc") in changes
+    assert "datapoints.1: added" in [str(change) for change in changes]
+
+    # a field which is shown again lists its value, removed items are one change
+    config.username.set_visible()
+    config.datapoints.truncate_items(1)
+    changes = diff_snapshots(after, config.snapshot(), visible_only=True)
+    assert ConfigChange(path="username", old=None, new="edge") in changes
+    assert ConfigChange(path="datapoints.1", old=None, new=None, kind="removed") in changes
+
+
+def test_diff_descriptions_like_config_promts():
+    config = DocumentationUAConnectorConfig()
+    before = config.describe()
+    config.username.set_invisible()
+    config.datapoints.items[0].authenticationMode.set_value("User ID & Password")
+    config.datapoints.create_item()
+    config.datapoints.items[1].name.set_value("plc")
+    after = config.describe()
+
+    changes = diff_descriptions(before, after)
+    assert ConfigChange(path="username", old=True, new=False, kind="visibility") in changes
+    # the mapped value of the enum, as in the config promt
+    assert ConfigChange(path="datapoints.0.authenticationMode", old=None, new=2) in changes
+    assert ConfigChange(path="datapoints.1", old=None, new=None, kind="added") in changes
+    assert ConfigChange(path="datapoints.1.name", old=None, new="plc") in changes
+
+    config.username.set_visible()
+    config.datapoints.truncate_items(1)
+    changes = diff_descriptions(after, config.describe())
+    assert ConfigChange(path="username", old=False, new=True, kind="visibility") in changes
+    assert ConfigChange(path="username", old=None, new="edge") in changes
+    assert ConfigChange(path="datapoints.1", old=None, new=None, kind="removed") in changes
+    assert diff_descriptions(after, after) == []
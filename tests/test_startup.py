@@ -0,0 +1,146 @@
+import json
+import threading
+
+import pytest
+
+import strategy
+from error_handling import LLMInteractionException
+from iem_integration.devices import Device
+from llm_integration.router import ANSWER, EXTRACTION
+from strategy import DEVICES_LOADING, DEVICES_UNAVAILABLE, EdgeConfigStrategy
+
+
+def test_session_interactive_before_devices_arrive(monkeypatch, tmp_path):
+    released = threading.Event()
+
+    def slow_device_list():
+        assert released.wait(5)
+        return [Device(name="edge-1", id="1", status="connected")]
+
+    monkeypatch.setattr(strategy, "get_device_list", slow_device_list)
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+    session = EdgeConfigStrategy(session_path=str(tmp_path / "session.jsonl"))
+
+    # the device list is still loading, the system promt says so
+    assert DEVICES_LOADING in session.history.systemPromt
+    session.apply_prefetched()
+    assert "devices" in session.startup_futures
+
+    released.set()
+    session.apply_prefetched(wait=True)
+    assert not session.startup_futures
+    assert "edge-1 (connected)" in session.history.systemPromt
+    assert DEVICES_LOADING not in session.history.systemPromt
+    assert session.nl_service.client is session.llm_router
+    assert session.data_extractor.tool_descriptions is not None
+    assert set(session.startup_timings) == {
+        "devices",
+        "session",
+        "interactive",
+        "llm_clients",
+        "tools",
+        "ready",
+    }
+    assert "devices" in session.startup_report()
+
+
+def test_unavailable_device_list(monkeypatch):
+    def failing_device_list():
+        raise ConnectionError("IEM not reachable")
+
+    monkeypatch.setattr(strategy, "get_device_list", failing_device_list)
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+    session = EdgeConfigStrategy()
+    session.apply_prefetched(wait=True)
+
+    assert DEVICES_UNAVAILABLE in session.history.systemPromt
+
+
+def test_failed_llm_services_raise_once_per_build(monkeypatch):
+    monkeypatch.setattr(strategy, "get_device_list", lambda: [])
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    session = EdgeConfigStrategy()
+    with pytest.raises(LLMInteractionException, match="OPENAI_API_KEY"):
+        session.apply_prefetched(wait=True)
+    assert session.llm_router is None
+
+    # the failed build is not kept, the next turn waits for a new one
+    assert isinstance(session.startup_futures["llm"].exception(5), LLMInteractionException)
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+    with pytest.raises(LLMInteractionException):
+        session.apply_prefetched(wait=True)
+    session.apply_prefetched(wait=True)
+    assert not session.startup_futures
+    assert session.nl_service.client is session.llm_router
+
+
+def test_resumed_session_logs_only_final_system_promt(monkeypatch, tmp_path):
+    path = tmp_path / "session.jsonl"
+    released = threading.Event()
+    devices = [Device(name="edge-1", id="1", status="connected")]
+
+    def slow_device_list():
+        assert released.wait(5)
+        return devices
+
+    def system_records():
+        session.session_store.flush()
+        records = [json.loads(line) for line in path.read_text().splitlines()]
+        return [record["content"] for record in records if record["type"] == "system"]
+
+    monkeypatch.setattr(strategy, "get_device_list", slow_device_list)
+    monkeypatch.setenv("OPENAI_API_KEY", "dummy")
+    session = EdgeConfigStrategy(session_path=str(path))
+    released.set()
+    session.apply_prefetched(wait=True)
+    session.session_store.close()
+    assert len(system_records()) == 1
+
+    # resumed with the same devices while they are loading, nothing new is logged
+    released.clear()
+    session = EdgeConfigStrategy(session_path=str(path))
+    assert DEVICES_LOADING in session.history.systemPromt
+    released.set()
+    session.apply_prefetched(wait=True)
+    assert len(system_records()) == 1
+    session.session_store.close()
+
+    # resumed with other devices, only the new device list is logged
+    devices = [Device(name="edge-2", id="2", status="connected")]
+    session = EdgeConfigStrategy(session_path=str(path))
+    session.apply_prefetched(wait=True)
+    logged = system_records()
+    assert len(logged) == 2
+    assert "edge-2 (connected)" in logged[-1]
+    assert all(DEVICES_LOADING not in content for content in logged)
+
+
+def test_router_chains_backends_of_a_task(monkeypatch):
+    monkeypatch.setenv("LLM_FALLBACK_CHAIN", "Qwen25,Llama3")
+    monkeypatch.setenv("LLM_ANSWER_BACKENDS", "Gemma2,Qwen25")
+    monkeypatch.setenv("LLM_HEDGE_AFTER", "0.5")
+    session = EdgeConfigStrategy.__new__(EdgeConfigStrategy)
+    router = session.build_router("system promt", 10.0)
+
+    (extraction,) = router.routes[EXTRACTION]
+    assert [backend.model_name for backend in extraction.backends] == [
+        "qwen2.5:32b",
+        "llama3.1",
+    ]
+    assert extraction.hedge_after == 0.5 and extraction.deadline == 10.0
+    (answer,) = router.routes[ANSWER]
+    assert answer.model_name == "gemma2:27b -> qwen2.5:32b"
+    assert all(backend.response_cache is None for backend in answer.backends)
+
+
+def test_router_response_cache_opt_in(monkeypatch, tmp_path):
+    monkeypatch.setenv("LLM_FALLBACK_CHAIN", "Qwen25,Llama3")
+    monkeypatch.setenv("LLM_RESPONSE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("LLM_RESPONSE_CACHE_TTL", "3600")
+    session = EdgeConfigStrategy.__new__(EdgeConfigStrategy)
+    router = session.build_router("system promt", 10.0)
+
+    backends = router.routes[EXTRACTION][0].backends + router.routes[ANSWER][0].backends
+    cache = backends[0].response_cache
+    assert cache is not None and cache.directory == str(tmp_path) and cache.ttl == 3600.0
+    assert all(backend.response_cache is cache for backend in backends)
@@ -0,0 +1,78 @@
+import json
+
+import pytest
+
+from model.iem_model import DocumentationUAConnectorConfig
+from model.tag_import import import_tag_file, import_tags, read_tag_records
+
+
+def test_import_jsonl(tmp_path):
+    path = tmp_path / "tags.jsonl"
+    with open(path, "w") as f:
+        for i in range(25):
+            tag = {"name": f"tag-{i}", "dataType": "Real", "acquisitionCycle": 1000}
+            f.write(json.dumps(tag) + "\n")
+
+    connector = DocumentationUAConnectorConfig()
+    report = import_tag_file(connector.datapoints.items[0], str(path), batch_size=10)
+
+    tags = connector.datapoints.items[0].tags.items
+    assert report.imported == 25
+    assert len(tags) == 25
+    assert tags[0].name.value == "tag-0"
+    assert tags[24].acquisitionCycle.enum_key == "1 second"
+    assert connector.get_field("datapoints.0.tags.24.name") is tags[24].name
+
+
+def test_import_csv(tmp_path):
+    path = tmp_path / "tags.csv"
+    path.write_text(
+        "name,address,acquisitionCycle,isArrayTypeTag,accessMode\n"
+        "pressure,ns=3;s=p,100,false,rw\n"
+        "flow,ns=3;s=f,1 second,true,Read\n"
+    )
+
+    connector = DocumentationUAConnectorConfig()
+    report = import_tag_file(connector.datapoints.items[0], str(path))
+
+    tags = connector.datapoints.items[0].tags.items
+    assert report.imported == 2
+    assert tags[0].acquisitionCycle.enum_key == "100 milliseconds"
+    assert tags[0].accessMode.enum_key == "Read & Write"
+    assert tags[1].isArrayTypeTag.value is True
+
+
+def test_import_reports_invalid_records():
+    connector = DocumentationUAConnectorConfig()
+    tags = connector.datapoints.items[0].tags
+    records = [{"name": "a"}, {"accessMode": "x"}, {"name": "b"}]
+
+    report = import_tags(tags, records)
+
+    assert report.imported == 2
+    assert report.failed == 1
+    assert report.errors[0].startswith("Record 2")
+    assert [tag.name.value for tag in tags.items] == ["a", "b"]
+
+
+def test_unsupported_format():
+    with pytest.raises(ValueError):
+        list(read_tag_records("tags.xml"))
+
+
+def test_import_skips_broken_jsonl_lines(tmp_path):
+    path = tmp_path / "tags.jsonl"
+    path.write_text('{"name": "a"}\n{"name": \n[1, 2]\n"b"\n{"name": "c"}\n')
+
+    connector = DocumentationUAConnectorConfig()
+    report = import_tag_file(connector.datapoints.items[0], str(path))
+
+    assert report.imported == 2
+    assert report.failed == 3
+    assert [error.split(":")[0] for error in report.errors] == [
+        "Record 2",
+        "Record 3",
+        "Record 4",
+    ]
+    tags = connector.datapoints.items[0].tags.items
+    assert [tag.name.value for tag in tags] == ["a", "c"]
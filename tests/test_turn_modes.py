@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+from openai.types.chat import ChatCompletionMessageToolCall
+from openai.types.chat.chat_completion_message_tool_call import Function
+
+from llm_integration.llm_service import LLM, ResponseToolCallPair
+from llm_integration.nl_service import SINGLE_CALL_INSTRUCTION
+from strategy import SINGLE_CALL, TWO_CALLS
+
+from .test_async_llm import build_strategy
+
+
+def set_device_name(val):
+    return [
+        ChatCompletionMessageToolCall(
+            id="call_0",
+            type="function",
+            function=Function(
+                name="OPC_UA_CONNECTOR-set_device_name", arguments=json.dumps({"val": val})
+            ),
+        )
+    ]
+
+
+class TurnStubLLM(LLM):
+    """Returns the given answer next to the tool calls and records the requests."""
+
+    def __init__(self, tool_calls=None, answer="Installed on edge-1."):
+        self.model_name = "stub"
+        self.tool_calls = tool_calls
+        self.answer = answer
+        self.requests = []
+
+    def prompt_tool(self, input, tools):
+        self.requests.append(("tool", input))
+        return ResponseToolCallPair(response=self.answer, tool_calls=self.tool_calls)
+
+    def prompt_conversation(self, input):
+        self.requests.append(("conversation", input))
+        return "follow-up answer"
+
+    async def prompt_tool_async(self, input, tools):
+        return self.prompt_tool(input, tools)
+
+    async def prompt_conversation_async(self, input):
+        return self.prompt_conversation(input)
+
+
+def test_single_call_turn():
+    llm = TurnStubLLM(tool_calls=set_device_name("edge-1"))
+    strategy = build_strategy(llm)
+    strategy.history.addPromt_withStrs("user", "Install it on edge-1")
+
+    result = strategy.send_message(SINGLE_CALL)
+
+    assert result.mode == SINGLE_CALL and result.llm_calls == 1
+    assert result.follow_up_reason is None
+    assert len(llm.requests) == 1
+    # the request has the conversation context and the instruction to answer
+    messages = llm.requests[0][1]
+    assert messages[0]["content"] == "system promt"
+    assert messages[-1]["content"] == SINGLE_CALL_INSTRUCTION
+    assert strategy.model.apps[0].installed_device_name == "edge-1"
+    assert strategy.history.getLatestPromtAsStr("assistant") == "Installed on edge-1."
+    assert strategy.last_turn is result
+
+
+def test_single_call_turn_asks_again_without_answer():
+    llm = TurnStubLLM(tool_calls=set_device_name("edge-1"), answer=None)
+    strategy = build_strategy(llm)
+    strategy.history.addPromt_withStrs("user", "Install it on edge-1")
+
+    result = strategy.send_message(SINGLE_CALL)
+
+    assert result.llm_calls == 2
+    assert result.follow_up_reason == "no answer next to the tool calls"
+    # the answer was requested with the changed config
+    assert llm.requests[-1][0] == "conversation"
+    assert "edge-1" in llm.requests[-1][1][-1]["content"]
+    assert strategy.history.getLatestPromtAsStr("assistant") == "follow-up answer"
+
+
+def test_two_call_turn_stays_default():
+    llm = TurnStubLLM(tool_calls=set_device_name("edge-1"))
+    strategy = build_strategy(llm)
+    strategy.history.addPromt_withStrs("user", "Install it on edge-1")
+
+    result = strategy.send_message()
+
+    assert result.mode == TWO_CALLS and result.llm_calls == 2
+    assert [kind for kind, _ in llm.requests] == ["tool", "conversation"]
+    assert strategy.history.getLatestPromtAsStr("assistant") == "follow-up answer"
+
+
+def test_single_call_turn_async():
+    llm = TurnStubLLM(tool_calls=set_device_name("edge-1"))
+    strategy = build_strategy(llm)
+    strategy.turn_mode = SINGLE_CALL
+    strategy.history.addPromt_withStrs("user", "Install it on edge-1")
+
+    result = asyncio.run(strategy.send_message_async())
+
+    assert result.mode == SINGLE_CALL and result.llm_calls == 1
+    assert [kind for kind, _ in llm.requests] == ["tool"]
+    assert strategy.model.apps[0].installed_device_name == "edge-1"
+    assert strategy.history.getLatestPromtAsStr("assistant") == "Installed on edge-1."
+    assert strategy.last_turn is result